@@ -1,301 +1,568 @@
 #!/usr/bin/env python
 
-import math
 import sys
 import time
+
+_process_start = time.time()
+
+import argparse
+import multiprocessing
+import os
 import ROOT
 import numpy as np
-from array import array
 
-from definitions_final import delta_phi, delta_r, calculate_event_shape, define_histograms, define_tree, calculate_fox_wolfram, transverse_mass
-# Initialize histograms and tree
-histograms = define_histograms()
-my_tree, branches = define_tree()
+from Definitions_final import define_histograms, define_tree, define_quantities
+from columnar_writer import TTreeSink, NpzSink, ParquetSink, concatenate_parts
+from hist_accumulator import merge_histograms, write_variations
+from dataset import expand_dataset, run_dataset
+from profiler import StageProfiler
+from output_schema import OutputSchema
+from selection import CutFlow, Selection
+from particles import ParticleArray
 
 try:
   input = raw_input
 except:
   pass
 
-if len(sys.argv) < 2:
-  print(" Usage: Example1.py input_file")
-  sys.exit(1)
-
-ROOT.gSystem.Load("libDelphes")
-
-try:
-  ROOT.gInterpreter.Declare('#include "classes/DelphesClasses.h"')
-  ROOT.gInterpreter.Declare('#include "external/ExRootAnalysis/ExRootTreeReader.h"')
-except:
-  pass
-# Create a ROOT file to save histograms
-file = ROOT.TFile("output_file.root", "RECREATE")
-
-inputFile = sys.argv[1]
-
-# Create chain of root trees
-chain = ROOT.TChain("Delphes")
-chain.Add(inputFile)
-
-# Create object of class ExRootTreeReader
-treeReader = ROOT.ExRootTreeReader(chain)
-numberOfEntries = treeReader.GetEntries()
-#numberOfEntries = 4
-# Get pointers to branches used in this analysis
-branchWeight   = treeReader.UseBranch("Weight")
-branchEvent    = treeReader.UseBranch("Event")
-branchJet = treeReader.UseBranch("Jet")
-branchElectron = treeReader.UseBranch("Electron")
-branchMuon = treeReader.UseBranch("Muon")
-branchScalarHT = treeReader.UseBranch("ScalarHT")
-branchMET = treeReader.UseBranch("MissingET")
-
-
-#n_leps = 4
-#lep_pt_br = [array('f', [0.]) for _ in range(n_leps)]  # Array to hold PT values of 4 leptons for lepton branch
-
-# Create branches dynamically using a loop for leptons
-#for i in range(n_leps):
-#    my_tree.Branch(f"lep{i+1}_pt", lep_pt_br[i], f"lep{i+1}_pt/F")
-
-# Book histograms
-#########histJetsSize = ROOT.TH1F("jet_Size", "jet Size", 18, 0.0, 17.0)
-
-#histbJetsSize = ROOT.TH1F("bjets_Size", "bjets Size", 17, 0.0, 17.0)
-#histScalarHT = ROOT.TH1F("Scalar_HT", "Scalar HT", 100, 100.0, 1800.0)
-#histMET = ROOT.TH1F("MET", "MET", 100, 0.0, 600.0)
-bjets_hPt_l = []
-bjets_hEta_l = []
-bjets_hPhi_l = []
-bjets_hMass_l = []
-bjets_hdPhi_l = []
-bjets_hdR_l = []
-
-lep_hPt_l = []
-lep_hEta_l = []
-lep_hPhi_l = []
-for i in range (4):
-    bjets_Pt_hName = f"bjet{i+1}_hPt"
-    hist_bjet_Pt = ROOT.TH1F(bjets_Pt_hName, bjets_Pt_hName, 100, 0, 400)
-    bjets_hPt_l.append(hist_bjet_Pt)
-
-    bjets_Eta_hName = f"bjet{i+1}_hEta"
-    hist_bjet_Eta = ROOT.TH1F(bjets_Eta_hName, bjets_Eta_hName, 100, -4.0, 4.0)
-    bjets_hEta_l.append(hist_bjet_Eta)
-
-    bjets_Phi_hName = f"bjet{i+1}_hPhi"
-    hist_bjet_Phi = ROOT.TH1F(bjets_Phi_hName, bjets_Phi_hName, 100, 0.0, 3.20)
-    bjets_hPhi_l.append(hist_bjet_Phi)
-
-    bjets_Mass_hName = f"bjet{i+1}_hMass"
-    hist_bjet_Mass = ROOT.TH1F(bjets_Mass_hName, bjets_Mass_hName, 100, 0.0, 200.0)
-    bjets_hMass_l.append(hist_bjet_Mass)
-    for j in range (i+1, 4):
-        bjets_dPhi_hName = f"bjet{i}_{j}_dPhi"
-        hist_bjet_dPhi = ROOT.TH1F(bjets_dPhi_hName, bjets_dPhi_hName, 100, -3.15, 3.15)
-        bjets_hdPhi_l.append(hist_bjet_dPhi)
-
-
-    lep_Pt_hName = f"lep{i+1}_hPt"
-    hist_lep_Pt = ROOT.TH1F(lep_Pt_hName, lep_Pt_hName, 100, 0, 400)
-    lep_hPt_l.append(hist_lep_Pt)
-
-    lep_Eta_hName = f"lep{i+1}_hEta"
-    hist_lep_Eta = ROOT.TH1F(lep_Eta_hName, lep_Eta_hName, 100, -4.0, 4.0)
-    lep_hEta_l.append(hist_lep_Eta)
-
-    lep_Phi_hName = f"lep{i+1}_hPhi"
-    hist_lep_Phi = ROOT.TH1F(lep_Phi_hName, lep_Phi_hName, 100, 0.0, 3.2)
-    lep_hPhi_l.append(hist_lep_Phi)
-
-
-#histMass = ROOT.TH1F("mass", "M_{inv}(e_{1}, e_{2})", 100, 40.0, 140.0)
-
-# Loop over all events
-for entry in range(0, numberOfEntries):
-#for entry in range(0, 2):
-  if (entry+1)%100 == 0:
-    print (' ... processed {} events ...'.format(entry+100))
-
-  # Load selected branches with data from specified event
-  treeReader.ReadEntry(entry)
-#  print("No of entries: ",entry)
-
-  ## main MC event weight
-  w =  branchEvent[0].Weight
-  for met in range(0,branchMET.GetEntries()):
-    histograms["histMET"].Fill(branchMET.At(met).MET,w)
-#    print('met information: ',branchMET.At(met).Phi)
-    branches["MET_"][0] = branchMET.At(met).MET
-  for sHT in range(0,branchScalarHT.GetEntries()):
-    histograms["histScalarHT"].Fill(branchScalarHT.At(sHT).HT,w)
-    branches["SHT"][0] = branchScalarHT.At(sHT).HT
-
-  # If event contains at least 4 jet
-  histograms["histJetsSize"].Fill(branchJet.GetEntries(), w)
-  branches["jets_size"][0] = branchJet.GetEntries()
-  my_tree.Fill()
-  if branchJet.GetEntries() > 3:
-    momentum_vectors_jets = [[branchJet.At(jet).P4().Px(), branchJet.At(jet).P4().Py(), branchJet.At(jet).P4().Pz()] for jet in range (0, branchJet.GetEntries())]
-    sphericity, aplanarity, circularity = calculate_event_shape(momentum_vectors_jets)
-    branches["sphericity_jets"][0] = sphericity
-    branches["aplanarity_jets"][0] = aplanarity
-    branches["circularity_jets"][0] = circularity
-
-#    branches["sphericity_jets"][0], branches["aplanarity_jets"][0], branches["circularity_jets"][0] = calculate_event_shape(momentum_vectors_jets)
-
-    ## 0 - Loose , 1 - Medium, 2 - Tight
-    wp = 1
-    bjets_list = []
-    dphi_values = []
-    dR_values = []
-    for bj in range(0,branchJet.GetEntries()):
-        #    BtagOk = ( jet1.BTag & (1 << wp) )
-        BtagOk = ( branchJet.At(bj).BTag )
-        pt = branchJet.At(bj).PT
-        eta = abs(branchJet.At(bj).Eta)
-        phi = branchJet.At(bj).Phi
-#    print("btag>>>>>>>>>>>>>>>>:",BtagOk)
-    # Plot bjets transverse momentum
-        if (BtagOk and pt > 30. and eta < 5.):
-            bjets_list.append(branchJet.At(bj))
-    histograms["histbJetsSize"].Fill(len(bjets_list), w)
-    branches["bjets_size"][0] = len(bjets_list)
-#    my_tree.Fill()
-    print("Jets no: ",branchJet.GetEntries())
-    if len(bjets_list) > 3:
-        momentum_vectors_bjets = [[bjet.P4().Px(), bjet.P4().Py(), bjet.P4().Pz()] for bjet in bjets_list]
-        sphericity, aplanarity, circularity = calculate_event_shape(momentum_vectors_bjets)
-        branches["sphericity_bjets"][0] = sphericity
-        branches["aplanarity_bjets"][0] = aplanarity
-        # Compute Fox-Wolfram Moments
-        max_order = 4
-        bjets_fox_wolfram_moments = calculate_fox_wolfram(momentum_vectors_bjets, max_order=max_order)
-
-    # Update Fox-Wolfram branches
-        for l, moment in enumerate(bjets_fox_wolfram_moments):
-            branches[f"bjets_fox_wolfram_H{l}"][0] = moment
-        for hist in bjets_hPt_l:
-            idx = bjets_hPt_l.index(hist)
-            hist.Fill(branchJet.At(idx).PT, w)
-# Fill Branch of tree
-            #bjet_pt_br[idx][0] = branchJet.At(idx).PT
-            branches[f"bjet{idx+1}_pt_br"][0] = branchJet.At(idx).PT
-#        my_tree.Fill()   
-
-        for hist in bjets_hEta_l:
-            idx = bjets_hEta_l.index(hist)
-            hist.Fill(branchJet.At(idx).Eta, w)
-        bj_pair_count = 0
-        for idx, hist in enumerate(bjets_hPhi_l):
-#            idx = bjets_hPhi_l.index(hist)
-            print("bjets index in phi loop: ", idx);
-            hist.Fill(branchJet.At(idx).Phi, w)
-            for idx2 in range(idx+1, len(bjets_hPhi_l)):
-                dphi = delta_phi(branchJet.At(idx).Phi, branchJet.At(idx2).Phi)
-                dphi_values.append(dphi)
-                branches[f"bjet_dphi_br{idx}_{idx2}"][0] = dphi
-                print("idx1: ", idx,",  idx2: ", idx2, ",  dPhi:  ",dphi)
-                dR = delta_r(branchJet.At(idx).Eta, branchJet.At(idx2).Eta, branchJet.At(idx).Phi, branchJet.At(idx2).Phi)
-                dR_values.append(dR)
-                branches[f"bjet_dr_br{idx}_{idx2}"][0] = dR
-                print("deta R:  ", dR)
-                bj_pair_count += 1
-        for idx_dphi, (hist_dphi, dphi_val) in enumerate(zip(bjets_hdPhi_l, dphi_values)):
-                hist_dphi.Fill(dphi_val, w)
-
-
-
-        for hist in bjets_hMass_l:
-            idx = bjets_hMass_l.index(hist)
-            hist.Fill(branchJet.At(idx).Mass, w)
-
-
-
-
-  # If event contains at least 4 leptons
-    leptons_list = []
-    print(f"Event {entry}: Electrons = {branchElectron.GetEntries()}, Muons = {branchMuon.GetEntries()}")
-
-    if (branchElectron.GetEntries() + branchMuon.GetEntries() ) > 0:
-    # Take first two electrons
-        for e in range(0,branchElectron.GetEntries()):
-            leptons_list.append(branchElectron.At(e))
-        for m in range(0,branchMuon.GetEntries()):
-            leptons_list.append(branchMuon.At(m))
-            
-            
-        leptons_list.sort(key=lambda lep: lep.PT, reverse=True)
-        print(f"Event {entry}: Found {len(leptons_list)} leptons after sorting")
-
-    # Compute transverse mass (mT) for the leading lepton
-    
-    
-    if len(leptons_list) > 0 and branchMET.GetEntries() > 0:
-        leading_lepton = leptons_list[0]  # Highest pT lepton
-        for met in range(0,branchMET.GetEntries()):
-        	mt_value = transverse_mass(leading_lepton.PT, leading_lepton.Phi, branchMET.At(0).MET, branchMET.At(0).Phi)
-        	branches["mT"][0] = float(mt_value)
-#        	print("mt_value; ", mt_value, "lep pt: ", leading_lepton.PT, ", ", leading_lepton.Phi, ", ", branchMET.At(0).MET, ", ", branchMET.At(0).Phi)
-        
-        
-       #leptons_list.sort()
-        momentum_vectors_lep = [[lep.P4().Px(), lep.P4().Py(), lep.P4().Pz()] for lep in leptons_list]
-        sphericity, aplanarity, circularity = calculate_event_shape(momentum_vectors_lep)
-        branches["sphericity_leps"][0] = sphericity
-        branches["aplanarity_leps"][0] = aplanarity
-    # Compute Fox-Wolfram Moments
-        max_order = 4
-        leps_fox_wolfram_moments = calculate_fox_wolfram(momentum_vectors_lep, max_order=max_order)
-
-    # Update Fox-Wolfram branches
-        for l, moment in enumerate(leps_fox_wolfram_moments):
-            branches[f"leps_fox_wolfram_H{l}"][0] = moment
-    if len(leptons_list) == 0:
-        print(f"Skipping lepton filling: No leptons in this event.")
-    else:
-        for idx, lep in enumerate(lep_hPt_l):
-          if idx < len(leptons_list):
-            lep.Fill(leptons_list[idx].PT, w)
-          
-# Fill leptons brach
-            branches[f"lep{idx}_pt_br"][0] = leptons_list[idx].PT
-#        my_tree.Fill()
-    if len(leptons_list) == 0:
-        print(f"Skipping lepton filling: No leptons in this event.")
-    else:   
-        for idx, lep in enumerate(lep_hEta_l):
-            if idx < len(leptons_list):
-             lep.Fill(leptons_list[idx].Eta, w)
-            
-            
-    if len(leptons_list) == 0:
-        print(f"Skipping lepton filling: No leptons in this event.")
-    else:
-        for idx, lep in enumerate(lep_hPhi_l):
-            if idx < len(leptons_list):
-             lep.Fill(leptons_list[idx].Phi, w)
-#      print ("leptons list", leptons_list)
-#      print ("lepton index: ", idx)
-#    print("Electron no: ",branchElectron.GetEntries())
-#    print("Muon no: ",branchMuon.GetEntries())
-    if len(bjets_list) >= 2 and len(leptons_list) >= 2:
-        for i in range(2):
-            branches["br_dphi_bjet_lep_leading"][i][0] = delta_phi(bjets_list[i].Phi, leptons_list[i].Phi)
-            branches["br_dr_bjet_lep_leading"][i][0] = delta_r(bjets_list[i].Eta, leptons_list[i].Eta, bjets_list[i].Phi, leptons_list[i].Phi)
-
-    # Plot their invariant mass
- #   histMass.Fill(((elec1.P4()) + (elec2.P4())).M())
-#    my_tree.Fill()
-#Write tree
-#my_tree.Fill()
-my_tree.Write()
-# Write the histograms to the ROOT file
-for hist in histograms.values():
-    hist.Write()
-file.Write()
-
-# Close the file
-file.Close()
-
-
+def setup_delphes():
+    """Load libDelphes and parse the Delphes/ExRootAnalysis headers (once per process)."""
+    ROOT.gSystem.Load("libDelphes")
+
+    try:
+        ROOT.gInterpreter.Declare('#include "classes/DelphesClasses.h"')
+        ROOT.gInterpreter.Declare('#include "external/ExRootAnalysis/ExRootTreeReader.h"')
+    except:
+        pass
+
+def resolve_outputs(schema, selection, disable=None):
+    """
+    Drop the outputs that need a disabled derived quantity and plan only the
+    quantities reachable from the remaining ones (plus the object selections the
+    event cuts count).
+
+    Returns:
+        tuple: (schema, quantities graph, enabled quantities, execution plan)
+    """
+    quantities = define_quantities(selection, schema)
+    schema = schema.without(quantities.downstream(schema.disabled | set(disable or ())))
+    enabled = schema.requirements()
+    counted = {cut["count"] for cut in selection.event_cuts} & set(quantities.nodes)
+    return schema, quantities, enabled, quantities.plan(sorted(enabled | counted))
+
+def run_analysis(inputFile, outputFile="output_file.root", start_time=None, sink=None, chunk_size=100000,
+                 schema=None, histogram_backend="numpy", workers=1, order="entry", entry_range=None,
+                 return_histograms=False, verbosity=0, progress_every=10000, selection=None, disable=None,
+                 weight_variations=None):
+    """
+    Run the analysis over one Delphes file and write histograms and my_Tree.
+
+    Args:
+        inputFile (str): Delphes ROOT file (anything TChain.Add accepts).
+        outputFile (str): Output ROOT file (default: output_file.root).
+        start_time (float): Epoch time the job started, for the first-event latency.
+        sink (str): Extra columnar copy of my_Tree next to outputFile, "npz" or "parquet".
+        chunk_size (int): Events per bulk flush of my_Tree (default: 100000).
+        schema (str or OutputSchema): Output schema or path to a .json/.yaml schema
+            (default: output_schema.SCHEMA).
+        histogram_backend (str): "numpy" (batch-fillable accumulators written as TH1F)
+            or "root" (plain TH1F).
+        workers (int): Number of processes; > 1 splits the input into entry ranges.
+        order (str): my_Tree event order with several workers, "entry" (input order)
+            or "completion" (order in which the ranges finish).
+        entry_range (tuple): (first, last) entries to process (default: all).
+        return_histograms (bool): Return the histograms in the result instead of
+            writing them (used for partial runs).
+        verbosity (int): 0 quiet, 1 progress lines and stage report, 2 per-event debug output.
+        progress_every (int): Events between JSON progress lines (0: none).
+        selection (str or Selection): Object selections and event cuts, or path to a
+            .json/.yaml selection config (default: selection.SELECTION).
+        disable (list): Derived quantities to switch off (see define_quantities);
+            the branches and histograms that need them are not written.
+        weight_variations (str): Also fill every histogram with every entry of the
+            Weight collection in the same pass, written as one histogram set per
+            variation ("sets") or one TH2 per observable ("th2"). Default: off.
+
+    Returns:
+        dict: entries processed, first-event latency, total wall time in seconds,
+        the my_Tree writer statistics, the per-stage profile and the cut flow.
+    """
+    if start_time is None:
+        start_time = time.time()
+    if workers > 1:
+        return _run_parallel(inputFile, outputFile, start_time, workers, order,
+                             sink=sink, chunk_size=chunk_size, schema=schema, verbosity=verbosity,
+                             progress_every=progress_every, selection=selection, disable=disable,
+                             weight_variations=weight_variations)
+    first_event_time = None
+    if schema is None or isinstance(schema, str):
+        schema = OutputSchema.load(schema) if schema else OutputSchema()
+    if selection is None or isinstance(selection, str):
+        selection = Selection.load(selection) if selection else Selection()
+    cutflow = CutFlow(selection.cut_names())
+
+    schema, quantities, enabled, plan = resolve_outputs(schema, selection, disable)
+    if verbosity >= 1:
+        quantities.describe(plan)
+
+    # Initialize histograms
+    histograms = define_histograms(schema, backend=histogram_backend)
+
+    # Create a ROOT file to save histograms
+    file = ROOT.TFile(outputFile, "RECREATE")
+
+    # my_Tree is collected in column blocks and flushed in bulk
+    sinks = [TTreeSink("my_Tree", "Tree with multiple branches")]
+    if sink == "npz":
+        sinks.append(NpzSink(os.path.splitext(outputFile)[0] + ".npz"))
+    elif sink == "parquet":
+        sinks.append(ParquetSink(os.path.splitext(outputFile)[0] + ".parquet"))
+    writer, branches = define_tree(sinks, chunk_size, schema)
+
+    # Create chain of root trees
+    chain = ROOT.TChain("Delphes")
+    chain.Add(inputFile)
+
+    # Create object of class ExRootTreeReader
+    treeReader = ROOT.ExRootTreeReader(chain)
+    numberOfEntries = treeReader.GetEntries()
+    #numberOfEntries = 4
+    # Get pointers to branches used in this analysis
+    branchWeight   = treeReader.UseBranch("Weight")
+    branchEvent    = treeReader.UseBranch("Event")
+    branchJet = treeReader.UseBranch("Jet")
+    branchElectron = treeReader.UseBranch("Electron")
+    branchMuon = treeReader.UseBranch("Muon")
+    branchScalarHT = treeReader.UseBranch("ScalarHT")
+    branchMET = treeReader.UseBranch("MissingET")
+
+    # Event cuts count the objects of a collection or of an object selection
+    event_branches = {"Jet": branchJet, "Electron": branchElectron, "Muon": branchMuon}
+    for cut in selection.event_cuts:
+        counted = selection.objects[cut["count"]]["collections"] if cut["count"] in selection.objects else [cut["count"]]
+        for collection in counted:
+            if collection not in event_branches:
+                event_branches[collection] = treeReader.UseBranch(collection)
+            if not event_branches[collection]:
+                raise ValueError(f"Event cut '{cut['name']}' counts unknown collection '{collection}'")
+
+    def read_objects():
+        """Objects of the current entry in flat columns; derived quantities are
+        computed lazily, and only those in the execution plan."""
+        jets = ParticleArray.from_objects([branchJet.At(jet) for jet in range(0, branchJet.GetEntries())], fields=("BTag",))
+        electrons = ParticleArray.from_objects([branchElectron.At(e) for e in range(0, branchElectron.GetEntries())])
+        muons = ParticleArray.from_objects([branchMuon.At(m) for m in range(0, branchMuon.GetEntries())])
+        met = [branchMET.At(0).MET, branchMET.At(0).Phi] if branchMET.GetEntries() > 0 else [np.nan, np.nan]
+        return quantities.evaluate(plan, jets=jets, electrons=electrons, muons=muons,
+                                   met=np.array(met[:1]), met_phi=np.array(met[1:]))
+
+    def selected_count(values, name):
+        """Objects of the current entry passing object selection `name`."""
+        if name in values:
+            return values[name].n_objects
+        return sum(selection.object_passes(name, event_branches[collection].At(k))
+                   for collection in selection.objects[name]["collections"]
+                   for k in range(event_branches[collection].GetEntries()))
+
+    # Weight variations: the nominal weight plus every entry of the Weight
+    # collection, all filled in the same pass (variation 0 is the nominal)
+    n_variations = None
+    if weight_variations:
+        first_entry = entry_range[0] if entry_range else 0
+        if first_entry < (entry_range[1] if entry_range else numberOfEntries):
+            treeReader.ReadEntry(first_entry)
+            n_variations = 1 + branchWeight.GetEntries()
+            histograms = define_histograms(schema, backend=histogram_backend, variations=n_variations)
+
+
+    # Per-object histogram lists come from the output schema groups
+    groups = schema.groups()
+    bjets_hPt_l = [histograms[key] for key in groups.get("bjets_hPt", [])]
+    bjets_hEta_l = [histograms[key] for key in groups.get("bjets_hEta", [])]
+    bjets_hPhi_l = [histograms[key] for key in groups.get("bjets_hPhi", [])]
+    bjets_hMass_l = [histograms[key] for key in groups.get("bjets_hMass", [])]
+    bjets_hdPhi_l = [histograms[key] for key in groups.get("bjets_hdPhi", [])]
+
+    lep_hPt_l = [histograms[key] for key in groups.get("lep_hPt", [])]
+    lep_hEta_l = [histograms[key] for key in groups.get("lep_hEta", [])]
+    lep_hPhi_l = [histograms[key] for key in groups.get("lep_hPhi", [])]
+
+
+    # Loop over all events
+    first_entry, last_entry = entry_range or (0, numberOfEntries)
+    debug = verbosity >= 2
+    profiler = StageProfiler(total=last_entry - first_entry,
+                             progress_every=progress_every if verbosity >= 1 else 0)
+    lap = profiler.lap
+    for entry in range(first_entry, last_entry):
+    #for entry in range(0, 2):
+      profiler.event_done()
+
+      # Load selected branches with data from specified event
+      t = profiler.now()
+      treeReader.ReadEntry(entry)
+      t = lap("entry read", t)
+      if first_event_time is None:
+        first_event_time = time.time()
+    #  print("No of entries: ",entry)
+      # Every row is filled from this event only: values of quantities that
+      # do not apply (cut failed, too few objects) are zero, not carried over
+      writer.clear()
+
+      ## main MC event weight
+      w_nominal = w = branchEvent[0].Weight
+      if n_variations:
+        if branchWeight.GetEntries() != n_variations - 1:
+          raise ValueError(f"Entry {entry} has {branchWeight.GetEntries()} weights, expected {n_variations - 1}")
+        w = np.array([w_nominal] + [branchWeight.At(k).Weight for k in range(branchWeight.GetEntries())])
+      cutflow.count("all", w_nominal)
+      for met in range(0,branchMET.GetEntries()):
+        histograms["histMET"].Fill(branchMET.At(met).MET,w)
+    #    print('met information: ',branchMET.At(met).Phi)
+        branches["MET_"][0] = branchMET.At(met).MET
+      for sHT in range(0,branchScalarHT.GetEntries()):
+        histograms["histScalarHT"].Fill(branchScalarHT.At(sHT).HT,w)
+        branches["SHT"][0] = branchScalarHT.At(sHT).HT
+
+      # If event contains at least 4 jet
+      histograms["histJetsSize"].Fill(branchJet.GetEntries(), w)
+      branches["jets_size"][0] = branchJet.GetEntries()
+      t = lap("histogram fill", t)
+      # Event cuts in config order, as in Selection.apply; objects are read
+      # only once a cut or the analysis needs them
+      values = None
+      passed = True
+      for cut in selection.event_cuts:
+        if cut["count"] in selection.objects:
+          if values is None:
+            values = read_objects()
+          count = selected_count(values, cut["count"])
+        else:
+          count = event_branches[cut["count"]].GetEntries()
+        if not selection.event_passes(cut["name"], count):
+          passed = False
+          break
+        cutflow.count(cut["name"], w_nominal)
+      # Cuts on collection sizes gate every object quantity; the b-jet ones
+      # also need the cuts on object selections
+      preselected = passed or all(selection.event_passes(cut["name"], event_branches[cut["count"]].GetEntries())
+                                  for cut in selection.event_cuts if cut["count"] not in selection.objects)
+      if preselected:
+        if values is None:
+          values = read_objects()
+        t = lap("object selection", t)
+        if "jet_shapes" in enabled:
+            sphericity, aplanarity, circularity = values["jet_shapes"]
+            branches["sphericity_jets"][0] = sphericity[0]
+            branches["aplanarity_jets"][0] = aplanarity[0]
+            branches["circularity_jets"][0] = circularity[0]
+            t = lap("event shape", t)
+
+        # b-tag working point and kinematic cuts come from the selection config
+        n_bjets = values["bjets"].n_objects if "bjets" in values else 0
+        t = lap("object selection", t)
+        if "bjets" in enabled:
+            histograms["histbJetsSize"].Fill(n_bjets, w)
+            branches["bjets_size"][0] = n_bjets
+            t = lap("histogram fill", t)
+        if debug:
+            print("Jets no: ",branchJet.GetEntries())
+        if passed:
+            if "bjet_shapes" in enabled:
+                sphericity, aplanarity, _ = values["bjet_shapes"]
+                branches["sphericity_bjets"][0] = sphericity[0]
+                branches["aplanarity_bjets"][0] = aplanarity[0]
+                t = lap("event shape", t)
+            # Compute Fox-Wolfram Moments
+            if "bjet_fox_wolfram" in enabled:
+                for l, moment in enumerate(values["bjet_fox_wolfram"][0]):
+                    branches[f"bjets_fox_wolfram_H{l}"][0] = moment
+                t = lap("fox-wolfram", t)
+            if "leading_jets" in enabled:
+                leading_jets = values["leading_jets"]
+                jet_pt, jet_eta, jet_phi, jet_mass = (leading_jets.pt.tolist(), leading_jets.eta.tolist(),
+                                                      leading_jets.phi.tolist(), leading_jets.mass.tolist())
+                # The schema may book more objects than an event has (n_bjets above the cut)
+                for idx, hist in enumerate(bjets_hPt_l):
+                    if idx < len(jet_pt):
+                        hist.Fill(jet_pt[idx], w)
+                        # Fill Branch of tree
+                        branches[f"bjet{idx+1}_pt_br"][0] = jet_pt[idx]
+                for idx, hist in enumerate(bjets_hEta_l):
+                    if idx < len(jet_eta):
+                        hist.Fill(jet_eta[idx], w)
+                for idx, hist in enumerate(bjets_hPhi_l):
+                    if idx < len(jet_phi):
+                        hist.Fill(jet_phi[idx], w)
+                for idx, hist in enumerate(bjets_hMass_l):
+                    if idx < len(jet_mass):
+                        hist.Fill(jet_mass[idx], w)
+                t = lap("histogram fill", t)
+            # dPhi / dR pairs, computed once for the branches and the histograms
+            if "jet_pair_deltas" in enabled:
+                dphi, dR = values["jet_pair_deltas"]
+                n_pair_objects = dphi.shape[1]
+                for idx in range(n_pair_objects):
+                    for idx2 in range(idx+1, n_pair_objects):
+                        branches[f"bjet_dphi_br{idx}_{idx2}"][0] = dphi[0, idx, idx2]
+                        branches[f"bjet_dr_br{idx}_{idx2}"][0] = dR[0, idx, idx2]
+                        if debug:
+                            print("idx1: ", idx,",  idx2: ", idx2, ",  dPhi:  ",dphi[0, idx, idx2], ",  dR:  ", dR[0, idx, idx2])
+                t = lap("kinematics", t)
+                for hist_dphi, dphi_val in zip(bjets_hdPhi_l, dphi[0][np.triu_indices(n_pair_objects, 1)]):
+                    hist_dphi.Fill(dphi_val, w)
+                t = lap("histogram fill", t)
+
+      # Electrons and muons merged and sorted by PT
+        if debug:
+            print(f"Event {entry}: Electrons = {branchElectron.GetEntries()}, Muons = {branchMuon.GetEntries()}")
+        if "leptons" in values:
+            leptons = values["leptons"]
+            lep_pt, lep_eta, lep_phi = leptons.pt.tolist(), leptons.eta.tolist(), leptons.phi.tolist()
+            if debug:
+                print(f"Event {entry}: Found {len(lep_pt)} leptons after sorting")
+            t = lap("object selection", t)
+
+            # Compute transverse mass (mT) for the leading lepton
+            if len(lep_pt) > 0 and branchMET.GetEntries() > 0:
+                if "lep_mt" in enabled:
+                    branches["mT"][0] = float(values["lep_mt"][0])
+                    t = lap("kinematics", t)
+                if "lep_shapes" in enabled:
+                    sphericity, aplanarity, _ = values["lep_shapes"]
+                    branches["sphericity_leps"][0] = sphericity[0]
+                    branches["aplanarity_leps"][0] = aplanarity[0]
+                    t = lap("event shape", t)
+                # Compute Fox-Wolfram Moments
+                if "lep_fox_wolfram" in enabled:
+                    for l, moment in enumerate(values["lep_fox_wolfram"][0]):
+                        branches[f"leps_fox_wolfram_H{l}"][0] = moment
+                    t = lap("fox-wolfram", t)
+            if len(lep_pt) == 0:
+                if debug:
+                    print(f"Skipping lepton filling: No leptons in this event.")
+            elif "leptons" in enabled:
+                for idx, lep in enumerate(lep_hPt_l):
+                  if idx < len(lep_pt):
+                    lep.Fill(lep_pt[idx], w)
+        # Fill leptons brach
+                    branches[f"lep{idx}_pt_br"][0] = lep_pt[idx]
+                for idx, lep in enumerate(lep_hEta_l):
+                    if idx < len(lep_eta):
+                     lep.Fill(lep_eta[idx], w)
+                for idx, lep in enumerate(lep_hPhi_l):
+                    if idx < len(lep_phi):
+                     lep.Fill(lep_phi[idx], w)
+                t = lap("histogram fill", t)
+            if "bjet_lep_deltas" in enabled:
+                # One buffer per lead label; an empty lead_labels books none
+                n_lead = len(branches.get("br_dphi_bjet_lep_leading", []))
+                if n_lead and n_bjets >= n_lead and len(lep_pt) >= n_lead:
+                    dphi, dR = values["bjet_lep_deltas"]
+                    for i in range(n_lead):
+                        branches["br_dphi_bjet_lep_leading"][i][0] = dphi[0, i]
+                        branches["br_dr_bjet_lep_leading"][i][0] = dR[0, i]
+                    lap("kinematics", t)
+
+      # The row is complete only once every quantity of this event is set
+      t = profiler.now()
+      writer.fill()
+      lap("tree fill", t)
+
+    t = profiler.now()
+    writer.close()
+    lap("tree fill", t)
+    if verbosity >= 1:
+        profiler.report()
+        cutflow.report()
+    # Write the histograms and the cut flow to the ROOT file
+    if not return_histograms:
+        for hist in histograms.values():
+            hist.Write()
+        if n_variations:
+            write_variations(histograms, file, weight_variations)
+        cutflow.Write()
+
+    # Close the file
+    file.Close()
+    end_time = time.time()
+
+    stats = {
+        "entries": last_entry - first_entry,
+        "first_event_latency": (first_event_time or end_time) - start_time,
+        "wall_time": end_time - start_time,
+        "writer": writer.stats(),
+        "profile": profiler.summary(),
+        "cutflow": cutflow.to_dict(),
+    }
+    if return_histograms:
+        stats["histograms"] = histograms
+    return stats
+
+def _run_partial(job):
+    """Process-pool entry point: analyse one entry range into a partial output file."""
+    index, kwargs = job
+    setup_delphes()
+    return index, run_analysis(**kwargs)
+
+def _run_parallel(inputFile, outputFile, start_time, workers, order, sink=None, chunk_size=100000, schema=None,
+                  verbosity=0, progress_every=10000, selection=None, disable=None, weight_variations=None):
+    """
+    Split the input into entry ranges, analyse them in a process pool and merge
+    the partial trees and histograms into outputFile.
+    """
+    chain = ROOT.TChain("Delphes")
+    chain.Add(inputFile)
+    numberOfEntries = chain.GetEntries()
+
+    # A few ranges per worker keeps all cores busy until the end
+    n_ranges = max(1, min(numberOfEntries, workers * 4))
+    bounds = [numberOfEntries * k // n_ranges for k in range(n_ranges + 1)]
+    base = os.path.splitext(outputFile)[0]
+    jobs = [(k, dict(inputFile=inputFile, outputFile=f"{base}.part{k:04d}.root", start_time=start_time,
+                     sink=sink, chunk_size=chunk_size, schema=schema, histogram_backend="numpy",
+                     entry_range=(bounds[k], bounds[k + 1]), return_histograms=True,
+                     verbosity=verbosity, progress_every=progress_every, selection=selection,
+                     disable=disable, weight_variations=weight_variations))
+            for k in range(n_ranges)]
+
+    results = []
+    with multiprocessing.get_context("spawn").Pool(workers) as pool:
+        for index, stats in pool.imap_unordered(_run_partial, jobs):
+            results.append((index, stats))
+    if order == "entry":
+        results.sort(key=lambda result: result[0])
+    parts = [jobs[index][1]["outputFile"] for index, _ in results]
+
+    # Merge partial trees in the chosen order, then the histograms
+    part_chain = ROOT.TChain("my_Tree")
+    for part in parts:
+        part_chain.Add(part)
+    file = ROOT.TFile(outputFile, "RECREATE")
+    merged_tree = part_chain.CloneTree(-1, "fast")
+    merged_tree.Write()
+    histograms = merge_histograms(stats["histograms"] for _, stats in results)
+    for hist in histograms.values():
+        hist.Write()
+    if weight_variations:
+        write_variations(histograms, file, weight_variations)
+    cutflow = CutFlow(results[0][1]["cutflow"]["names"])
+    for _, stats in results:
+        cutflow += CutFlow.from_dict(stats["cutflow"])
+    cutflow.Write()
+    file.Close()
+    if verbosity >= 1:
+        cutflow.report()
+
+    if sink is not None:
+        extension = ".npz" if sink == "npz" else ".parquet"
+        extra_parts = [os.path.splitext(part)[0] + extension for part in parts]
+        concatenate_parts(extra_parts, base + extension)
+        for part in extra_parts:
+            os.remove(part)
+    for part in parts:
+        os.remove(part)
+
+    # Writer statistics summed over the partial runs
+    sinks = {}
+    for _, stats in results:
+        for name, sink_stats in stats["writer"]["sinks"].items():
+            total = sinks.setdefault(name, {"MB": 0.0, "seconds": 0.0})
+            total["MB"] += sink_stats["MB"]
+            total["seconds"] += sink_stats["seconds"]
+    for total in sinks.values():
+        total["MB_per_s"] = total["MB"] / total["seconds"] if total["seconds"] > 0 else 0.0
+    stages = {}
+    for _, stats in results:
+        for stage, values in stats["profile"]["stages"].items():
+            total = stages.setdefault(stage, {"seconds": 0.0, "calls": 0})
+            total["seconds"] += values["seconds"]
+            total["calls"] += values["calls"]
+
+    end_time = time.time()
+    return {
+        "entries": numberOfEntries,
+        "first_event_latency": min((stats["first_event_latency"] for _, stats in results), default=0.0),
+        "wall_time": end_time - start_time,
+        "writer": {
+            "entries": sum(stats["writer"]["entries"] for _, stats in results),
+            "sinks": sinks,
+            "peak_rss_MB": max((stats["writer"]["peak_rss_MB"] for _, stats in results), default=0.0),
+        },
+        "profile": {
+            "events": numberOfEntries,
+            "wall_time": end_time - start_time,
+            "events_per_s": numberOfEntries / (end_time - start_time) if end_time > start_time else 0.0,
+            "stages": stages,
+        },
+        "cutflow": cutflow.to_dict(),
+        "workers": workers,
+    }
+
+# Modules of this directory that define the numbers even when not imported by the analysis itself
+_EXTRA_SOURCES = ["normalization.py"]
+
+def analysis_sources():
+    """Source files of every module of this directory the analysis has imported, plus _EXTRA_SOURCES."""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    sources = {os.path.abspath(module.__file__) for module in list(sys.modules.values())
+               if getattr(module, "__file__", None) and module.__file__.endswith(".py")
+               and os.path.dirname(os.path.abspath(module.__file__)) == directory}
+    sources.update(os.path.join(directory, name) for name in _EXTRA_SOURCES
+                   if os.path.exists(os.path.join(directory, name)))
+    return sorted(sources)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(usage=" Example1.py input_file [input_file ...] [-o output_file] [--output-dir DIR]")
+    parser.add_argument("inputs", nargs="+", help="Delphes file(s), globs, directories or @file lists")
+    parser.add_argument("-o", "--output", default="output_file.root")
+    parser.add_argument("--output-dir", help="dataset mode: per-file outputs and resumable checkpoint manifest")
+    parser.add_argument("--sink", choices=["npz", "parquet"], help="also write my_Tree as .npz or .parquet")
+    parser.add_argument("--chunk-size", type=int, default=100000, help="events per my_Tree flush")
+    parser.add_argument("--schema", help="output schema (.json or .yaml), default: output_schema.SCHEMA")
+    parser.add_argument("--root-histograms", action="store_true", help="fill TH1F directly instead of NumPy accumulators")
+    parser.add_argument("--workers", type=int, default=1, help="number of processes (entry ranges run in parallel)")
+    parser.add_argument("--order", choices=["entry", "completion"], default="entry",
+                        help="my_Tree event order when running with several workers")
+    parser.add_argument("-v", "--verbose", action="count", default=0,
+                        help="-v: progress lines and per-stage timing, -vv: per-event debug output")
+    parser.add_argument("--progress-every", type=int, default=10000, help="events between JSON progress lines")
+    parser.add_argument("--selection", help="selection config (.json or .yaml), default: selection.SELECTION")
+    parser.add_argument("--disable", action="append", default=[], metavar="QUANTITY",
+                        help="switch off a derived quantity and every output that needs it (repeatable)")
+    parser.add_argument("--weight-variations", choices=["sets", "th2"],
+                        help="fill all Weight-collection variations in one pass, written as histogram sets or TH2s")
+    parser.add_argument("--print-plan", action="store_true", help="print the resolved execution plan and exit")
+    args = parser.parse_args(argv)
+
+    options = dict(sink=args.sink, chunk_size=args.chunk_size, schema=args.schema,
+                   histogram_backend="root" if args.root_histograms else "numpy",
+                   workers=args.workers, order=args.order, verbosity=args.verbose,
+                   progress_every=args.progress_every, selection=args.selection,
+                   disable=args.disable, weight_variations=args.weight_variations)
+    if args.print_plan:
+        schema = OutputSchema.load(args.schema) if args.schema else OutputSchema()
+        selection = Selection.load(args.selection) if args.selection else Selection()
+        _, quantities, _, plan = resolve_outputs(schema, selection, args.disable)
+        quantities.describe(plan, stream=sys.stdout)
+        return
+    setup_delphes()
+
+    files = expand_dataset(args.inputs)
+    if args.output_dir or len(files) > 1:
+        # Sources and schema that define the analysis; editing them invalidates the checkpoints
+        config_files = analysis_sources() + [path for path in (args.schema, args.selection) if path]
+        run_dataset(files, args.output_dir or os.path.splitext(args.output)[0] + "_parts", run_analysis,
+                    options, config_files, merged_output=args.output)
+        print(f"Dataset of {len(files)} files merged into {args.output}")
+        return
+
+    stats = run_analysis(files[0], args.output, start_time=_process_start, **options)
+    print(f"startup-to-first-event: {stats['first_event_latency']:.3f} s, total: {stats['wall_time']:.3f} s")
+    for name, sink_stats in stats["writer"]["sinks"].items():
+        print(f"{name}: {sink_stats['MB']:.1f} MB in {sink_stats['seconds']:.2f} s ({sink_stats['MB_per_s']:.1f} MB/s)")
+    print(f"peak memory: {stats['writer']['peak_rss_MB']:.0f} MB")
+    print(f"throughput: {stats['profile']['events_per_s']:.1f} events/s")
+
+if __name__ == "__main__":
+    main()
@@ -1,77 +1,83 @@
-import ROOT
-import sys
+import argparse
+import math
 import os
-import re
+import sys
+
+import ROOT
 
-# Parameters (optional)
-mh2 = mh3 = mhc = 700
+from scan_db import DB_PATH, connect, ingest, series
 
-# Read filename from command line or default
-filename = sys.argv[1] if len(sys.argv) > 1 else "x_section"
+COLORS = [ROOT.kBlue, ROOT.kRed, ROOT.kGreen + 2, ROOT.kMagenta, ROOT.kCyan + 1, ROOT.kOrange + 7,
+          ROOT.kViolet, ROOT.kTeal, ROOT.kPink, ROOT.kAzure + 2, ROOT.kSpring, ROOT.kGray + 2]
+
+parser = argparse.ArgumentParser(description="Cross section vs a model parameter from the scan database.")
+parser.add_argument("inputs", nargs="*", default=["x_section"],
+                    help="scan tables or directories to ingest and plot (default: x_section[.txt])")
+parser.add_argument("--db", default=DB_PATH, help="scan database (see scan_db.py)")
+parser.add_argument("--x", default="Mxd", help="parameter on the x axis")
+parser.add_argument("--series", help="parameter with one curve per value, e.g. mh2")
+parser.add_argument("--where", action="append", default=[], help="fixed parameter, e.g. Mxd=10 (repeatable)")
+parser.add_argument("--all", action="store_true", help="plot the whole database, not only the inputs")
+parser.add_argument("--logy", action="store_true")
+parser.add_argument("--output", default="Mxd_vs_Weight", help="output name without extension")
+args = parser.parse_args()
 
 # Automatically add .txt if missing
-if not os.path.isfile(filename):
-    if os.path.isfile(filename + ".txt"):
+inputs = []
+for filename in args.inputs:
+    if not os.path.exists(filename) and os.path.isfile(filename + ".txt"):
         filename += ".txt"
-    else:
+    if not os.path.exists(filename):
         print(f"❌ File not found: {filename} or {filename}.txt")
         sys.exit(1)
+    inputs.append(filename)
 
-# Read and parse data
-data = []
-with open(filename, "r") as file:
-    for line in file:
-        line = line.strip()
-
-        # Skip separators, headers, blank lines
-        if (
-            not line
-            or line.startswith("+")
-            or "Mxd" in line
-            or "Weight" in line
-            or "=" in line
-        ):
-            continue
+# Only new or changed tables are parsed
+db = connect(args.db)
+ingest(db, inputs, verbose=False)
 
-        # Remove table borders like '|'
-        line = line.replace("|", " ")
-        # Replace multiple spaces or tabs with single space
-        line = re.sub(r"\s+", " ", line)
-        parts = line.split()
-
-        # Expect two numbers: Mxd, Weight
-        if len(parts) >= 2:
-            try:
-                mxd = float(parts[0])
-                weight = float(parts[1])
-                data.append((mxd, weight))
-            except ValueError:
-                continue
+where = {name.strip(): float(value) for name, _, value in (item.partition("=") for item in args.where)}
+curves = series(db, args.x, args.series, where, sources=None if args.all else inputs)
 
 # Check that we got data
-if not data:
-    print(f"❌ No valid numeric data found in {filename}")
+if not curves:
+    print(f"❌ No valid numeric data found in {', '.join(inputs)}")
     sys.exit(1)
 
-# Create TGraph
-graph = ROOT.TGraph(len(data))
-for i, (mxd, weight) in enumerate(data):
-    graph.SetPoint(i, mxd, weight)
+# One graph per series, all in one TMultiGraph
+multigraph = ROOT.TMultiGraph()
+legend = ROOT.TLegend(0.65, max(0.88 - 0.05 * len(curves), 0.15), 0.88, 0.88)
+legend.SetBorderSize(0)
+graphs = []
+for k, (value, (x, xsec, errors)) in enumerate(curves.items()):
+    graph = ROOT.TGraphErrors(len(x))
+    for i, (mxd, weight, error) in enumerate(zip(x, xsec, errors)):
+        graph.SetPoint(i, mxd, weight)
+        graph.SetPointError(i, 0.0, 0.0 if error is None or math.isnan(error) else error)
+    # Style
+    color = COLORS[k % len(COLORS)]
+    graph.SetMarkerStyle(20)
+    graph.SetMarkerSize(1)
+    graph.SetMarkerColor(color)
+    graph.SetLineColor(color)
+    multigraph.Add(graph, "PL")
+    if value is not None:
+        legend.AddEntry(graph, f"{args.series} = {value:g} GeV", "pl")
+    graphs.append(graph)
 
-# Style
-graph.SetTitle(f"Cross section vs Mxd (mh2=mh3=mhc={mh2} GeV);Mxd;Weight [pb]")
-graph.SetMarkerStyle(20)
-graph.SetMarkerSize(1)
-graph.SetMarkerColor(ROOT.kBlue)
-graph.SetLineColor(ROOT.kBlue)
+fixed = ", ".join(f"{name}={value:g}" for name, value in where.items())
+multigraph.SetTitle(f"Cross section vs {args.x}{f' ({fixed})' if fixed else ''};{args.x};Weight [pb]")
 
 # Draw
-c = ROOT.TCanvas("c", "Mxd vs Weight", 800, 600)
-graph.Draw("APL")
+c = ROOT.TCanvas("c", f"{args.x} vs Weight", 800, 600)
+if args.logy:
+    c.SetLogy()
+multigraph.Draw("A")
+if args.series:
+    legend.Draw()
 
 # Save plot
-c.SaveAs("Mxd_vs_Weight.png")
-c.SaveAs("Mxd_vs_Weight.pdf")
-
-print(f"✅ Plot saved as Mxd_vs_Weight.png and Mxd_vs_Weight.pdf using data from {filename}")
+c.SaveAs(f"{args.output}.png")
+c.SaveAs(f"{args.output}.pdf")
 
+print(f"✅ Plot saved as {args.output}.png and {args.output}.pdf: {len(curves)} series from {args.db}")
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+"""
+Warm analysis worker: pays the ROOT / libDelphes / header start-up cost once
+and then runs Example1_updated jobs sent over a local Unix socket.
+
+    python analysis_worker.py serve                       # start the worker
+    python analysis_worker.py submit input.root -o out.root
+    python analysis_worker.py shutdown
+
+Each request and reply is one line of JSON.
+"""
+
+import time
+
+_process_start = time.time()
+
+import argparse
+import json
+import os
+import socket
+import sys
+import traceback
+
+DEFAULT_SOCKET = os.path.join(os.environ.get("XDG_RUNTIME_DIR", "/tmp"), f"analysis_worker_{os.getuid()}.sock")
+
+def _send(conn, message):
+    conn.sendall((json.dumps(message) + "\n").encode())
+
+def _receive(conn):
+    data = b""
+    while not data.endswith(b"\n"):
+        chunk = conn.recv(65536)
+        if not chunk:
+            break
+        data += chunk
+    return json.loads(data.decode()) if data else None
+
+def serve(socket_path=DEFAULT_SOCKET):
+    """Initialize ROOT and Delphes once, then run jobs one after another until shutdown."""
+    import Example1_updated as analysis
+
+    analysis.setup_delphes()
+    print(f"Worker ready after {time.time() - _process_start:.3f} s, listening on {socket_path}")
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen()
+    try:
+        while True:
+            conn, _ = server.accept()
+            with conn:
+                job = _receive(conn)
+                if job is None:
+                    continue
+                if job.get("command") == "shutdown":
+                    _send(conn, {"status": "ok"})
+                    break
+                received = time.time()
+                print(f"Job: {job['input']} -> {job['output']}")
+                try:
+                    stats = analysis.run_analysis(job["input"], job["output"],
+                                                  start_time=job.get("submitted", received),
+                                                  **job.get("options", {}))
+                    reply = {"status": "ok", "output": job["output"], "stats": stats}
+                except Exception as error:
+                    traceback.print_exc()
+                    reply = {"status": "error", "error": f"{type(error).__name__}: {error}"}
+                try:
+                    _send(conn, reply)
+                except OSError:
+                    pass  # client went away, the job output is on disk anyway
+                except (TypeError, ValueError) as error:
+                    # A reply that cannot be serialized must not take the worker down
+                    traceback.print_exc()
+                    try:
+                        _send(conn, {"status": "error", "error": f"Unserializable reply: {error}"})
+                    except OSError:
+                        pass
+    finally:
+        server.close()
+        os.remove(socket_path)
+
+def submit(input_file, output_file, options=None, socket_path=DEFAULT_SOCKET):
+    """Send one job to the worker and wait for it to finish."""
+    job = {"input": os.path.abspath(input_file), "output": os.path.abspath(output_file),
+           "options": options or {}, "submitted": _process_start}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.connect(socket_path)
+        _send(conn, job)
+        return _receive(conn)
+
+def shutdown(socket_path=DEFAULT_SOCKET):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.connect(socket_path)
+        _send(conn, {"command": "shutdown"})
+        return _receive(conn)
+
+def _parse_option(text):
+    key, _, value = text.partition("=")
+    try:
+        value = json.loads(value)
+    except ValueError:
+        pass
+    return key, value
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Warm analysis worker for Example1_updated.py")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Unix socket path")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("serve", help="start the worker")
+    submit_parser = commands.add_parser("submit", help="submit a job and wait for it")
+    submit_parser.add_argument("input_file")
+    submit_parser.add_argument("-o", "--output", default="output_file.root")
+    submit_parser.add_argument("--option", action="append", default=[], metavar="KEY=VALUE",
+                               help="extra run_analysis keyword argument (value parsed as JSON if possible)")
+    commands.add_parser("shutdown", help="stop the worker")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        serve(args.socket)
+    elif args.command == "shutdown":
+        shutdown(args.socket)
+    else:
+        reply = submit(args.input_file, args.output, dict(map(_parse_option, args.option)), args.socket)
+        if reply is None or reply["status"] != "ok":
+            print(f"Job failed: {reply['error'] if reply else 'no reply from worker'}")
+            sys.exit(1)
+        stats = reply["stats"]
+        print(f"Done: {reply['output']} ({stats['entries']} events)")
+        print(f"startup-to-first-event: {stats['first_event_latency']:.3f} s, total: {time.time() - _process_start:.3f} s")
+
+if __name__ == "__main__":
+    main()
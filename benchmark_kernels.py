@@ -0,0 +1,322 @@
+"""
+Benchmark suite for the analysis kernels on seeded synthetic events.
+
+Every kernel is timed in its per-event (scalar) form and its batched form at
+several jet multiplicities, plus the batched chunk pipeline end to end.
+With ROOT and libDelphes available, a small synthetic Delphes file is also
+written and run through run_analysis for the full events/s.
+
+The LHE reader is timed on a synthetic unweighted_events.lhe, plain and
+gzip-compressed, as is reading its binary columnar cache (lhe_cache.py).
+Given the compiled lhe_reader_non_decayed_tan.c macro (--lhe-c-binary),
+the same file is also run through it for comparison.
+
+Results are in microseconds per event (best of --repeat runs). They can be
+saved as a baseline and later compared against it; a kernel slower than the
+baseline by more than --threshold is a regression and the exit code is 1.
+The batched event shapes are also checked against the original per-event
+loop, and with ROOT a serial and a two-process run_analysis must write the
+same my_Tree; any difference fails the run the same way.
+No network or real data is needed.
+
+    python benchmark_kernels.py --save-baseline
+    python benchmark_kernels.py --threshold 0.2
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from Definitions_final import (calculate_event_shape, calculate_fox_wolfram, delta_r, event_shape_batch,
+                               fox_wolfram_batch, pairwise_delta_matrices, transverse_mass,
+                               transverse_mass_array)
+from delphes_reader import cartesian
+from hist_accumulator import NumpyHist
+from lhe_cache import LHEColumns
+from lhe_reader import iterate_lhe
+from synthetic_events import generate_chunk, write_delphes_file, write_lhe_file
+
+DEFAULT_BASELINE = "benchmark_baseline.json"
+MULTIPLICITIES = [4, 8, 16]
+
+def _per_event(chunk, collection):
+    """Yield (first, last) object ranges of every event."""
+    offsets = chunk.offsets[collection]
+    return zip(offsets[:-1].tolist(), offsets[1:].tolist())
+
+def _kernels(chunk, n_objects):
+    """Benchmark name -> callable over the whole chunk."""
+    pt, eta, phi = chunk["Jet.PT"], chunk["Jet.Eta"], chunk["Jet.Phi"]
+    offsets = chunk.offsets["Jet"]
+    px, py, pz = cartesian(pt, eta, phi)
+    momenta = np.stack([px, py, pz], axis=1)
+    met, met_phi = chunk.first("MissingET.MET"), chunk.first("MissingET.Phi")
+    lead_pt, lead_phi = chunk.first("Jet.PT", 0.0), chunk.first("Jet.Phi", 0.0)
+    hist = NumpyHist("bench", "bench", 100, 0, 1000)
+
+    def event_shape_scalar():
+        for first, last in _per_event(chunk, "Jet"):
+            calculate_event_shape(momenta[first:last].tolist())
+
+    def fox_wolfram_scalar():
+        for first, last in _per_event(chunk, "Jet"):
+            calculate_fox_wolfram(momenta[first:last].tolist())
+
+    def delta_r_scalar():
+        eta_list, phi_list = eta.tolist(), phi.tolist()
+        for first, last in _per_event(chunk, "Jet"):
+            last = min(last, first + n_objects)
+            for i in range(first, last):
+                for j in range(i + 1, last):
+                    delta_r(eta_list[i], eta_list[j], phi_list[i], phi_list[j])
+
+    def transverse_mass_scalar():
+        for values in zip(lead_pt.tolist(), lead_phi.tolist(), met.tolist(), met_phi.tolist()):
+            transverse_mass(*values)
+
+    def hist_fill_scalar():
+        for value in pt.tolist():
+            hist.Fill(value)
+
+    return {
+        "event_shape/scalar": event_shape_scalar,
+        "event_shape/batch": lambda: event_shape_batch(px, py, pz, offsets),
+        "fox_wolfram/scalar": fox_wolfram_scalar,
+        "fox_wolfram/batch": lambda: fox_wolfram_batch(px, py, pz, offsets),
+        "delta_r/scalar": delta_r_scalar,
+        "delta_r/batch": lambda: pairwise_delta_matrices(eta, phi, offsets, n_objects),
+        "transverse_mass/scalar": transverse_mass_scalar,
+        "transverse_mass/batch": lambda: transverse_mass_array(lead_pt, lead_phi, met, met_phi),
+        "hist_fill/scalar": hist_fill_scalar,
+        "hist_fill/batch": lambda: hist.fill(pt),
+        "pipeline/batch": lambda: _pipeline(chunk, n_objects),
+    }
+
+def _pipeline(chunk, n_objects):
+    """The batched per-chunk work of the analysis, end to end."""
+    offsets = chunk.offsets["Jet"]
+    px, py, pz = cartesian(chunk["Jet.PT"], chunk["Jet.Eta"], chunk["Jet.Phi"])
+    event_shape_batch(px, py, pz, offsets)
+    fox_wolfram_batch(px, py, pz, offsets)
+    pairwise_delta_matrices(chunk["Jet.Eta"], chunk["Jet.Phi"], offsets, n_objects)
+    transverse_mass_array(chunk.first("Jet.PT", 0.0), chunk.first("Jet.Phi", 0.0),
+                          chunk.first("MissingET.MET"), chunk.first("MissingET.Phi"))
+    NumpyHist("pt", "pt", 100, 0, 1000).fill(chunk["Jet.PT"])
+
+def reference_event_shape(momentum_vectors):
+    """The original per-event calculate_event_shape loop, the reference of check_event_shapes."""
+    if len(momentum_vectors) == 0:
+        return -1, -1, -1
+
+    S = np.zeros((3, 3))
+    norm_factor_3D = sum(np.linalg.norm(p) ** 2 for p in momentum_vectors)
+    for p in momentum_vectors:
+        for i in range(3):
+            for j in range(3):
+                S[i, j] += p[i] * p[j]
+    S /= norm_factor_3D
+    eigenvalues_3D = sorted(np.linalg.eigvalsh(S), reverse=True)
+    sphericity = 1.5 * (eigenvalues_3D[1] + eigenvalues_3D[2])
+    aplanarity = 1.5 * eigenvalues_3D[2]
+
+    T = np.zeros((2, 2))
+    norm_factor_2D = sum(p[0]**2 + p[1]**2 for p in momentum_vectors)
+    for px, py, _ in momentum_vectors:
+        T[0, 0] += px * px
+        T[0, 1] += px * py
+        T[1, 0] += py * px
+        T[1, 1] += py * py
+    T /= norm_factor_2D
+    circularity = 2 * min(np.linalg.eigvalsh(T))
+    return sphericity, aplanarity, circularity
+
+def check_event_shapes(n_events=2000, seed=1, multiplicities=MULTIPLICITIES):
+    """
+    Events whose event_shape_batch or calculate_event_shape result differs in
+    any bit from the original per-event loop.
+
+    Returns:
+        list: (jet multiplicity, event, reference, batched) of every mismatch.
+    """
+    mismatches = []
+    for n_jets in multiplicities:
+        chunk = generate_chunk(n_events, seed=seed, mean_jets=n_jets)
+        px, py, pz = cartesian(chunk["Jet.PT"], chunk["Jet.Eta"], chunk["Jet.Phi"])
+        batched = np.stack(event_shape_batch(px, py, pz, chunk.offsets["Jet"]), axis=1)
+        for event, (first, last) in enumerate(_per_event(chunk, "Jet")):
+            momenta = np.stack([px[first:last], py[first:last], pz[first:last]], axis=1).tolist()
+            reference = tuple(reference_event_shape(momenta))
+            if tuple(batched[event]) != reference or tuple(calculate_event_shape(momenta)) != reference:
+                mismatches.append((n_jets, event, reference, tuple(batched[event])))
+    return mismatches
+
+def _best_time(function, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def run_kernels(n_events=2000, repeat=3, seed=1, multiplicities=MULTIPLICITIES):
+    """Time every kernel at every jet multiplicity, in microseconds per event."""
+    results = {}
+    for n_jets in multiplicities:
+        chunk = generate_chunk(n_events, seed=seed, mean_jets=n_jets)
+        for name, function in _kernels(chunk, n_jets).items():
+            results[f"{name}/jets={n_jets}"] = 1e6 * _best_time(function, repeat) / n_events
+    return results
+
+def _analysis_module(purpose):
+    """
+    Example1_updated with Delphes set up, or None (with a message) without ROOT/libDelphes.
+
+    Only a missing ROOT or libDelphes skips; any other import error of the
+    analysis is a failure and is raised.
+    """
+    if importlib.util.find_spec("ROOT") is None:
+        print(f"{purpose} skipped: ROOT is not installed", file=sys.stderr)
+        return None
+    import ROOT
+    if ROOT.gSystem.Load("libDelphes") < 0:
+        print(f"{purpose} skipped: libDelphes not found", file=sys.stderr)
+        return None
+    import Example1_updated
+    Example1_updated.setup_delphes()
+    return Example1_updated
+
+def run_end_to_end(n_events=2000, seed=1):
+    """Full run_analysis on a synthetic Delphes file; None without ROOT/libDelphes."""
+    Example1_updated = _analysis_module("end-to-end benchmark")
+    if Example1_updated is None:
+        return None
+
+    with tempfile.TemporaryDirectory() as directory:
+        input_file = os.path.join(directory, "synthetic_delphes.root")
+        write_delphes_file(input_file, generate_chunk(n_events, seed=seed))
+        stats = Example1_updated.run_analysis(input_file, os.path.join(directory, "output.root"))
+    return 1e6 * stats["wall_time"] / stats["entries"]
+
+def check_parallel(n_events=2000, seed=1, workers=2):
+    """
+    my_Tree branches that differ between a serial and a `workers`-process
+    run_analysis of the same synthetic Delphes file; None without ROOT/libDelphes.
+    """
+    Example1_updated = _analysis_module("serial/parallel check")
+    if Example1_updated is None:
+        return None
+    import ROOT
+
+    trees = []
+    with tempfile.TemporaryDirectory() as directory:
+        input_file = os.path.join(directory, "synthetic_delphes.root")
+        write_delphes_file(input_file, generate_chunk(n_events, seed=seed))
+        for n_workers in (1, workers):
+            output_file = os.path.join(directory, f"output_{n_workers}.root")
+            Example1_updated.run_analysis(input_file, output_file, workers=n_workers)
+            trees.append(ROOT.RDataFrame("my_Tree", output_file).AsNumpy())
+    serial, parallel = trees
+    return sorted(name for name in set(serial) | set(parallel)
+                  if name not in serial or name not in parallel
+                  or not np.array_equal(serial[name], parallel[name], equal_nan=True))
+
+def run_lhe(n_events=2000, repeat=3, seed=1, c_binary=None):
+    """
+    Parse throughput of iterate_lhe on a synthetic LHE file (plain and .gz), read
+    throughput of its binary columnar cache and,
+    given the compiled lhe_reader_non_decayed_tan.c, of the C macro on the same file.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        basename = os.path.join(directory, "unweighted_events")
+        write_lhe_file(basename + ".lhe", n_events, seed=seed)
+        write_lhe_file(basename + ".lhe.gz", n_events, seed=seed)
+        for name, path in [("lhe_reader/python", basename + ".lhe"), ("lhe_reader/python_gz", basename + ".lhe.gz")]:
+            results[name] = 1e6 * _best_time(lambda: sum(len(chunk) for chunk in iterate_lhe(path)), repeat) / n_events
+        # Reading the binary columnar cache (converted once, outside the timing)
+        columns = LHEColumns.load(basename + ".lhe.gz")
+        results["lhe_reader/columnar_cache"] = 1e6 * _best_time(
+            lambda: sum(float(chunk.px.sum()) for chunk in LHEColumns.load(basename + ".lhe.gz").iterate()),
+            repeat) / len(columns)
+        if c_binary:
+            if not os.path.exists(c_binary):
+                print(f"C macro benchmark skipped: {c_binary} not found", file=sys.stderr)
+            else:
+                # The macro takes the file name without .lhe and prints per event; its output is discarded
+                run = lambda: subprocess.run([os.path.abspath(c_binary), basename], cwd=directory, check=True,
+                                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                results["lhe_reader/c_macro"] = 1e6 * _best_time(run, repeat) / n_events
+    return results
+
+def compare(results, baseline, threshold):
+    """Return the benchmarks slower than the baseline by more than threshold (a fraction)."""
+    regressions = []
+    for name, value in sorted(results.items()):
+        reference = baseline.get(name)
+        if reference and value > reference * (1 + threshold):
+            regressions.append((name, reference, value))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analysis kernels on synthetic events.")
+    parser.add_argument("--events", type=int, default=2000, help="Synthetic events per multiplicity")
+    parser.add_argument("--repeat", type=int, default=3, help="Timing repetitions, the best one counts")
+    parser.add_argument("--seed", type=int, default=1, help="Generator seed")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed slowdown against the baseline as a fraction (default: 0.2)")
+    parser.add_argument("--no-end-to-end", action="store_true", help="Skip the full run_analysis benchmark")
+    parser.add_argument("--lhe-c-binary", help="Compiled lhe_reader_non_decayed_tan.c to compare the LHE reader with")
+    args = parser.parse_args()
+
+    results = run_kernels(args.events, args.repeat, args.seed)
+    results.update(run_lhe(args.events, args.repeat, args.seed, args.lhe_c_binary))
+    if not args.no_end_to_end:
+        end_to_end = run_end_to_end(args.events, args.seed)
+        if end_to_end is not None:
+            results["run_analysis/end_to_end"] = end_to_end
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+
+    print(f"{'benchmark':<36}{'us/event':>12}{'baseline':>12}{'events/s':>14}")
+    for name, value in results.items():
+        reference = f"{baseline[name]:.2f}" if name in baseline else "-"
+        print(f"{name:<36}{value:>12.2f}{reference:>12}{1e6 / value:>14.0f}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as baseline_file:
+            json.dump({"machine": platform.platform(), "python": platform.python_version(),
+                       "numpy": np.__version__, "events": args.events, "seed": args.seed,
+                       "results": results}, baseline_file, indent=1, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.threshold)
+    for name, reference, value in regressions:
+        print(f"REGRESSION {name}: {value:.2f} us/event vs baseline {reference:.2f} "
+              f"(+{value / reference - 1:.0%})")
+    mismatches = check_event_shapes(args.events, args.seed)
+    for n_jets, event, reference, batched in mismatches:
+        print(f"MISMATCH event_shape/jets={n_jets} event {event}: {batched} vs per-event loop {reference}")
+    if not args.no_end_to_end:
+        # The merged my_Tree of a parallel run must equal the serial one
+        different = check_parallel(args.events, args.seed) or []
+        for name in different:
+            print(f"MISMATCH my_Tree branch {name}: serial and parallel runs differ")
+        mismatches += different
+    return 1 if regressions or mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
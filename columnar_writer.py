@@ -0,0 +1,236 @@
+import os
+import resource
+import shutil
+import time
+import zipfile
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# NumPy type code -> ROOT leaf type
+_ROOT_TYPES = {"f": "F", "d": "D", "i": "I", "l": "L", "q": "L", "?": "O"}
+
+# Native block fill: copy every record of a block into the staging row the
+# branches point at and Fill, without a Python call per row
+_FILL_BLOCK = """
+#include <cstring>
+#include "TTree.h"
+namespace columnar_writer {
+void fill_block(TTree *tree, ULong64_t row, ULong64_t block, Long64_t n_rows, Long64_t row_size) {
+    char *target = reinterpret_cast<char *>(row);
+    const char *source = reinterpret_cast<const char *>(block);
+    for (Long64_t i = 0; i < n_rows; ++i) {
+        std::memcpy(target, source + i * row_size, row_size);
+        tree->Fill();
+    }
+}
+}
+"""
+_fill_block = None
+
+def _native_fill_block():
+    """columnar_writer::fill_block, declared to the ROOT interpreter once per process."""
+    global _fill_block
+    if _fill_block is None:
+        import ROOT
+        if not hasattr(ROOT, "columnar_writer"):
+            ROOT.gInterpreter.Declare(_FILL_BLOCK)
+        _fill_block = ROOT.columnar_writer.fill_block
+    return _fill_block
+
+class TTreeSink:
+    """Write column blocks into a TTree in the current ROOT directory (one branch per column)."""
+
+    def __init__(self, name="my_Tree", title="Tree with multiple branches"):
+        self.name = name
+        self.title = title
+        self.path = None
+
+    def open(self, dtype):
+        import ROOT
+        self.tree = ROOT.TTree(self.name, self.title)
+        current_file = self.tree.GetCurrentFile()
+        self.path = current_file.GetName() if current_file else None
+        # One-row staging record, every branch points into it
+        self._row = np.zeros(1, dtype=dtype)
+        self._views = [self._row[field] for field in dtype.names]
+        for field, view in zip(dtype.names, self._views):
+            self.tree.Branch(field, view, f"{field}/{_ROOT_TYPES[dtype[field].char]}")
+
+    def write(self, block):
+        block = np.ascontiguousarray(block, dtype=self._row.dtype)
+        _native_fill_block()(self.tree, self._row.ctypes.data, block.ctypes.data, len(block), block.dtype.itemsize)
+
+    def close(self):
+        import ROOT
+        self.tree.Write("", ROOT.TObject.kOverwrite)
+
+class NpzSink:
+    """Write column blocks into one .npz archive, one array per column and flush."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def open(self, dtype):
+        self._zip = zipfile.ZipFile(self.path, "w", zipfile.ZIP_STORED, allowZip64=True)
+        self._chunk = 0
+
+    def write(self, block):
+        for field in block.dtype.names:
+            with self._zip.open(f"{field}.{self._chunk:05d}.npy", "w", force_zip64=True) as member:
+                np.lib.format.write_array(member, np.ascontiguousarray(block[field]))
+        self._chunk += 1
+
+    def close(self):
+        self._zip.close()
+
+class ParquetSink:
+    """Write column blocks as row groups of a Parquet file (needs pyarrow)."""
+
+    def __init__(self, path):
+        if pa is None:
+            raise ImportError("ParquetSink needs pyarrow (pip install pyarrow)")
+        self.path = path
+
+    def open(self, dtype):
+        self._schema = pa.schema([(field, pa.from_numpy_dtype(dtype[field])) for field in dtype.names])
+        self._writer = pq.ParquetWriter(self.path, self._schema)
+
+    def write(self, block):
+        table = pa.table({field: block[field] for field in block.dtype.names}, schema=self._schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        self._writer.close()
+
+def read_npz(path):
+    """Load an NpzSink archive back into one concatenated array per column."""
+    with np.load(path) as archive:
+        names = sorted(archive.files)
+        columns = {}
+        for name in names:
+            field = name.rsplit(".", 2)[0]
+            columns.setdefault(field, []).append(archive[name])
+    return {field: np.concatenate(parts) for field, parts in columns.items()}
+
+def concatenate_parts(parts, path):
+    """Join NpzSink / ParquetSink outputs of several partial runs, in the given order."""
+    if path.endswith(".npz"):
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED, allowZip64=True) as merged:
+            chunk = 0
+            for part in parts:
+                with zipfile.ZipFile(part) as part_zip:
+                    names = sorted(part_zip.namelist())
+                    chunks = sorted({name.rsplit(".", 2)[1] for name in names})
+                    for old_chunk in chunks:
+                        for name in names:
+                            field, member_chunk, _ = name.rsplit(".", 2)
+                            if member_chunk == old_chunk:
+                                with part_zip.open(name) as source, \
+                                        merged.open(f"{field}.{chunk:05d}.npy", "w", force_zip64=True) as target:
+                                    shutil.copyfileobj(source, target)
+                        chunk += 1
+    else:
+        if pa is None:
+            raise ImportError("Parquet output needs pyarrow (pip install pyarrow)")
+        writer = None
+        for part in parts:
+            table = pq.read_table(part)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+        if writer is not None:
+            writer.close()
+
+class ColumnarWriter:
+    """
+    Collect per-event rows into a preallocated column block and flush it to
+    the sinks in bulk.
+
+    Values are set through `record` (a one-row structured array, so
+    `record["MET_"][0] = x` works like the old array('f') buffers) and
+    committed with fill(). Like TTree.Fill, values that are not reset carry
+    over to the next row; clear() resets all of them.
+    """
+
+    def __init__(self, columns, sinks, chunk_size=100000):
+        """
+        Args:
+            columns (list): (branch name, NumPy type) pairs.
+            sinks (list): TTreeSink / NpzSink / ParquetSink instances.
+            chunk_size (int): Rows per flush (default: 100000).
+        """
+        self.dtype = np.dtype(list(columns))
+        self.record = np.zeros(1, dtype=self.dtype)
+        self.sinks = list(sinks)
+        self.chunk_size = chunk_size
+        self._block = np.zeros(chunk_size, dtype=self.dtype)
+        self._n = 0
+        self.entries = 0
+        self._sink_time = [0.0] * len(self.sinks)
+        self._sink_bytes = [0] * len(self.sinks)
+        for sink in self.sinks:
+            sink.open(self.dtype)
+
+    def clear(self):
+        """Reset every value of the current record to zero."""
+        self.record.fill(0)
+
+    def fill(self):
+        """Commit the current record as the next row."""
+        self._block[self._n] = self.record[0]
+        self._n += 1
+        if self._n == self.chunk_size:
+            self.flush()
+
+    def fill_block(self, block):
+        """Append a whole structured block of rows (e.g. from a vectorized chunk)."""
+        start = 0
+        while start < len(block):
+            n = min(self.chunk_size - self._n, len(block) - start)
+            self._block[self._n:self._n + n] = block[start:start + n]
+            self._n += n
+            start += n
+            if self._n == self.chunk_size:
+                self.flush()
+
+    def flush(self):
+        if self._n == 0:
+            return
+        block = self._block[:self._n]
+        for i, sink in enumerate(self.sinks):
+            t0 = time.perf_counter()
+            sink.write(block)
+            self._sink_time[i] += time.perf_counter() - t0
+            self._sink_bytes[i] += block.nbytes
+        self.entries += self._n
+        self._n = 0
+
+    def close(self):
+        self.flush()
+        for i, sink in enumerate(self.sinks):
+            t0 = time.perf_counter()
+            sink.close()
+            self._sink_time[i] += time.perf_counter() - t0
+
+    def stats(self):
+        """Rows written, per-sink throughput (MB/s of column data) and peak RSS of the process."""
+        sinks = {}
+        for sink, seconds, nbytes in zip(self.sinks, self._sink_time, self._sink_bytes):
+            path = getattr(sink, "path", None)
+            sinks[type(sink).__name__] = {
+                "MB": nbytes / 1e6,
+                "seconds": seconds,
+                "MB_per_s": nbytes / 1e6 / seconds if seconds > 0 else 0.0,
+                "file_MB": os.path.getsize(path) / 1e6 if path and os.path.exists(path) else None,
+            }
+        return {
+            "entries": self.entries,
+            "sinks": sinks,
+            "peak_rss_MB": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        }
@@ -1,290 +1,204 @@
-import ROOT
-
-def compare_and_modify_histograms(file1, file2, file3, output_root_file, modified_output_root_file):
-    # X-axis labels based on histogram keywords
-    x_axis_labels = {
-        "pt": "p_{t} [GeV]",
-        "eta": "#eta",
-        "phi": "#phi [rad]",
-        "E": "E [GeV]",
-        "pz": " p_{z} [GeV]",
-        "m": " m [GeV]",
-        "Et": "Rest Energy [GeV]"
-    }
-
-
-    extra_params = [
-        "M_{a} = 500 GeV",
-        "M_{#chi}= 10 GeV"
-    ]
-
-    # Step 1: Compare histograms and save canvases into ROOT
-    def compare_histograms(file1, file2, file3, output_root_file):
-        f1 = ROOT.TFile(file1)
-        f2 = ROOT.TFile(file2)
-        f3 = ROOT.TFile(file3)
-        output_file = ROOT.TFile(output_root_file, "RECREATE")
-
-        # Automatically get histogram names from the first file
-        hist_names = [key.GetName() for key in f1.GetListOfKeys()
-                      if isinstance(f1.Get(key.GetName()), ROOT.TH1)]
-
-        for hist_name in hist_names:
-            hist1 = f1.Get(hist_name)
-            hist2 = f2.Get(hist_name)
-            hist3 = f3.Get(hist_name)
-
-            if not (hist1 and hist2 and hist3):
-                print(f"Skipping '{hist_name}': not found in all files.")
-                continue
-
-            # --- normalization ---#
-            if hist1.Integral() != 0:
-                hist1.Scale(0.03401011318)
-            if hist2.Integral() != 0:
-                hist2.Scale(0.7855705028000001)
-            if hist3.Integral() != 0:
-                hist3.Scale(0.7213413323000001)
-            #--------------
-
-            # Create square canvas and styling
-            canvas = ROOT.TCanvas(hist_name, hist_name, 800, 800)
-            # Set margins suited for square plotting frame
-            canvas.SetLeftMargin(0.15)
-            canvas.SetRightMargin(0.15)
-            canvas.SetTopMargin(0.10)
-            canvas.SetBottomMargin(0.15)
-            canvas.SetTicks(1, 1)
-            canvas.SetLogy()  # keep log scale
-
-            # Prepare histogram styles (use hist2 as frame/reference)
-            hist2.SetLineColor(ROOT.kBlue)
-            hist1.SetLineColor(ROOT.kRed)
-            hist3.SetLineColor(ROOT.kGreen)
-
-            hist1.SetStats(0)
-            hist2.SetStats(0)
-            hist3.SetStats(0)
-
-            # Make sure hist2 provides the axes/frame so we can control axis ranges and titles
-            hist2.GetYaxis().SetTitle("Number of Events")
-            hist2.GetYaxis().CenterTitle(True)
-            hist2.GetXaxis().CenterTitle(True)
-
-            # Draw frame first and then others
-            hist2.Draw("HIST")
-            hist1.Draw("HIST SAME")
-            hist3.Draw("HIST SAME")
-
-            # Set X axis title if keyword matches
-            for key, label in x_axis_labels.items():
-                if key in hist_name:
-                    hist2.GetXaxis().SetTitle(label)
-                    break
-
-            # Manual Y-range padding (safe for log scale)
-            # Get reasonable non-zero minimum
-            y_min = hist2.GetMinimum()
-            y_max = hist2.GetMaximum()
-            # If histogram contains zeros or negative values (common with log scale),
-            # choose a small positive floor for the minimum to display in log scale.
-            if y_min <= 0 or ROOT.gPad.GetLogy():
-                # find the smallest non-zero bin content among hist2, hist1, hist3
-                min_nonzero = None
-                for h in (hist1, hist2, hist3):
-                    for ibin in range(1, h.GetNbinsX() + 1):
-                        val = h.GetBinContent(ibin)
-                        if val > 0:
-                            if min_nonzero is None or val < min_nonzero:
-                                min_nonzero = val
-                if min_nonzero is None:
-                    # fallback tiny positive value
-                    min_nonzero = 1e-6
-                # set lower bound a bit below min_nonzero but positive
-                y_floor = max(min_nonzero * 0.5, 1e-9)
-                y_top = max(y_max * 1.2, min_nonzero * 10.0)
-                hist2.SetMinimum(y_floor)
-                hist2.SetMaximum(y_top)
-            else:
-                # linear scale safe padding
-                hist2.SetMinimum(y_min * 0.9 if y_min > 0 else y_min - abs(y_min) * 0.1)
-                hist2.SetMaximum(y_max * 1.2)
-
-            # Manual X-range padding similar to Step 2
-            bin_min = hist2.GetXaxis().GetFirst()
-            bin_max = hist2.GetXaxis().GetLast()
-            x_min = hist2.GetBinLowEdge(bin_min)
-            x_max = hist2.GetXaxis().GetBinUpEdge(bin_max)
-            # Protect against degenerate axis
-            if x_max == x_min:
-                # fallback to histogram's actual axis min/max
-                x_min = hist2.GetXaxis().GetXmin()
-                x_max = hist2.GetXaxis().GetXmax()
-            padding = 0.01 * (x_max - x_min) if (x_max - x_min) != 0 else 0.01 * abs(x_min if x_min != 0 else 1.0)
-            hist2.GetXaxis().SetRangeUser(x_min - padding, x_max + padding)
-            
-            # Particle + extra params label using TLatex (top-left **outside** frame, in ONE row)
-            latex = ROOT.TLatex()
-            latex.SetNDC(True)
-            latex.SetTextFont(43)
-            latex.SetTextSize(20)
-            latex.SetTextAlign(13)
-            latex.DrawLatex(0.16, 0.94, f"{hist_name}")
-
-# Start near the top-left, outside plotting frame
-            x_pos = 0.40
-            y_pos = 0.94
-
-# Then draw all extra params on the same row
-            for param in extra_params:
-                latex.DrawLatex(x_pos, y_pos, param)
-                x_pos += 0.25  # move further right each time
-            # Process title centered above everything
-            #latex.SetTextSize(22)
-            #latex.SetTextAlign(23)  # center alignment
-            #latex.DrawLatex(0.5, 0.9, "g g > h_{1} x_{d} x_{d}~")
-            # Legend
-            legend = ROOT.TLegend(0.70, 0.70, 0.76, 0.85)
-            legend.SetBorderSize(0)
-            legend.SetTextFont(43)
-            legend.SetTextSize(20)
-            legend.AddEntry(hist1, "tan#theta = 1.0", "l")
-            legend.AddEntry(hist2, "tan#theta = 10.0", "l")
-            legend.AddEntry(hist3, "tan#theta = 15.0", "l")
-            legend.Draw()
+import argparse
 
-            # Enforce square plotting frame (equal aspect ratio)
-            canvas.Update()  # must update before touching gPad
-            try:
-                # Use a fixed aspect ratio of 1:1 for the pad plotting area
-                ROOT.gPad.SetFixedAspectRatio(1.0)
-            except Exception:
-                # If SetFixedAspectRatio not available in your ROOT, fall back to adjusting margins
-                pass
-
-            # Re-draw to make sure axes apply
-            canvas.Modified()
-            canvas.Update()
-
-            canvas.Write()
-            print(f"Saved comparison for histogram '{hist_name}'.")
-
-        f1.Close()
-        f2.Close()
-        f3.Close()
-        output_file.Close()
+import ROOT
 
-    # Step 2: Modify histograms + save to new ROOT + multipage PDF
-    def modify_histograms(input_root_file, output_root_file):
-        input_file = ROOT.TFile(input_root_file, "READ")
+from histogram_compare import CACHE_DIR, load_config, load_samples, log_y_range, overlays, sample_color
+from normalization import normalize
+from plot_render import render_plots
+
+# X-axis labels based on histogram keywords
+X_AXIS_LABELS = {
+    "pt": "p_{t} [GeV]",
+    "eta": "#eta",
+    "phi": "#phi [rad]",
+    "E": "E [GeV]",
+    "pz": " p_{z} [GeV]",
+    "m": " m [GeV]",
+    "Et": "Rest Energy [GeV]"
+}
+
+def draw_comparison(hist_name, data, style):
+    """
+    Build the styled comparison canvas of one histogram straight from its arrays.
+
+    Args:
+        hist_name (str): Histogram name, also the canvas name.
+        data (list): HistogramData per sample, already scaled.
+        style (dict): "labels", "colors", "extra_params", "title" and "x_title".
+
+    Returns:
+        tuple: (canvas, objects that must stay alive while the canvas is used).
+    """
+    hists = [hist_data.to_root(f"{hist_name}_{k}") for k, hist_data in enumerate(data)]
+    frame = hists[0]
+
+    # Create square canvas and styling
+    canvas = ROOT.TCanvas(hist_name, hist_name, 800, 800)
+    # Set margins suited for square plotting frame
+    canvas.SetLeftMargin(0.15)
+    canvas.SetRightMargin(0.15)
+    canvas.SetTopMargin(0.10)
+    canvas.SetBottomMargin(0.15)
+    canvas.SetTicks(1, 1)
+    canvas.SetLogy()  # keep log scale
+
+    # Prepare histogram styles (the first sample provides the frame)
+    for hist, color in zip(hists, style["colors"]):
+        hist.SetLineColor(color)
+        hist.SetLineWidth(3)
+        hist.SetStats(0)
+
+    # Make sure the frame provides the axes so we can control axis ranges and titles
+    frame.SetTitle(style["title"])
+    frame.GetYaxis().SetTitle("Number of Events")
+    frame.GetYaxis().CenterTitle(True)
+    frame.GetXaxis().CenterTitle(True)
+    if style["x_title"]:
+        frame.GetXaxis().SetTitle(style["x_title"])
+    frame.GetXaxis().SetTitleOffset(1.2)
+    frame.GetYaxis().SetTitleOffset(1.0)
+    frame.GetXaxis().SetLabelSize(0.04)
+    frame.GetYaxis().SetLabelSize(0.04)
+    frame.GetXaxis().SetTitleSize(0.045)
+    frame.GetYaxis().SetTitleSize(0.045)
+
+    # Log-scale Y range from the smallest positive and the largest content of all samples
+    y_floor, y_top = log_y_range(data)
+    frame.SetMinimum(y_floor)
+    frame.SetMaximum(y_top * 1.2)
+
+    # Manual X-range padding
+    x_min, x_max = data[0].edges[0], data[0].edges[-1]
+    padding = 0.01 * (x_max - x_min) if (x_max - x_min) != 0 else 0.01 * abs(x_min if x_min != 0 else 1.0)
+    frame.GetXaxis().SetRangeUser(x_min - padding, x_max + padding)
+
+    # Draw frame first and then others
+    frame.Draw("HIST")
+    for hist in hists[1:]:
+        hist.Draw("HIST SAME")
+
+    # Particle + extra params label using TLatex (top-left **outside** frame, in ONE row)
+    latex = ROOT.TLatex()
+    latex.SetNDC(True)
+    latex.SetTextFont(43)
+    latex.SetTextSize(20)
+    latex.SetTextAlign(13)
+    latex.DrawLatex(0.16, 0.94, f"{hist_name}")
+
+    # Start near the top-left, outside plotting frame, then all extra params on the same row
+    x_pos = 0.40
+    y_pos = 0.94
+    for param in style["extra_params"]:
+        latex.DrawLatex(x_pos, y_pos, param)
+        x_pos += 0.25  # move further right each time
+
+    # Legend, one entry per sample; grows downwards with the number of samples
+    legend = ROOT.TLegend(0.70, max(0.85 - 0.05 * len(hists), 0.15), 0.76, 0.85)
+    legend.SetBorderSize(0)
+    legend.SetTextFont(43)
+    legend.SetTextSize(20)
+    for hist, label in zip(hists, style["labels"]):
+        legend.AddEntry(hist, label, "l")
+    legend.Draw()
+
+    # Enforce square plotting frame (equal aspect ratio)
+    canvas.Update()  # must update before touching gPad
+    try:
+        # Use a fixed aspect ratio of 1:1 for the pad plotting area
+        ROOT.gPad.SetFixedAspectRatio(1.0)
+    except Exception:
+        # If SetFixedAspectRatio not available in your ROOT, fall back to adjusting margins
+        pass
+
+    # Re-draw to make sure axes apply
+    canvas.Modified()
+    canvas.Update()
+    return canvas, (hists, latex, legend)
+
+def compare_and_modify_histograms(samples, output_root_file=None, extra_params=None, luminosity=1.0,
+                                  workers=None, cache_dir=CACHE_DIR, plot_dir=".", formats=("pdf",), multipage=None,
+                                  title="g g > h1 xd xd~", force=False):
+    """
+    Overlay the histograms of any number of samples in one pass: the styled
+    canvases are built straight from the histogram arrays and rendered in
+    parallel, skipping plots whose output is up to date.
+
+    Args:
+        samples (list): One dict per sample with "path", "label", the cross-section
+            source ("xsec", "table" or "banner", see normalization.py) or an explicit
+            "scale", and optionally "color".
+        output_root_file (str): Also write the styled canvases to this ROOT file;
+            every plot is drawn again for it, up-to-date ones included.
+        extra_params (list): Model parameters drawn above every plot.
+        luminosity (float): Target integrated luminosity in fb^-1.
+        workers (int): Processes reading the sample files and rendering plots.
+        cache_dir (str): Histogram array cache directory (None: always read the sample files).
+        plot_dir (str): Directory of the per-histogram plot files.
+        formats (tuple): Plot file extensions, e.g. ("pdf", "png").
+        multipage (str): Also write every plot into this multipage PDF.
+        title (str): Frame title.
+        force (bool): Re-render every plot.
+    """
+    if extra_params is None:
+        extra_params = [
+            "M_{a} = 500 GeV",
+            "M_{#chi}= 10 GeV"
+        ]
+
+    # Every file's histograms are read once, in parallel, before drawing
+    inventories = load_samples([sample["path"] for sample in samples], workers, cache_dir)
+    samples = normalize(samples, inventories, luminosity)
+    labels = [sample["label"] for sample in samples]
+    colors = [sample_color(sample, k) for k, sample in enumerate(samples)]
+
+    plots = []
+    for hist_name, data in overlays(samples, inventories):
+        # Set X axis title if keyword matches
+        x_title = next((label for key, label in X_AXIS_LABELS.items() if key in hist_name), "")
+        plots.append((hist_name, data, {"labels": labels, "colors": colors, "extra_params": list(extra_params),
+                                        "title": title, "x_title": x_title}))
+
+    rendered = render_plots(draw_comparison, plots, plot_dir, formats, workers, multipage, force)
+    print(f"Rendered {len(rendered)} of {len(plots)} plots into '{plot_dir}' "
+          f"({len(plots) - len(rendered)} up to date).")
+
+    if output_root_file:
         output_file = ROOT.TFile(output_root_file, "RECREATE")
-        keys = input_file.GetListOfKeys()
-
-        c = ROOT.TCanvas("c", "c", 800, 800)
-        c.SetLeftMargin(0.15)
-        c.SetRightMargin(0.15)
-        c.SetTopMargin(0.1)
-        c.SetBottomMargin(0.15)
-        c.SetTicks(1, 1)
-
-        #c.Print("output_tan_norm.pdf[")
-
-        for key in keys:
-            obj_name = key.GetName()
-            canvas = input_file.Get(obj_name)
-
-            if not isinstance(canvas, ROOT.TCanvas):
-                continue
-
-            primitives = canvas.GetListOfPrimitives()
-            for primitive in primitives:
-                # Match TH1 and TH2 improvements; you used TH2 earlier but be flexible
-                if isinstance(primitive, ROOT.TH2) or isinstance(primitive, ROOT.TH1):
-                    # set y-axis title for consistency
-                    try:
-                        primitive.GetYaxis().SetTitle("Number of Events")
-                        primitive.GetYaxis().CenterTitle(True)
-                        primitive.GetXaxis().CenterTitle(True)
-                    except Exception:
-                        pass
-
-                    for key_, label in x_axis_labels.items():
-                        if key_ in primitive.GetName():
-                            primitive.GetXaxis().SetTitle(label)
-                            break
-
-                    canvas.SetCanvasSize(800, 800)
-                    canvas.SetWindowSize(900, 900)
-                    primitive.GetXaxis().SetTitleOffset(1.2)
-                    primitive.GetYaxis().SetTitleOffset(1.0)
-                    primitive.GetXaxis().SetLabelSize(0.04)
-                    primitive.GetYaxis().SetLabelSize(0.04)
-                    primitive.GetXaxis().SetTitleSize(0.045)
-                    primitive.GetYaxis().SetTitleSize(0.045)
-                    primitive.SetLineWidth(3)
-
-                    # Get histogram min and max from non-empty bins
-                    try:
-                        y_min = primitive.GetMinimum()
-                        y_max = primitive.GetMaximum()
-                        if y_min <= 0 or ROOT.gPad.GetLogy():
-                            # compute smallest positive bin content
-                            min_nonzero = None
-                            nb = primitive.GetNbinsX()
-                            for ibin in range(1, nb + 1):
-                                val = primitive.GetBinContent(ibin)
-                                if val > 0:
-                                    if min_nonzero is None or val < min_nonzero:
-                                        min_nonzero = val
-                            if min_nonzero is None:
-                                min_nonzero = 1e-6
-                            primitive.SetMinimum(max(min_nonzero * 0.5, 1e-9))
-                            primitive.SetMaximum(max(y_max * 1.2, min_nonzero * 10.0))
-                        else:
-                            primitive.SetMinimum(y_min * 0.9 if y_min > 0 else y_min - abs(y_min) * 0.1)
-                            primitive.SetMaximum(y_max * 1.2)
-                    except Exception:
-                        pass
-
-                    # X-axis padding
-                    try:
-                        bin_min = primitive.GetXaxis().GetFirst()
-                        bin_max = primitive.GetXaxis().GetLast()
-                        x_min = primitive.GetBinLowEdge(bin_min)
-                        x_max = primitive.GetXaxis().GetBinUpEdge(bin_max)
-                        padding = 0.01 * (x_max - x_min)
-                        primitive.GetXaxis().SetRangeUser(x_min - padding, x_max + padding)
-                    except Exception:
-                        pass
-
-                    primitive.SetTitle("g g > h1 xd xd~")
-
-            canvas.Update()
+        for plot in plots:
+            canvas, _keep = draw_comparison(*plot)
             canvas.Write()
-            #canvas.Print("output_tan_norm.pdf")  # add one page to PDF
-
-        # Close multipage PDF
-        #c.Print("output_tan_norm.pdf]")
-        #save each canvas in its own pdf
-            pdf_filename = f"{obj_name}.pdf"
-            canvas.Print(pdf_filename)
-            print(f"Saved separate PDF: {pdf_filename}")
-
-        input_file.Close()
         output_file.Close()
-        print(f"Modified histograms saved to '{output_root_file}' and to 'output_tan_norm.pdf'.")
+        print(f"Saved {len(plots)} comparison canvases to '{output_root_file}'.")
 
-    # Run both steps
-    compare_histograms(file1, file2, file3, output_root_file)
-    modify_histograms(output_root_file, modified_output_root_file)
 
+# Default samples: the tan(theta) scan, normalized with the cross sections of their run banners
+SAMPLES = [
+    {"path": "../bin/template_gg_h1xdxd_sin/Events/run_06_decayed_1/unweighted_events.root",
+     "label": "tan#theta = 1.0"},
+    {"path": "../bin/template_gg_h1xdxd_sin/Events/run_14_decayed_1/unweighted_events.root",
+     "label": "tan#theta = 10.0"},
+    {"path": "../bin/template_gg_h1xdxd_sin/Events/run_15_decayed_1/unweighted_events.root",
+     "label": "tan#theta = 15.0"},
+]
 
-# Example usage (unchanged)
 if __name__ == "__main__":
-    compare_and_modify_histograms(
-        "../bin/template_gg_h1xdxd_sin/Events/run_06_decayed_1/unweighted_events.root",
-        "../bin/template_gg_h1xdxd_sin/Events/run_14_decayed_1/unweighted_events.root",
-        "../bin/template_gg_h1xdxd_sin/Events/run_15_decayed_1/unweighted_events.root",
-        "histogram_tan_comparison_tan.root",
-        "modified_histogram_tan_comparison_tan.root"
-    )
+    parser = argparse.ArgumentParser(description="Overlay the histograms of N samples.")
+    parser.add_argument("--config", help="comparison config (.json or .yaml) with samples and extra_params")
+    parser.add_argument("--output",
+                        help="also write the styled canvases to this ROOT file (redraws every plot)")
+    parser.add_argument("--plot-dir", default=".", help="directory of the per-histogram plots")
+    parser.add_argument("--formats", default="pdf", help="comma-separated plot formats, e.g. pdf,png")
+    parser.add_argument("--multipage", help="also write all plots into this multipage PDF")
+    parser.add_argument("--force", action="store_true", help="re-render plots that are up to date")
+    parser.add_argument("--luminosity", type=float, default=1.0, help="target luminosity in fb^-1")
+    parser.add_argument("--workers", type=int, help="processes reading the sample files and rendering plots")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="histogram array cache directory")
+    parser.add_argument("--no-cache", action="store_true", help="always read the sample files")
+    args = parser.parse_args()
+
+    config = load_config(args.config) if args.config else {"samples": SAMPLES}
+    compare_and_modify_histograms(config["samples"], args.output, extra_params=config.get("extra_params"),
+                                  luminosity=args.luminosity, workers=args.workers,
+                                  cache_dir=None if args.no_cache else args.cache_dir,
+                                  plot_dir=args.plot_dir, formats=tuple(args.formats.split(",")),
+                                  multipage=args.multipage, force=args.force)
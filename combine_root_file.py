@@ -1,6 +1,26 @@
+import argparse
+
 import ROOT
 
-def compare_and_modify_histograms(file1, file2, file3, output_root_file, modified_output_root_file):
+from histogram_compare import CACHE_DIR, load_config, load_samples, overlays, sample_color
+from normalization import normalize
+
+def compare_and_modify_histograms(samples, output_root_file, modified_output_root_file, extra_params=None,
+                                  luminosity=1.0, workers=None, cache_dir=CACHE_DIR):
+    """
+    Overlay the histograms of any number of samples and restyle the result.
+
+    Args:
+        samples (list): One dict per sample with "path", "label", the cross-section
+            source ("xsec", "table" or "banner", see normalization.py) or an explicit
+            "scale", and optionally "color".
+        output_root_file (str): ROOT file for the comparison canvases.
+        modified_output_root_file (str): ROOT file for the restyled canvases.
+        extra_params (list): Model parameters drawn under the particle label.
+        luminosity (float): Target integrated luminosity in fb^-1.
+        workers (int): Processes reading the sample files (default: one per file).
+        cache_dir (str): Histogram array cache directory (None: always read the sample files).
+    """
     # X-axis labels based on histogram keywords
     x_axis_labels = {
         "pt": "Transverse Momentum (p_t) [GeV]",
@@ -22,57 +42,43 @@ def compare_and_modify_histograms(file1, file2, file3, output_root_file, modifie
         "bj_": "Bottom Anti_Quark Jet",
     }
     
-    extra_params = [
-        "M_{a} = 200 GeV",
-        "M_{#chi}= 10 GeV"
-    ]
+    if extra_params is None:
+        extra_params = [
+            "M_{a} = 200 GeV",
+            "M_{#chi}= 10 GeV"
+        ]
     
     # Step 1: Compare histograms and save canvases into ROOT
-    def compare_histograms(file1, file2, file3, output_root_file):
-        f1 = ROOT.TFile(file1)
-        f2 = ROOT.TFile(file2)
-        f3 = ROOT.TFile(file3)
+    def compare_histograms(samples, output_root_file):
+        # Every file's histograms are read once, in parallel, before drawing
+        inventories = load_samples([sample["path"] for sample in samples], workers, cache_dir)
+        samples = normalize(samples, inventories, luminosity)
         output_file = ROOT.TFile(output_root_file, "RECREATE")
 
-        # Automatically get histogram names from the first file
-        hist_names = [key.GetName() for key in f1.GetListOfKeys()
-                      if isinstance(f1.Get(key.GetName()), ROOT.TH1)]
-
-        for hist_name in hist_names:
-            hist1 = f1.Get(hist_name)
-            hist2 = f2.Get(hist_name)
-            hist3 = f3.Get(hist_name)
-
-            if not (hist1 and hist2 and hist3):
-                print(f"Skipping '{hist_name}': not found in all files.")
-                continue
+        for hist_name, data in overlays(samples, inventories):
+            hists = [hist_data.to_root(f"{hist_name}_{k}") for k, hist_data in enumerate(data)]
 
             canvas = ROOT.TCanvas(hist_name, hist_name, 800, 800)
             canvas.SetLeftMargin(0.15)
-            hist1.SetLineColor(ROOT.kRed)
-            hist2.SetLineColor(ROOT.kBlue)
-            hist3.SetLineColor(ROOT.kGreen)
-
-            hist1.SetStats(0)
-            hist2.SetStats(0)
-            hist3.SetStats(0)
+            for k, (sample, hist) in enumerate(zip(samples, hists)):
+                hist.SetLineColor(sample_color(sample, k))
+                hist.SetStats(0)
 
-            hist1.Draw("HIST")
-            hist2.Draw("HIST SAME")
-            hist3.Draw("HIST SAME")
+            hists[0].Draw("HIST")
+            for hist in hists[1:]:
+                hist.Draw("HIST SAME")
 
             for key, label in x_axis_labels.items():
                 if key in hist_name:
-                    hist1.GetXaxis().SetTitle(label)
+                    hists[0].GetXaxis().SetTitle(label)
                     break
 
-            legend = ROOT.TLegend(0.7, 0.7, 0.8, 0.85)
+            legend = ROOT.TLegend(0.7, max(0.85 - 0.05 * len(samples), 0.15), 0.8, 0.85)
             legend.SetBorderSize(0)
             legend.SetTextFont(43)
             legend.SetTextSize(20)
-            legend.AddEntry(hist1, "M_{H} = 400 GeV", "l")
-            legend.AddEntry(hist2, "M_{H} = 700 GeV", "l")
-            legend.AddEntry(hist3, "M_{H} = 1000 GeV", "l")
+            for sample, hist in zip(samples, hists):
+                legend.AddEntry(hist, sample["label"], "l")
             legend.Draw()
 
             latex = ROOT.TLatex()
@@ -96,9 +102,6 @@ def compare_and_modify_histograms(file1, file2, file3, output_root_file, modifie
             canvas.Write()
             print(f"Saved comparison for histogram '{hist_name}'.")
 
-        f1.Close()
-        f2.Close()
-        f3.Close()
         output_file.Close()
 
     # Step 2: Modify histograms + save to new ROOT + multipage PDF
@@ -163,16 +166,30 @@ def compare_and_modify_histograms(file1, file2, file3, output_root_file, modifie
         print(f"Modified histograms saved to '{output_root_file}' and to 'output.pdf'.")
 
     # Run both steps
-    compare_histograms(file1, file2, file3, output_root_file)
+    compare_histograms(samples, output_root_file)
     modify_histograms(output_root_file, modified_output_root_file)
 
 
-# Example usage
-compare_and_modify_histograms(
-    "../bin/template_h_decay/Events/run_01_decayed_1/unweighted_events.root",
-    "../bin/template_h_decay/Events/run_02_decayed_1/unweighted_events.root",
-    "../bin/template_h_decay/Events/run_03_decayed_1/unweighted_events.root",
-    "histogram_h_decay1_comparison.root",
-    "modified_histogram_h_decay1_comparison.root"
-)
-
+# Default samples: the heavy Higgs mass scan
+SAMPLES = [
+    {"path": "../bin/template_h_decay/Events/run_01_decayed_1/unweighted_events.root", "label": "M_{H} = 400 GeV"},
+    {"path": "../bin/template_h_decay/Events/run_02_decayed_1/unweighted_events.root", "label": "M_{H} = 700 GeV"},
+    {"path": "../bin/template_h_decay/Events/run_03_decayed_1/unweighted_events.root", "label": "M_{H} = 1000 GeV"},
+]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Overlay the histograms of N samples.")
+    parser.add_argument("--config", help="comparison config (.json or .yaml) with samples and extra_params")
+    parser.add_argument("--output", default="histogram_h_decay1_comparison.root")
+    parser.add_argument("--modified-output", default="modified_histogram_h_decay1_comparison.root")
+    parser.add_argument("--luminosity", type=float, default=1.0, help="target luminosity in fb^-1")
+    parser.add_argument("--workers", type=int, help="processes reading the sample files")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="histogram array cache directory")
+    parser.add_argument("--no-cache", action="store_true", help="always read the sample files")
+    args = parser.parse_args()
+
+    config = load_config(args.config) if args.config else {"samples": SAMPLES}
+    compare_and_modify_histograms(config["samples"], args.output, args.modified_output,
+                                  extra_params=config.get("extra_params"), luminosity=args.luminosity,
+                                  workers=args.workers,
+                                  cache_dir=None if args.no_cache else args.cache_dir)
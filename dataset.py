@@ -0,0 +1,136 @@
+"""
+Dataset-level runs: many input files, one partial output per file and a
+checkpoint manifest, so an interrupted run resumes where it stopped.
+
+A file is skipped when the manifest already has it as done with the same
+input fingerprint (path, size, mtime) and the same configuration hash
+(analysis options plus the contents of the analysis sources). Fingerprints
+need local files, so remote (xrootd, http, ...) inputs are rejected.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import time
+
+MANIFEST_NAME = "manifest.json"
+
+def expand_dataset(inputs):
+    """
+    Expand dataset inputs into a sorted, de-duplicated list of ROOT files.
+
+    Accepts file paths, glob patterns, directories (searched recursively for
+    *.root) and file lists (@list, one path or glob per line). Remote paths
+    (containing "://") are kept as given.
+    """
+    files = []
+    for item in inputs:
+        if item.startswith("@"):
+            with open(item[1:]) as file_list:
+                lines = [line.strip() for line in file_list]
+            files.extend(expand_dataset([line for line in lines if line and not line.startswith("#")]))
+        elif os.path.isdir(item):
+            files.extend(glob.glob(os.path.join(item, "**", "*.root"), recursive=True))
+        else:
+            matches = glob.glob(item)
+            files.extend(matches if matches else [item])
+    return sorted(set(path if "://" in path else os.path.abspath(path) for path in files))
+
+def config_hash(options, config_files=()):
+    """Hash of the analysis options and of the source/config files that define the analysis."""
+    digest = hashlib.sha1(json.dumps(options, sort_keys=True, default=str).encode())
+    for path in config_files:
+        with open(path, "rb") as config_file:
+            digest.update(config_file.read())
+    return digest.hexdigest()
+
+def input_fingerprint(path):
+    """Size and mtime of a local input file."""
+    if "://" in path:
+        raise ValueError(f"Cannot checkpoint remote input '{path}': dataset runs need local files "
+                         "(copy it locally or run it on its own without --output-dir)")
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+def partial_output_name(path):
+    """Unique partial output name, e.g. run_01_decayed_1_unweighted_events.<hash>.root."""
+    parent = os.path.basename(os.path.dirname(path))
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return f"{parent}_{stem}.{hashlib.sha1(path.encode()).hexdigest()[:8]}.root"
+
+def load_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {"files": {}}
+    with open(path) as manifest_file:
+        return json.load(manifest_file)
+
+def save_manifest(output_dir, manifest):
+    """Write the manifest atomically so a crash never leaves it half written."""
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    with open(path + ".tmp", "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+def run_dataset(inputs, output_dir, analyse, options=None, config_files=(), merged_output=None):
+    """
+    Run an analysis over every file of a dataset with per-file checkpoints.
+
+    Args:
+        inputs (list): Paths, globs, directories or file lists (see expand_dataset).
+        output_dir (str): Directory for partial outputs and the manifest.
+        analyse (callable): analyse(input_file, output_file, **options) -> stats dict.
+        options (dict): Analysis options, part of the configuration hash.
+        config_files (list): Files whose contents are part of the configuration hash.
+        merged_output (str): If given, merge all partial outputs into this file.
+
+    Returns:
+        dict: the manifest.
+    """
+    options = options or {}
+    os.makedirs(output_dir, exist_ok=True)
+    files = expand_dataset(inputs)
+    current_hash = config_hash(options, config_files)
+    # Fingerprint every input first, so a remote or missing file fails before any work
+    fingerprints = [input_fingerprint(path) for path in files]
+    manifest = load_manifest(output_dir)
+    manifest["config_hash"] = current_hash
+
+    for index, (path, fingerprint) in enumerate(zip(files, fingerprints)):
+        output = os.path.join(output_dir, partial_output_name(path))
+        entry = manifest["files"].get(path, {})
+        if (entry.get("status") == "done" and entry.get("config_hash") == current_hash
+                and entry.get("size") == fingerprint["size"] and entry.get("mtime") == fingerprint["mtime"]
+                and os.path.exists(output)):
+            print(f"[{index + 1}/{len(files)}] up to date, skipping: {path}")
+            continue
+
+        print(f"[{index + 1}/{len(files)}] processing: {path}")
+        manifest["files"][path] = dict(fingerprint, status="running", output=output, config_hash=current_hash)
+        save_manifest(output_dir, manifest)
+
+        # Write under a temporary name so only complete outputs carry the final name
+        temporary = output[:-len(".root")] + ".tmp.root"
+        started = time.time()
+        stats = analyse(path, temporary, **options)
+        for extension in (".root", ".npz", ".parquet"):
+            if os.path.exists(temporary[:-len(".root")] + extension):
+                os.replace(temporary[:-len(".root")] + extension, output[:-len(".root")] + extension)
+        manifest["files"][path].update(status="done", entries=stats.get("entries"),
+                                       seconds=time.time() - started)
+        save_manifest(output_dir, manifest)
+
+    if merged_output:
+        merge_outputs([manifest["files"][path]["output"] for path in files], merged_output)
+    return manifest
+
+def merge_outputs(parts, merged_output):
+    """Merge per-file outputs (my_Tree and histograms) into one ROOT file, in the given order."""
+    import ROOT
+    merger = ROOT.TFileMerger(False)
+    merger.OutputFile(merged_output, "RECREATE")
+    for part in parts:
+        merger.AddFile(part)
+    if not merger.Merge():
+        raise RuntimeError(f"Failed to merge {len(parts)} partial outputs into {merged_output}")
@@ -0,0 +1,146 @@
+"""
+Vectorized mother-daughter index of LHE events.
+
+DecayTree turns the 1-based per-event mother columns of an LHEChunk into
+flat parent indices once per chunk. Generator-level selections then become
+array queries over all particles of the chunk, instead of per-particle
+Id[Mother1[i]] checks:
+
+    tree = DecayTree(chunk)
+    b_from_h_from_A = tree.select([5, -5], chain=[25, 36])   # b <- h <- A
+    xd = tree.select([52, -52])
+    n_b = tree.count(b_from_h_from_A)                         # per event
+    daughters, offsets = tree.daughters()                     # jagged, per particle
+
+Parents follow mother1. A chain lists the ids of the parent, grandparent,
+... and each entry may be one id or a list of allowed ids. With
+immediate=False the chain only has to appear in order somewhere in the
+ancestry (e.g. across h -> h copies of showered records).
+"""
+
+import numpy as np
+
+def _id_mask(ids, values):
+    """Particles whose id is one of `values` (an int or a list of ints)."""
+    return np.isin(ids, np.atleast_1d(values))
+
+class DecayTree:
+    """Flat parent and daughter index of the particles of one LHEChunk."""
+
+    def __init__(self, chunk):
+        self.chunk = chunk
+        self.id = np.asarray(chunk.id)
+        self.offsets = chunk.offsets
+        self.event = chunk.event_index()
+        self.parent = self._flat_index(chunk.mother1)
+        self._second_parent = None
+
+    @property
+    def second_parent(self):
+        """Flat index of every particle's mother2 (only daughters() needs it, so chunks may omit the column)."""
+        if self._second_parent is None:
+            self._second_parent = self._flat_index(self.chunk.mother2)
+        return self._second_parent
+
+    def _flat_index(self, mother):
+        """Flat index of a 1-based in-event mother column, -1 for none (0, out of range or self)."""
+        mother = np.asarray(mother, dtype=np.int64)
+        starts = self.offsets[:-1][self.event]
+        counts = np.diff(self.offsets)[self.event]
+        index = starts + mother - 1
+        valid = (mother > 0) & (mother <= counts) & (index != np.arange(len(mother)))
+        return np.where(valid, index, -1)
+
+    def __len__(self):
+        return len(self.id)
+
+    def parent_id(self):
+        """PDG id of the parent of every particle (0 without one)."""
+        return np.where(self.parent >= 0, self.id[self.parent], 0)
+
+    def ancestors(self, max_depth=None):
+        """
+        Flat indices of the ancestors of every particle.
+
+        Returns:
+            np.ndarray: (particles, depth) array; column k is the (k + 1)-th
+            ancestor, -1 once the chain ends.
+        """
+        max_depth = int(np.diff(self.offsets).max(initial=0)) if max_depth is None else max_depth
+        columns, current = [], self.parent
+        # One step up for all particles at once; records are shallow, and
+        # max_depth bounds the walk on malformed (cyclic) ones
+        while len(columns) < max_depth and (current >= 0).any():
+            columns.append(current)
+            current = np.where(current >= 0, self.parent[np.clip(current, 0, None)], -1)
+        return np.column_stack(columns) if columns else np.full((len(self), 0), -1, dtype=np.int64)
+
+    def ancestor_ids(self, max_depth=None):
+        """PDG ids of the ancestors of every particle, (particles, depth), 0 once the chain ends."""
+        ancestors = self.ancestors(max_depth)
+        return np.where(ancestors >= 0, self.id[np.clip(ancestors, 0, None)], 0)
+
+    def depth(self):
+        """Number of ancestors of every particle."""
+        return (self.ancestors() >= 0).sum(axis=1)
+
+    def has_chain(self, chain, immediate=True):
+        """
+        Particles whose ancestry matches a chain of ids.
+
+        Args:
+            chain (list): Ids (or lists of allowed ids) of the parent, grandparent, ...
+            immediate (bool): The chain must be the direct parent, grandparent, ...;
+                otherwise its entries only have to appear in this order among the ancestors.
+        """
+        chain = list(chain)
+        if not chain:
+            return np.ones(len(self), dtype=bool)
+        ancestor_ids = self.ancestor_ids(len(chain) if immediate else None)
+        if immediate:
+            if ancestor_ids.shape[1] < len(chain):
+                return np.zeros(len(self), dtype=bool)
+            return np.logical_and.reduce([_id_mask(ancestor_ids[:, k], ids) for k, ids in enumerate(chain)])
+        # Ordered subsequence match: matched[i] is how much of the chain particle i has seen so far
+        matched = np.zeros(len(self), dtype=np.int64)
+        for column in ancestor_ids.T:
+            for k, ids in enumerate(chain):
+                step = (matched == k) & _id_mask(column, ids)
+                matched[step] += 1
+                # One chain entry per ancestor
+                column = np.where(step, 0, column)
+        return matched == len(chain)
+
+    def select(self, ids, chain=(), immediate=True):
+        """Particles with one of `ids` whose ancestry matches `chain` (see has_chain)."""
+        mask = _id_mask(self.id, ids)
+        return mask & self.has_chain(chain, immediate) if len(chain) else mask
+
+    def count(self, mask):
+        """Number of particles passing a flat mask in every event."""
+        return np.bincount(self.event[mask], minlength=len(self.offsets) - 1)
+
+    def daughters(self):
+        """
+        Daughters of every particle as a jagged array.
+
+        A particle is a daughter of both its mothers (e.g. the A of g g > A
+        belongs to both gluons).
+
+        Returns:
+            tuple: (flat daughter indices, offsets of length particles + 1).
+        """
+        second = (self.second_parent >= 0) & (self.second_parent != self.parent)
+        parents = np.concatenate([self.parent, self.second_parent[second]])
+        children = np.concatenate([np.arange(len(self)), np.flatnonzero(second)])
+        keep = parents >= 0
+        parents, children = parents[keep], children[keep]
+        order = np.lexsort((children, parents))
+        offsets = np.zeros(len(self) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(parents, minlength=len(self)), out=offsets[1:])
+        return children[order], offsets
+
+    def daughter_ids(self):
+        """PDG ids of the daughters of every particle, with the offsets of daughters()."""
+        daughters, offsets = self.daughters()
+        return self.id[daughters], offsets
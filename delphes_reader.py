@@ -0,0 +1,163 @@
+"""
+Chunked columnar reader for Delphes trees.
+
+Reads only the branches the analysis uses and yields DelphesChunk objects
+holding jagged columns, i.e. one flat NumPy array per field plus one offsets
+array per collection. Everything Example1_updated.py computes is available
+from them:
+
+    jets, b-tag selection   Jet.PT / Jet.Eta / Jet.Phi / Jet.Mass / Jet.BTag
+    leptons                 Electron.* and Muon.* PT / Eta / Phi
+    MET, mT                 MissingET.MET / MissingET.Phi
+    scalar HT               ScalarHT.HT
+    event weight            Event.Weight
+    [px, py, pz]            cartesian(PT, Eta, Phi)
+
+uproot (with awkward) is used when installed; otherwise ROOT.RDataFrame
+reads the same branches.
+"""
+
+import glob
+
+import numpy as np
+
+try:
+    import awkward as ak
+    import uproot
+except ImportError:
+    ak = uproot = None
+
+DEFAULT_COLUMNS = {
+    "Jet": ["PT", "Eta", "Phi", "Mass", "BTag"],
+    "Electron": ["PT", "Eta", "Phi"],
+    "Muon": ["PT", "Eta", "Phi"],
+    "MissingET": ["MET", "Phi"],
+    "ScalarHT": ["HT"],
+    "Event": ["Weight"],
+}
+
+def cartesian(pt, eta, phi):
+    """[px, py, pz] columns from (PT, Eta, Phi), as TLorentzVector/P4() would give them."""
+    pt = np.asarray(pt, dtype=np.float64)
+    return pt * np.cos(phi), pt * np.sin(phi), pt * np.sinh(eta)
+
+class DelphesChunk:
+    """
+    One chunk of events as jagged columns.
+
+    columns["Jet.PT"] is the flat PT of every jet in the chunk, and
+    offsets["Jet"] (length n_events + 1) says which jets belong to which event.
+    """
+
+    def __init__(self, entry_start, entry_stop, columns, offsets):
+        self.entry_start = entry_start
+        self.entry_stop = entry_stop
+        self.columns = columns
+        self.offsets = offsets
+
+    def __len__(self):
+        return self.entry_stop - self.entry_start
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def counts(self, collection):
+        """Number of objects of a collection in every event."""
+        return np.diff(self.offsets[collection])
+
+    def first(self, name, default=np.nan):
+        """Per-event value of the first object (MissingET.MET, ScalarHT.HT, Event.Weight, ...)."""
+        collection = name.split(".")[0]
+        offsets = self.offsets[collection]
+        values = np.full(len(self), default, dtype=np.float64)
+        filled = np.diff(offsets) > 0
+        values[filled] = self.columns[name][offsets[:-1][filled]]
+        return values
+
+def _expand_inputs(inputs):
+    """Accept a path, a glob or a list of them."""
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    files = []
+    for pattern in inputs:
+        matches = sorted(glob.glob(pattern))
+        files.extend(matches if matches else [pattern])
+    return files
+
+def _branch_names(columns):
+    return [f"{collection}.{field}" for collection, fields in columns.items() for field in fields]
+
+def _file_entries(files, tree):
+    if uproot is not None:
+        return [uproot.open(path)[tree].num_entries for path in files]
+    import ROOT
+    entries = []
+    for path in files:
+        root_file = ROOT.TFile.Open(path)
+        entries.append(root_file.Get(tree).GetEntries())
+        root_file.Close()
+    return entries
+
+def _chunk_from_arrays(entry_start, entry_stop, columns, arrays, to_counts_and_flat):
+    flat_columns, offsets = {}, {}
+    for collection, fields in columns.items():
+        for field in fields:
+            name = f"{collection}.{field}"
+            counts, flat = to_counts_and_flat(arrays[name])
+            flat_columns[name] = flat
+            if collection not in offsets:
+                offsets[collection] = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    return DelphesChunk(entry_start, entry_stop, flat_columns, offsets)
+
+def _uproot_counts_and_flat(array):
+    return ak.to_numpy(ak.num(array)), ak.to_numpy(ak.flatten(array))
+
+def _rdf_counts_and_flat(array):
+    parts = [np.asarray(values) for values in array]
+    counts = np.fromiter((len(values) for values in parts), dtype=np.int64, count=len(parts))
+    flat = np.concatenate(parts) if parts else np.zeros(0)
+    return counts, flat
+
+def iterate_delphes(inputs, columns=None, chunk_size=100000, entry_range=None, tree="Delphes"):
+    """
+    Iterate over Delphes files in chunks of jagged NumPy columns.
+
+    Args:
+        inputs (str or list): File path(s) or glob pattern(s).
+        columns (dict): Collection -> fields to read (default: DEFAULT_COLUMNS).
+        chunk_size (int): Events per chunk (default: 100000).
+        entry_range (tuple): (first, last) global entries to read (default: all).
+        tree (str): Tree name (default: Delphes).
+
+    Yields:
+        DelphesChunk: chunks never span two files; entry_start/entry_stop are
+        global entry numbers over all inputs.
+    """
+    columns = columns or DEFAULT_COLUMNS
+    branch_names = _branch_names(columns)
+    files = _expand_inputs(inputs)
+    file_entries = _file_entries(files, tree)
+    first, last = entry_range or (0, sum(file_entries))
+
+    file_start = 0
+    for path, n_entries in zip(files, file_entries):
+        file_stop = file_start + n_entries
+        start, stop = max(first, file_start) - file_start, min(last, file_stop) - file_start
+        if start < stop:
+            if uproot is not None:
+                events = uproot.open(path)[tree]
+                for arrays in events.iterate(filter_name=branch_names, step_size=chunk_size,
+                                             entry_start=start, entry_stop=stop, library="ak"):
+                    n = len(arrays)
+                    yield _chunk_from_arrays(file_start + start, file_start + start + n,
+                                             columns, arrays, _uproot_counts_and_flat)
+                    start += n
+            else:
+                import ROOT
+                frame = ROOT.RDataFrame(tree, path)
+                for chunk_start in range(start, stop, chunk_size):
+                    chunk_stop = min(chunk_start + chunk_size, stop)
+                    arrays = frame.Range(chunk_start, chunk_stop).AsNumpy(branch_names)
+                    yield _chunk_from_arrays(file_start + chunk_start, file_start + chunk_stop,
+                                             columns, arrays, _rdf_counts_and_flat)
+        file_start = file_stop
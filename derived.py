@@ -0,0 +1,102 @@
+"""
+Lazy dependency graph of named derived quantities.
+
+Every quantity is a function of other quantities or of inputs (names that
+are not defined in the graph, e.g. "jets"). plan() resolves the quantities
+reachable from the requested outputs in dependency order; evaluate() binds
+the inputs of one chunk and computes planned quantities on first access,
+each at most once per chunk.
+
+    graph = DerivedGraph()
+    graph.add("bjets", select_bjets, ["jets"])
+    graph.add("bjet_shapes", event_shape_batch, ["bjets"])
+    plan = graph.plan(["bjet_shapes"])
+    values = graph.evaluate(plan, jets=jets)
+    sphericity, aplanarity, circularity = values["bjet_shapes"]
+"""
+
+import sys
+
+class DerivedGraph:
+    """Named derived quantities and their dependencies."""
+
+    def __init__(self):
+        self.nodes = {}
+
+    def add(self, name, function, depends=(), description=""):
+        """Define quantity `name` = function(*depends)."""
+        if name in self.nodes:
+            raise ValueError(f"Quantity '{name}' is already defined")
+        self.nodes[name] = (function, list(depends), description)
+
+    def inputs(self):
+        """Names the quantities depend on that are not quantities themselves."""
+        return sorted({depend for _, depends, _ in self.nodes.values() for depend in depends} - set(self.nodes))
+
+    def plan(self, requested):
+        """Quantities needed for the requested ones, dependencies first."""
+        order, visiting = [], set()
+
+        def visit(name, path):
+            if name in order or name not in self.nodes:
+                return
+            if name in visiting:
+                raise ValueError(f"Dependency cycle: {' -> '.join(path + [name])}")
+            visiting.add(name)
+            for depend in self.nodes[name][1]:
+                visit(depend, path + [name])
+            visiting.discard(name)
+            order.append(name)
+
+        for name in requested:
+            if name not in self.nodes and name not in self.inputs():
+                raise KeyError(f"Unknown quantity '{name}'")
+            visit(name, [])
+        return order
+
+    def downstream(self, names):
+        """The given quantities (or inputs) and every quantity that depends on them."""
+        affected = set(names)
+        changed = True
+        while changed:
+            changed = False
+            for name, (_, depends, _) in self.nodes.items():
+                if name not in affected and affected.intersection(depends):
+                    affected.add(name)
+                    changed = True
+        return affected
+
+    def evaluate(self, plan, **inputs):
+        """Bind the inputs of one chunk; planned quantities are computed on first access."""
+        return Evaluation(self, plan, inputs)
+
+    def describe(self, plan, stream=sys.stderr):
+        """Print the resolved execution plan."""
+        print(f"Execution plan ({len(plan)} of {len(self.nodes)} quantities):", file=stream)
+        for step, name in enumerate(plan, start=1):
+            _, depends, description = self.nodes[name]
+            line = f"  {step:>2}. {name} <- {', '.join(depends)}"
+            print(f"{line:<48}{description}", file=stream)
+        skipped = sorted(set(self.nodes) - set(plan))
+        if skipped:
+            print(f"  skipped: {', '.join(skipped)}", file=stream)
+
+class Evaluation:
+    """Quantities of one chunk, memoized."""
+
+    def __init__(self, graph, plan, inputs):
+        self.graph = graph
+        self.plan = set(plan)
+        self.values = dict(inputs)
+
+    def __contains__(self, name):
+        return name in self.plan or name in self.values
+
+    def __getitem__(self, name):
+        if name in self.values:
+            return self.values[name]
+        if name not in self.plan:
+            raise KeyError(f"Quantity '{name}' is not in the execution plan")
+        function, depends, _ = self.graph.nodes[name]
+        value = self.values[name] = function(*(self[depend] for depend in depends))
+        return value
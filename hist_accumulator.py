@@ -0,0 +1,149 @@
+import numpy as np
+
+class NumpyHist:
+    """
+    Fixed-binning 1D histogram accumulated in NumPy, converted to a TH1F only
+    when written.
+
+    Bin 0 is the underflow and bin nbins + 1 the overflow, with the same bin
+    lookup as TAxis::FindFixBin. Sums of weights and of squared weights are
+    kept for every bin. Instances pickle as a few small arrays and merge with +=.
+
+    With `variations`, sums are kept as a (bins x variations) array and every
+    fill takes one weight per variation, so all weight variations are filled
+    in a single pass. Variation 0 is the nominal histogram.
+    """
+
+    def __init__(self, name, title, nbins, low, high, variations=None):
+        self.name = name
+        self.title = title
+        self.nbins = int(nbins)
+        self.low = float(low)
+        self.high = float(high)
+        self.variations = variations
+        shape = (self.nbins + 2,) if variations is None else (self.nbins + 2, variations)
+        self.sumw = np.zeros(shape)
+        self.sumw2 = np.zeros(shape)
+        self.entries = 0
+
+    def _bin_index(self, values):
+        inside = (values >= self.low) & (values < self.high)
+        index = np.where(values < self.low, 0, self.nbins + 1)
+        index[inside] = 1 + (self.nbins * (values[inside] - self.low) / (self.high - self.low)).astype(np.int64)
+        return index
+
+    def fill(self, values, weights=None):
+        """
+        Fill a whole array of values, with an optional array (or scalar) of
+        weights; with variations, weights are (n_values, variations).
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        index = self._bin_index(values)
+        if weights is None:
+            weights = np.ones(values.shape + self.sumw.shape[1:])
+        else:
+            weights = np.broadcast_to(np.asarray(weights, dtype=np.float64), values.shape + self.sumw.shape[1:])
+        if self.variations is None:
+            self.sumw += np.bincount(index, weights=weights, minlength=self.nbins + 2)
+            self.sumw2 += np.bincount(index, weights=weights * weights, minlength=self.nbins + 2)
+        else:
+            for k in range(self.variations):
+                self.sumw[:, k] += np.bincount(index, weights=weights[:, k], minlength=self.nbins + 2)
+                self.sumw2[:, k] += np.bincount(index, weights=weights[:, k] ** 2, minlength=self.nbins + 2)
+        self.entries += len(values)
+
+    def Fill(self, x, w=1.0):
+        """Single-value fill with the TH1F signature, for per-event code (w: one weight per variation)."""
+        if x < self.low:
+            index = 0
+        elif not x < self.high:
+            index = self.nbins + 1
+        else:
+            index = 1 + int(self.nbins * (x - self.low) / (self.high - self.low))
+        self.sumw[index] += w
+        self.sumw2[index] += w * w
+        self.entries += 1
+
+    def same_binning(self, other):
+        return ((self.nbins, self.low, self.high, self.variations)
+                == (other.nbins, other.low, other.high, other.variations))
+
+    def __iadd__(self, other):
+        if not self.same_binning(other):
+            raise ValueError(f"Cannot merge '{self.name}' and '{other.name}': different binning")
+        self.sumw += other.sumw
+        self.sumw2 += other.sumw2
+        self.entries += other.entries
+        return self
+
+    def to_root(self, variation=0):
+        """Build a TH1F (of one variation) with identical binning, contents, errors and entries."""
+        import ROOT
+        sumw, sumw2 = (self.sumw, self.sumw2) if self.variations is None else \
+            (self.sumw[:, variation], self.sumw2[:, variation])
+        hist = ROOT.TH1F(self.name, self.title, self.nbins, self.low, self.high)
+        hist.Sumw2()
+        hist.SetContent(np.ascontiguousarray(sumw))
+        hist.SetError(np.sqrt(sumw2))
+        hist.ResetStats()
+        hist.SetEntries(self.entries)
+        return hist
+
+    def to_root_variations(self):
+        """TH2D of observable bins x variations, variation k in y bin k + 1."""
+        import ROOT
+        hist = ROOT.TH2D(f"{self.name}_variations", f"{self.title};;variation", self.nbins, self.low, self.high,
+                         self.variations, 0, self.variations)
+        hist.Sumw2()
+        # Global bin = binx + (nbins + 2) * biny, y under/overflow rows stay empty
+        content = np.zeros((self.variations + 2, self.nbins + 2))
+        errors = np.zeros_like(content)
+        content[1:-1] = self.sumw.T
+        errors[1:-1] = np.sqrt(self.sumw2.T)
+        hist.SetContent(content.ravel())
+        hist.SetError(errors.ravel())
+        hist.ResetStats()
+        hist.SetEntries(self.entries)
+        return hist
+
+    def Write(self):
+        """Write as a TH1F (the nominal one with variations) into the current ROOT directory."""
+        hist = self.to_root()
+        hist.Write()
+        return hist
+
+def merge_histograms(histogram_sets):
+    """Merge dicts of NumpyHist (e.g. one per worker) key by key, in the given order."""
+    merged = {}
+    for histograms in histogram_sets:
+        for key, hist in histograms.items():
+            if key in merged:
+                merged[key] += hist
+            else:
+                merged[key] = NumpyHist(hist.name, hist.title, hist.nbins, hist.low, hist.high, hist.variations)
+                merged[key] += hist
+    return merged
+
+def write_variations(histograms, directory, mode="sets"):
+    """
+    Write the weight variations 1..N of histograms filled with variations.
+
+    Args:
+        histograms (dict): NumpyHist with variations (the nominal ones are written as usual).
+        directory: Output TFile/TDirectory.
+        mode (str): "sets" for one directory weight_{k} per variation holding the full
+            histogram set (k indexes the Weight collection), "th2" for one
+            {name}_variations TH2D per observable including the nominal.
+    """
+    histograms = [hist for hist in histograms.values() if hist.variations]
+    if mode == "th2":
+        directory.cd()
+        for hist in histograms:
+            hist.to_root_variations().Write()
+        return
+    n_variations = max((hist.variations for hist in histograms), default=1)
+    for variation in range(1, n_variations):
+        directory.mkdir(f"weight_{variation - 1}").cd()
+        for hist in histograms:
+            hist.to_root(variation).Write()
+    directory.cd()
@@ -0,0 +1,270 @@
+"""
+N-sample histogram comparison engine for combine_ROOT.py and
+combine_root_file.py.
+
+The 1D histogram inventory of every sample file is read once, in parallel,
+into plain arrays (HistogramData: edges, contents and errors including
+under/overflow). Overlays are then built from that in-memory set, so the
+cost grows linearly with samples x histograms and no object is fetched twice.
+
+Samples come from a config (.json or .yaml):
+
+    {
+      "samples": [
+        {"path": "run_06/unweighted_events.root", "label": "tan#theta = 1.0", "xsec": 0.034},
+        {"path": "run_14/unweighted_events.root", "label": "tan#theta = 10.0"}
+      ],
+      "extra_params": ["M_{a} = 500 GeV", "M_{#chi}= 10 GeV"]
+    }
+
+"scale" multiplies a sample's histograms; the comparison scripts derive it
+from the cross section and sum of weights (normalization.py) unless it is
+given. "color" overrides the default palette entry (a ROOT color name such as
+"kRed" or a number).
+
+uproot is used for reading when installed; otherwise every file is read with
+ROOT in its own process.
+
+Inventories are cached on disk (CACHE_DIR, one .npz per input file) keyed by
+the file's absolute path, size and mtime, so re-plotting never reopens a ROOT
+file that has not changed.
+"""
+
+import concurrent.futures
+import hashlib
+import json
+import multiprocessing
+import os
+
+import numpy as np
+
+try:
+    import uproot
+except ImportError:
+    uproot = None
+
+# Histogram array cache, relative to the working directory (None disables it)
+CACHE_DIR = ".histogram_cache"
+
+# Sample k gets COLORS[k], the first three match the original red/blue/green plots
+COLORS = ["kRed", "kBlue", "kGreen", "kMagenta", "kCyan", "kOrange", "kViolet", "kTeal",
+          "kPink", "kAzure", "kSpring", "kYellow", "kGray"]
+
+# Bookkeeping histograms of the sample files (the selection cutflow), not overlaid as plots
+NON_PHYSICS = {"cutflow"}
+
+class HistogramData:
+    """A 1D histogram as arrays; contents and errors include underflow (0) and overflow (-1)."""
+
+    def __init__(self, name, title, edges, contents, errors, entries=0.0):
+        self.name = name
+        self.title = title
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.contents = np.asarray(contents, dtype=np.float64)
+        self.errors = np.asarray(errors, dtype=np.float64)
+        self.entries = float(entries)
+
+    @property
+    def nbins(self):
+        return len(self.edges) - 1
+
+    def scaled(self, factor):
+        """Copy scaled like TH1::Scale (contents and errors)."""
+        return HistogramData(self.name, self.title, self.edges, self.contents * factor,
+                             self.errors * abs(factor), self.entries)
+
+    def integral(self):
+        return float(self.contents[1:-1].sum())
+
+    def maximum(self):
+        """Largest in-range bin content (TH1::GetMaximum without a preset maximum)."""
+        return float(self.contents[1:-1].max()) if self.nbins else 0.0
+
+    def min_positive(self):
+        """Smallest positive in-range bin content, None if there is none."""
+        inner = self.contents[1:-1]
+        positive = inner[inner > 0]
+        return float(positive.min()) if len(positive) else None
+
+    @classmethod
+    def from_root(cls, hist, name=None):
+        """Copy the arrays of a ROOT TH1 (bulk buffer copies, no per-bin calls)."""
+        n = hist.GetNbinsX()
+        contents = _root_buffer(hist, n + 2)
+        sumw2 = hist.GetSumw2()
+        errors = np.sqrt(_root_buffer(sumw2, n + 2)) if sumw2.GetSize() else np.sqrt(np.abs(contents))
+        axis = hist.GetXaxis()
+        bins = axis.GetXbins()
+        if bins.GetSize():
+            edges = _root_buffer(bins, n + 1)
+        else:
+            edges = np.linspace(axis.GetXmin(), axis.GetXmax(), n + 1)
+        return cls(name or hist.GetName(), hist.GetTitle(), edges, contents, errors, hist.GetEntries())
+
+    def to_root(self, name=None):
+        """Build a detached TH1D with the same binning, contents, errors and entries."""
+        import ROOT
+        hist = ROOT.TH1D(name or self.name, self.title, self.nbins, self.edges)
+        hist.SetDirectory(ROOT.nullptr)
+        hist.Sumw2()
+        hist.SetContent(np.ascontiguousarray(self.contents))
+        hist.SetError(np.ascontiguousarray(self.errors))
+        hist.SetEntries(self.entries)
+        return hist
+
+def _root_buffer(array, n):
+    """float64 copy of the first n values of a ROOT TArray (TH1D, TH1F, TArrayD, ...)."""
+    view = array.GetArray()
+    view.reshape((n,))
+    return np.array(view, dtype=np.float64)
+
+def _read_uproot(path):
+    inventory = {}
+    with uproot.open(path) as root_file:
+        for key, class_name in root_file.classnames(recursive=False).items():
+            name = key.rsplit(";", 1)[0]
+            if name in inventory or not class_name.startswith("TH1"):
+                continue
+            hist = root_file[key]
+            inventory[name] = HistogramData(name, hist.title, hist.axis().edges(), hist.values(flow=True),
+                                            hist.errors(flow=True), hist.member("fEntries"))
+    return inventory
+
+def _read_root(path):
+    import ROOT
+    inventory = {}
+    root_file = ROOT.TFile.Open(path)
+    if not root_file or root_file.IsZombie():
+        raise OSError(f"Cannot open {path}")
+    # Keys are listed highest cycle first; the class is known without reading the object
+    for key in root_file.GetListOfKeys():
+        name = key.GetName()
+        cls = ROOT.TClass.GetClass(key.GetClassName())
+        if name in inventory or not cls or not cls.InheritsFrom("TH1") or cls.InheritsFrom("TH2") \
+                or cls.InheritsFrom("TH3"):
+            continue
+        inventory[name] = HistogramData.from_root(key.ReadObj(), name)
+    root_file.Close()
+    return inventory
+
+def _cache_path(path, cache_dir):
+    digest = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()
+    return os.path.join(cache_dir, f"{digest}.npz")
+
+def _file_key(path):
+    stat = os.stat(path)
+    return np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+def read_cache(path, cache_dir=CACHE_DIR):
+    """Cached inventory of a file, or None if there is none or the file changed since."""
+    if cache_dir is None:
+        return None
+    try:
+        with np.load(_cache_path(path, cache_dir)) as cache:
+            if str(cache["path"]) != os.path.abspath(path) or not np.array_equal(cache["key"], _file_key(path)):
+                return None
+            edge_offsets, content_offsets = cache["edge_offsets"], cache["content_offsets"]
+            edges, contents, errors = cache["edges"], cache["contents"], cache["errors"]
+            return {str(name): HistogramData(
+                        str(name), str(title), edges[edge_offsets[k]:edge_offsets[k + 1]],
+                        contents[content_offsets[k]:content_offsets[k + 1]],
+                        errors[content_offsets[k]:content_offsets[k + 1]], entries)
+                    for k, (name, title, entries) in enumerate(zip(cache["names"], cache["titles"],
+                                                                   cache["entries"]))}
+    except (OSError, KeyError, ValueError):
+        return None
+
+def write_cache(path, inventory, cache_dir=CACHE_DIR):
+    """Store an inventory as one compressed .npz of concatenated arrays plus offsets."""
+    if cache_dir is None:
+        return
+    os.makedirs(cache_dir, exist_ok=True)
+    hists = list(inventory.values())
+    offsets = lambda sizes: np.concatenate([[0], np.cumsum(sizes, dtype=np.int64)])
+    concatenate = lambda arrays: np.concatenate(arrays) if arrays else np.zeros(0)
+    # Write under a temporary name first so concurrent readers never see a partial file
+    target = _cache_path(path, cache_dir)
+    partial = f"{target}.{os.getpid()}.npz"
+    np.savez_compressed(
+        partial, path=os.path.abspath(path), key=_file_key(path),
+        names=np.array([hist.name for hist in hists], dtype=str),
+        titles=np.array([hist.title for hist in hists], dtype=str),
+        entries=np.array([hist.entries for hist in hists], dtype=np.float64),
+        edge_offsets=offsets([len(hist.edges) for hist in hists]),
+        content_offsets=offsets([len(hist.contents) for hist in hists]),
+        edges=concatenate([hist.edges for hist in hists]),
+        contents=concatenate([hist.contents for hist in hists]),
+        errors=concatenate([hist.errors for hist in hists]))
+    os.replace(partial, target)
+
+def load_inventory(path, cache_dir=CACHE_DIR):
+    """All 1D histograms of one file, keyed by name, from the cache or read exactly once."""
+    inventory = read_cache(path, cache_dir)
+    if inventory is None:
+        inventory = _read_uproot(path) if uproot is not None else _read_root(path)
+        write_cache(path, inventory, cache_dir)
+    return inventory
+
+def load_samples(paths, workers=None, cache_dir=CACHE_DIR):
+    """
+    Inventories of several files; cached ones are loaded directly, the others
+    are read in parallel (and cached).
+
+    Args:
+        paths (list): ROOT files.
+        workers (int): Processes (default: one per file to read, up to the number of CPUs).
+        cache_dir (str): Histogram array cache directory (None: always read the files).
+
+    Returns:
+        list: one inventory dict per path, in order.
+    """
+    inventories = [read_cache(path, cache_dir) for path in paths]
+    missing = [path for path, inventory in zip(paths, inventories) if inventory is None]
+    workers = workers or min(len(missing), os.cpu_count() or 1)
+    if workers <= 1 or len(missing) <= 1:
+        read = [load_inventory(path, cache_dir) for path in missing]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(workers,
+                                                    mp_context=multiprocessing.get_context("spawn")) as pool:
+            read = list(pool.map(load_inventory, missing, [cache_dir] * len(missing)))
+    read = iter(read)
+    return [inventory if inventory is not None else next(read) for inventory in inventories]
+
+def load_config(path):
+    """Read a comparison config from a .json or .yaml file."""
+    with open(path) as config_file:
+        if os.path.splitext(path)[1] in (".yaml", ".yml"):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("YAML configs need PyYAML (pip install pyyaml)")
+            return yaml.safe_load(config_file)
+        return json.load(config_file)
+
+def overlays(samples, inventories):
+    """
+    Yield (histogram name, [HistogramData per sample, scaled]) for every
+    histogram of the first sample that all samples have, in file order.
+    Bookkeeping histograms (NON_PHYSICS) are not overlaid.
+    """
+    for name in inventories[0]:
+        if name in NON_PHYSICS:
+            continue
+        if not all(name in inventory for inventory in inventories):
+            print(f"Skipping '{name}': not found in all files.")
+            continue
+        yield name, [inventory[name].scaled(sample.get("scale", 1.0)) if sample.get("scale", 1.0) != 1.0
+                     else inventory[name] for sample, inventory in zip(samples, inventories)]
+
+def sample_color(sample, index):
+    """ROOT color number of a sample: its "color" entry or the palette entry for its index."""
+    import ROOT
+    color = sample.get("color", COLORS[index % len(COLORS)])
+    return getattr(ROOT, color) if isinstance(color, str) else int(color)
+
+def log_y_range(histograms):
+    """(floor, top) of a log-scale frame for several histograms, from their positive contents."""
+    positives = [value for value in (hist.min_positive() for hist in histograms) if value is not None]
+    min_nonzero = min(positives) if positives else 1e-6
+    y_max = max(hist.maximum() for hist in histograms)
+    return max(min_nonzero * 0.5, 1e-9), max(y_max * 1.2, min_nonzero * 10.0)
@@ -0,0 +1,255 @@
+"""
+Parton-level histograms of g g > h1 xd xd~ LHE files, in parallel.
+
+Books the histograms of lhe_reader_non_decayed_tan.c (same names, titles and
+binning) as NumpyHist and fills them chunk by chunk with array operations.
+Plain .lhe files are indexed (lhe_index.py) and split into byte ranges of
+equal size, parsed by a process pool. The partial histograms are merged
+and written to <basename>.root, like the C reader's output. Compressed files
+are read sequentially. With --cache, the file is read from its binary
+columnar cache (lhe_cache.py, created on the first run), which skips the
+text parsing altogether and splits compressed files too.
+
+    python lhe_analysis.py unweighted_events.lhe --workers 8
+    python lhe_analysis.py unweighted_events.lhe --sample 10000 --seed 1
+    python lhe_analysis.py unweighted_events.lhe.gz --cache
+
+Selection, as in the C reader, through the decay tree of every chunk
+(decay_tree.py): the last particle with id 52 (xd) and -52 (xd~), the b and
+b~ whose mother is the h (25), the h and a (55) whose mother is the A (36),
+and the last A. Events need two xd/xd~ and two b/b~ in total; initial
+state particles (status -1) are ignored.
+"""
+
+import argparse
+import concurrent.futures
+import multiprocessing
+import os
+
+import numpy as np
+
+from decay_tree import DecayTree
+from hist_accumulator import NumpyHist, merge_histograms
+from lhe_cache import LHEColumns
+from lhe_index import LHEIndex
+from lhe_reader import iterate_lhe
+
+# name: (title, nbins, low, high), in the C reader's write order
+HISTOGRAMS = {
+    "pt_higgs": ("higgs pt", 50, -10, 400),
+    "E_higgs": ("higgs E", 50, 100, 1500),
+    "eta_higgs": ("higgs eta", 50, -6, 6),
+    "phi_higgs": ("higgs phi", 50, -4, 4),
+    "pz_higgs": ("higgs pz", 50, -1500, 1500),
+    "mass_higgs": ("higgs mass", 50, 100, 140),
+    "pt_ps_A": ("PS A pt", 50, 0, 350),
+    "E_ps_A": ("PS A E", 50, 0, 350),
+    "pt_ps_a": ("PS a pt", 50, 0, 500),
+    "E_ps_a": ("PS a E", 50, -350, 350),
+    "pt_xd": ("xd pt", 50, -10, 500),
+    "E_xd": ("xd E", 50, 0, 1500),
+    "eta_xd": ("xd eta", 50, -6, 6),
+    "phi_xd": ("xd phi", 50, -3.16, 3.16),
+    "pz_xd": ("xd pz", 50, -800, 800),
+    "pt_xd_": ("xd_ pt", 50, 0, 400),
+    "eta_xd_": ("xd_ eta", 50, -6, 6),
+    "phi_xd_": ("xd_ phi", 50, -3.16, 3.16),
+    "pz_xd_": ("xd_ pz", 50, -800, 800),
+    "pt_xd_xd": ("xd_xd pt", 50, 0, 400),
+    "E_xd_xd": ("xd_xd E", 50, 300, 1500),
+    "eta_xd_xd": ("xd_xd eta", 50, -6, 6),
+    "phi_xd_xd": ("xd_xd phi", 50, -3.16, 3.16),
+    "pz_xd_xd": ("xd_xd pz", 50, -1000, 1000),
+    "Et": ("Et", 50, 0, 800),
+    "dphi_higgs_xdxd": ("dphi higgs xdxd", 50, 0.0, 5.0),
+    "pt_bj": ("bj pt", 50, 0, 350),
+    "eta_bj": ("bj eta", 50, -6, 6),
+    "phi_bj": ("bj phi", 50, -3.16, 3.16),
+    "pz_bj": ("bj pz", 50, -500, 500),
+    "pt_bj_": ("bj_ pt", 50, 0, 300),
+    "eta_bj_": ("bj_ eta", 50, -6, 6),
+    "phi_bj_": ("bj_ phi", 50, -3.16, 3.16),
+    "pz_bj_": ("bj_ pz", 50, -500, 500),
+}
+
+# Particle columns used by fill_chunk, the only ones read from the columnar cache
+COLUMNS = ["id", "status", "mother1", "px", "py", "pz", "E"]
+
+def book_histograms():
+    return {name: NumpyHist(name, title, nbins, low, high) for name, (title, nbins, low, high) in HISTOGRAMS.items()}
+
+# TLorentzVector kinematics of (n, 4) px, py, pz, E arrays
+def _pt(p):
+    return np.hypot(p[:, 0], p[:, 1])
+
+def _eta(p):
+    pt = _pt(p)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        eta = np.arcsinh(p[:, 2] / pt)
+    # TVector3::Eta of a vector along the beam
+    return np.where(pt > 0, eta, np.sign(p[:, 2]) * 10e10)
+
+def _phi(p):
+    return np.arctan2(p[:, 1], p[:, 0])
+
+def _mass(p):
+    m2 = p[:, 3] ** 2 - p[:, 0] ** 2 - p[:, 1] ** 2 - p[:, 2] ** 2
+    return np.sign(m2) * np.sqrt(np.abs(m2))
+
+def delta_phi(phi1, phi2):
+    """|phi2 - phi1| folded as in the C reader's DeltaPhi."""
+    dphi = np.abs(phi2 - phi1)
+    return np.where(dphi > 3.14, 6.28 - dphi, dphi)
+
+def _last(chunk, tree, mask):
+    """(n_events, 4) momentum of the last particle passing mask in every event (zeros without one), and counts."""
+    events = tree.event[mask]
+    positions = np.flatnonzero(mask)
+    last = np.full(len(chunk), -1, dtype=np.int64)
+    np.maximum.at(last, events, positions)
+    momenta = np.zeros((len(chunk), 4))
+    found = last >= 0
+    momenta[found] = np.column_stack([chunk.px, chunk.py, chunk.pz, chunk.E])[last[found]]
+    return momenta, np.bincount(events, minlength=len(chunk))
+
+def fill_chunk(histograms, chunk):
+    """
+    Fill the booked histograms with the selected events of one LHEChunk.
+
+    Returns:
+        int: Number of selected events.
+    """
+    tree = DecayTree(chunk)
+    final = chunk.status != -1
+    xd, n_xd = _last(chunk, tree, final & tree.select(52))
+    xd_, n_xd_ = _last(chunk, tree, final & tree.select(-52))
+    bj, n_bj = _last(chunk, tree, final & tree.select(5, chain=[25]))
+    bj_, n_bj_ = _last(chunk, tree, final & tree.select(-5, chain=[25]))
+    higgs, _ = _last(chunk, tree, final & tree.select(25, chain=[36]))
+    ps_a, _ = _last(chunk, tree, final & tree.select(55, chain=[36]))
+    ps_A, _ = _last(chunk, tree, final & tree.select(36))
+
+    selected = (n_xd + n_xd_ == 2) & (n_bj + n_bj_ == 2)
+    xd, xd_, bj, bj_, higgs, ps_a, ps_A = (p[selected] for p in (xd, xd_, bj, bj_, higgs, ps_a, ps_A))
+    xdxd = xd + xd_
+
+    # Momentum of the A -> h a daughters in the A rest frame, sqrt(lambda) / (2 M_A)
+    m_A, m_h, m_a = _mass(ps_A), _mass(higgs), _mass(ps_a)
+    lm = (m_A ** 2 - m_h ** 2 - m_a ** 2) ** 2 - 4 * m_h ** 2 * m_a ** 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        et = np.where((lm > 0) & (m_A != 0), np.sqrt(np.abs(lm)) / (2 * m_A), 0.0)
+
+    values = {
+        "pt_ps_A": _pt(ps_A), "E_ps_A": ps_A[:, 3],
+        "pt_ps_a": _pt(ps_a), "E_ps_a": ps_a[:, 3],
+        "pt_xd": _pt(xd), "E_xd": xd[:, 3], "eta_xd": _eta(xd), "phi_xd": _phi(xd), "pz_xd": xd[:, 2],
+        "pt_xd_": _pt(xd_), "eta_xd_": _eta(xd_), "phi_xd_": _phi(xd_), "pz_xd_": xd_[:, 2],
+        "pt_xd_xd": _pt(xdxd), "E_xd_xd": xdxd[:, 3], "eta_xd_xd": _eta(xd_) + _eta(xd),
+        "phi_xd_xd": _phi(xd_) + _phi(xd), "pz_xd_xd": xdxd[:, 2],
+        "Et": et,
+        "dphi_higgs_xdxd": delta_phi(_phi(higgs), _phi(xdxd)),
+        "pt_higgs": _pt(higgs), "E_higgs": higgs[:, 3], "eta_higgs": _eta(higgs), "phi_higgs": _phi(higgs),
+        "pz_higgs": higgs[:, 2], "mass_higgs": _mass(bj + bj_),
+        "pt_bj": _pt(bj), "eta_bj": _eta(bj), "phi_bj": _phi(bj), "pz_bj": bj[:, 2],
+        "pt_bj_": _pt(bj_), "eta_bj_": _eta(bj_), "phi_bj_": _phi(bj_), "pz_bj_": bj_[:, 2],
+    }
+    for name, value in values.items():
+        histograms[name].fill(value)
+    return int(selected.sum())
+
+def _fill_range(job):
+    """Worker: histograms of events first..last-1 of an indexed or cached file."""
+    path, first, last, chunk_size, cache_dir = job
+    if cache_dir is None:
+        chunks = LHEIndex.load(path).iterate(first, last, chunk_size)
+    else:
+        chunks = LHEColumns.load(path, cache_dir or None).iterate(first, last, chunk_size, COLUMNS)
+    histograms = book_histograms()
+    selected = sum(fill_chunk(histograms, chunk) for chunk in chunks)
+    return histograms, last - first, selected
+
+def analyse(path, workers=None, chunk_size=10000, sample=None, seed=0, cache_dir=None):
+    """
+    Histograms of one LHE file.
+
+    Args:
+        path (str): LHE file (plain files are indexed and read in parallel).
+        workers (int): Processes (default: one per CPU).
+        chunk_size (int): Events parsed at a time.
+        sample (int): Only analyse this many randomly chosen events (plain files).
+        seed (int): Seed of the sample.
+        cache_dir (str): Read the binary columnar cache ("" for the one next to the file,
+            None to parse the text).
+
+    Returns:
+        tuple: (histograms, events read, events selected).
+    """
+    with open(path, "rb") as probe:
+        compressed = probe.read(2) == b"\x1f\x8b"
+    if cache_dir is not None:
+        # Converted once here, so that the workers only map it
+        source = LHEColumns.load(path, cache_dir or None)
+        if sample is not None:
+            histograms, indices = book_histograms(), source.sample(sample, seed)
+            selected = sum(fill_chunk(histograms, source.take(indices[k:k + chunk_size], COLUMNS))
+                           for k in range(0, len(indices), chunk_size))
+            return histograms, len(indices), selected
+    elif compressed:
+        if sample is not None:
+            raise ValueError(f"{path}: sampling needs an uncompressed LHE file")
+        histograms, events, selected = book_histograms(), 0, 0
+        for chunk in iterate_lhe(path, chunk_size):
+            selected += fill_chunk(histograms, chunk)
+            events += len(chunk)
+        return histograms, events, selected
+
+    else:
+        source = LHEIndex.load(path)
+        if sample is not None:
+            histograms = book_histograms()
+            indices = source.sample(sample, seed)
+            selected = sum(fill_chunk(histograms, source.read(indices[k:k + chunk_size]))
+                           for k in range(0, len(indices), chunk_size))
+            return histograms, len(indices), selected
+
+    workers = workers or os.cpu_count() or 1
+    jobs = [(path, first, last, chunk_size, cache_dir) for first, last in source.split(workers)]
+    if len(jobs) <= 1:
+        results = [_fill_range(job) for job in jobs]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(len(jobs),
+                                                    mp_context=multiprocessing.get_context("spawn")) as pool:
+            results = list(pool.map(_fill_range, jobs))
+    histograms = merge_histograms(result[0] for result in results) if results else book_histograms()
+    return histograms, sum(result[1] for result in results), sum(result[2] for result in results)
+
+def write_histograms(histograms, output):
+    """Write the histograms like the C reader: pt_higgs normalized to unit area."""
+    import ROOT
+    rootfile = ROOT.TFile(output, "RECREATE")
+    for name, hist in histograms.items():
+        root_hist = hist.to_root()
+        if name == "pt_higgs" and root_hist.Integral() > 0:
+            root_hist.Scale(1 / root_hist.Integral())
+        root_hist.Write()
+    rootfile.Close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parton-level h1 xd xd~ histograms of an LHE file.")
+    parser.add_argument("path", help="LHE file (.lhe or .lhe.gz)")
+    parser.add_argument("--output", help="ROOT file (default: <basename>.root)")
+    parser.add_argument("--workers", type=int, help="processes (default: one per CPU)")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="events parsed at a time")
+    parser.add_argument("--sample", type=int, help="analyse only this many randomly chosen events")
+    parser.add_argument("--seed", type=int, default=0, help="seed of --sample")
+    parser.add_argument("--cache", action="store_true", help="read the binary columnar cache (created if needed)")
+    parser.add_argument("--cache-dir", help="keep the columnar cache here instead of next to the file")
+    args = parser.parse_args()
+
+    cache_dir = (args.cache_dir or "") if args.cache or args.cache_dir else None
+    histograms, events, selected = analyse(args.path, args.workers, args.chunk_size, args.sample, args.seed,
+                                           cache_dir)
+    name = os.path.basename(args.path)
+    output = args.output or (name[:-3] if name.endswith(".gz") else name).rsplit(".", 1)[0] + ".root"
+    write_histograms(histograms, output)
+    print(f"{selected} of {events} events selected, histograms written to {output}")
@@ -0,0 +1,203 @@
+"""
+Binary columnar cache of LHE files.
+
+The first read of an LHE file (plain or .gz) converts it, in constant
+memory, into a directory of raw little-endian column files next to it:
+
+    unweighted_events.lhe.columns/
+        meta.json          source size, mtime, fingerprint and SHA-1, dtypes, lengths
+        id.bin ... m.bin   flat particle columns (as in lhe_reader.LHEChunk)
+        weight.bin, process.bin, scale.bin, offsets.bin
+
+Later reads memory-map only the columns they use, so re-running a
+parton-level analysis costs a page-cache read instead of a text parse.
+The cache is rebuilt when the source's size, mtime or fingerprint (SHA-1 of
+its size, first and last MiB) changes; verify=True also checks the SHA-1 of
+the whole file.
+
+    columns = LHEColumns.load("unweighted_events.lhe.gz")
+    for chunk in columns.iterate(columns=["id", "px", "py"]):
+        ...
+"""
+
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+from lhe_reader import PARTICLE_FIELDS, LHEChunk, iterate_lhe
+
+# Bumped when the layout changes, so that old caches are rebuilt
+FORMAT_VERSION = 1
+_EVENT_FIELDS = ["weight", "process", "scale"]
+_FINGERPRINT_BYTES = 1 << 20
+
+def cache_directory(path, cache_dir=None):
+    """<file>.columns next to the file, or under cache_dir named by the hash of its path."""
+    if cache_dir is None:
+        return f"{path}.columns"
+    digest = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()
+    return os.path.join(cache_dir, f"{digest}.columns")
+
+def fingerprint(path):
+    """SHA-1 of the size and of the first and last MiB of a file (cheap, checked on every load)."""
+    size = os.path.getsize(path)
+    digest = hashlib.sha1(str(size).encode())
+    with open(path, "rb") as source:
+        digest.update(source.read(_FINGERPRINT_BYTES))
+        if size > _FINGERPRINT_BYTES:
+            source.seek(max(size - _FINGERPRINT_BYTES, _FINGERPRINT_BYTES))
+            digest.update(source.read())
+    return digest.hexdigest()
+
+def file_hash(path):
+    """SHA-1 of a whole file."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as source:
+        for block in iter(lambda: source.read(1 << 22), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _source_key(path):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "fingerprint": fingerprint(path)}
+
+def convert(path, directory, chunk_size=100000):
+    """
+    Convert an LHE file into a column directory, one chunk at a time.
+
+    Returns:
+        dict: The directory's metadata.
+    """
+    key = _source_key(path)
+    partial = f"{directory}.{os.getpid()}.partial"
+    shutil.rmtree(partial, ignore_errors=True)
+    os.makedirs(partial)
+    names = PARTICLE_FIELDS + _EVENT_FIELDS
+    outputs = {name: open(os.path.join(partial, f"{name}.bin"), "wb") for name in names + ["offsets"]}
+    dtypes, particles, events = {}, 0, 0
+    try:
+        outputs["offsets"].write(np.zeros(1, dtype="<i8").tobytes())
+        for chunk in iterate_lhe(path, chunk_size):
+            values = dict(chunk.columns, weight=chunk.weight, process=chunk.process, scale=chunk.scale)
+            for name in names:
+                array = np.asarray(values[name])
+                array = array.astype(array.dtype.newbyteorder("<"), copy=False)
+                dtypes.setdefault(name, array.dtype.str)
+                outputs[name].write(array.tobytes())
+            outputs["offsets"].write((chunk.offsets[1:] + particles).astype("<i8").tobytes())
+            particles += int(chunk.offsets[-1])
+            events += len(chunk)
+    finally:
+        for output in outputs.values():
+            output.close()
+    dtypes.setdefault("offsets", "<i8")
+    for name in names:
+        dtypes.setdefault(name, "<i4" if name in ("id", "status", "mother1", "mother2", "process") else "<f8")
+    meta = dict(key, version=FORMAT_VERSION, source=os.path.abspath(path), sha1=file_hash(path),
+                events=events, particles=particles, dtypes=dtypes)
+    with open(os.path.join(partial, "meta.json"), "w") as output:
+        json.dump(meta, output, indent=1)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(partial, directory)
+    return meta
+
+class LHEColumns:
+    """Memory-mapped columns of a converted LHE file, with the interface of lhe_index.LHEIndex."""
+
+    def __init__(self, path, directory, meta):
+        self.path = path
+        self.directory = directory
+        self.meta = meta
+        self._columns = {}
+        self.offsets = self.column("offsets")
+
+    @classmethod
+    def load(cls, path, cache_dir=None, rebuild=False, verify=False):
+        """
+        Columns of an LHE file, converting it first when the cache is missing or stale.
+
+        Args:
+            path (str): LHE file (plain or .gz).
+            cache_dir (str): Keep the cache here instead of next to the file.
+            rebuild (bool): Convert even if the cache is up to date.
+            verify (bool): Also compare the SHA-1 of the whole file.
+        """
+        directory = cache_directory(path, cache_dir)
+        meta = None if rebuild else cls._valid_meta(path, directory, verify)
+        if meta is None:
+            if cache_dir is not None:
+                os.makedirs(cache_dir, exist_ok=True)
+            meta = convert(path, directory)
+        return cls(path, directory, meta)
+
+    @staticmethod
+    def _valid_meta(path, directory, verify):
+        try:
+            with open(os.path.join(directory, "meta.json")) as source:
+                meta = json.load(source)
+        except (OSError, ValueError):
+            return None
+        stat = os.stat(path)
+        if (meta.get("version") != FORMAT_VERSION or meta.get("source") != os.path.abspath(path)
+                or meta.get("size") != stat.st_size or meta.get("mtime_ns") != stat.st_mtime_ns
+                or meta.get("fingerprint") != fingerprint(path)):
+            return None
+        if verify and meta.get("sha1") != file_hash(path):
+            return None
+        return meta
+
+    def column(self, name):
+        """Memory-mapped flat column (read-only)."""
+        if name not in self._columns:
+            length = {"offsets": self.meta["events"] + 1, **{field: self.meta["events"] for field in _EVENT_FIELDS}}
+            count = length.get(name, self.meta["particles"])
+            dtype = np.dtype(self.meta["dtypes"][name])
+            self._columns[name] = np.memmap(os.path.join(self.directory, f"{name}.bin"), dtype=dtype, mode="r",
+                                            shape=(count,)) if count else np.zeros(0, dtype=dtype)
+        return self._columns[name]
+
+    def __len__(self):
+        return self.meta["events"]
+
+    def chunk(self, first, last, columns=None):
+        """LHEChunk of events first..last-1 with the given particle columns (default: all), as views."""
+        begin, end = int(self.offsets[first]), int(self.offsets[last])
+        particle_columns = {name: self.column(name)[begin:end] for name in (columns or PARTICLE_FIELDS)}
+        return LHEChunk(first, particle_columns, self.offsets[first:last + 1] - begin,
+                        self.column("weight")[first:last], self.column("process")[first:last],
+                        self.column("scale")[first:last])
+
+    def take(self, indices, columns=None):
+        """LHEChunk of the given events, in the given order (copies)."""
+        indices = np.atleast_1d(np.asarray(indices, dtype=np.int64))
+        counts = self.offsets[indices + 1] - self.offsets[indices]
+        offsets = np.zeros(len(indices) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        # Flat positions of the particles of the selected events
+        positions = np.repeat(self.offsets[indices] - offsets[:-1], counts) + np.arange(offsets[-1])
+        particle_columns = {name: self.column(name)[positions] for name in (columns or PARTICLE_FIELDS)}
+        return LHEChunk(0, particle_columns, offsets, self.column("weight")[indices],
+                        self.column("process")[indices], self.column("scale")[indices])
+
+    def sample(self, n, seed=0):
+        """Deterministic sorted random subset of n event numbers (the same as LHEIndex.sample)."""
+        rng = np.random.default_rng(seed)
+        return np.sort(rng.choice(len(self), size=min(n, len(self)), replace=False))
+
+    def split(self, n_parts):
+        """Split the events into at most n_parts contiguous ranges of about equal particle counts."""
+        if len(self) == 0:
+            return []
+        targets = self.offsets[-1] * np.arange(1, n_parts) / n_parts
+        cuts = np.searchsorted(self.offsets[:-1], targets)
+        bounds = np.unique(np.concatenate([[0], cuts, [len(self)]]))
+        return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+    def iterate(self, first=0, last=None, chunk_size=10000, columns=None):
+        """Yield LHEChunks of events first..last-1 with only the given particle columns."""
+        last = len(self) if last is None else last
+        for start in range(first, last, chunk_size):
+            yield self.chunk(start, min(start + chunk_size, last), columns)
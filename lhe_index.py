@@ -0,0 +1,130 @@
+"""
+Byte-offset index of the <event> blocks of an LHE file.
+
+The index is built once with a memory-mapped scan and cached next to the
+file as <file>.idx.npz, together with the file's size and mtime. A changed
+file gets a new index. It gives:
+
+    random access       index.read([k]) parses event k only
+    sub-sampling        index.sample(1000, seed=1), deterministic per seed
+    splitting           index.split(8) gives event ranges of equal byte size;
+                        index.iterate(first, last) parses one range, in chunks
+
+so a process pool can parse one file in parallel (see lhe_analysis.py).
+Only uncompressed files can be indexed.
+
+    index = LHEIndex.load("unweighted_events.lhe")
+    chunk = index.read(index.sample(1000, seed=1))
+"""
+
+import io
+import mmap
+import os
+
+import numpy as np
+
+from lhe_reader import parse_events
+
+class LHEIndex:
+    """Start offset of every event of an LHE file, plus the end of the last one."""
+
+    def __init__(self, path, offsets):
+        self.path = path
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+    @staticmethod
+    def sidecar(path):
+        return f"{path}.idx.npz"
+
+    @classmethod
+    def build(cls, path):
+        """Scan a file for its <event> blocks (memory-mapped, one pass)."""
+        with open(path, "rb") as lhe:
+            if lhe.read(2) == b"\x1f\x8b":
+                raise ValueError(f"{path}: a byte-offset index needs an uncompressed LHE file")
+            if os.fstat(lhe.fileno()).st_size == 0:
+                return cls(path, [0])
+            with mmap.mmap(lhe.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                starts = []
+                # Events follow the header and the <init> block
+                position = data.find(b"</init>")
+                position = 0 if position < 0 else position
+                while True:
+                    position = data.find(b"<event", position)
+                    if position < 0:
+                        break
+                    starts.append(position)
+                    position += 6
+                end = data.rfind(b"</event>")
+                end = end + len(b"</event>") if starts and end > starts[-1] else (starts[-1] if starts else 0)
+        return cls(path, starts + [end])
+
+    @classmethod
+    def load(cls, path, rebuild=False):
+        """The cached index of a file, rebuilt (and cached) when missing or stale."""
+        stat = os.stat(path)
+        key = np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+        sidecar = cls.sidecar(path)
+        if not rebuild:
+            try:
+                with np.load(sidecar) as cached:
+                    if np.array_equal(cached["key"], key):
+                        return cls(path, cached["offsets"])
+            except (OSError, KeyError, ValueError):
+                pass
+        index = cls.build(path)
+        try:
+            partial = f"{sidecar}.{os.getpid()}.npz"
+            np.savez(partial, offsets=index.offsets, key=key)
+            os.replace(partial, sidecar)
+        except OSError:
+            # Read-only location: the index is still usable, only not cached
+            pass
+        return index
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def _text(self, first_byte, last_byte):
+        with open(self.path, "rb") as lhe:
+            lhe.seek(first_byte)
+            return lhe.read(last_byte - first_byte).decode()
+
+    def event_text(self, k):
+        """Text of event k (O(1): one seek and one read)."""
+        return self._text(self.offsets[k], self.offsets[k + 1])
+
+    def read(self, indices):
+        """One LHEChunk with the given events, in the given order."""
+        indices = np.atleast_1d(np.asarray(indices, dtype=np.int64))
+        with open(self.path, "rb") as lhe, mmap.mmap(lhe.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            text = b"".join(data[self.offsets[k]:self.offsets[k + 1]] for k in indices).decode()
+        chunks = list(parse_events(io.StringIO(text), chunk_size=max(len(indices), 1)))
+        return chunks[0] if chunks else None
+
+    def sample(self, n, seed=0):
+        """Deterministic sorted random subset of n event numbers."""
+        rng = np.random.default_rng(seed)
+        return np.sort(rng.choice(len(self), size=min(n, len(self)), replace=False))
+
+    def split(self, n_parts):
+        """
+        Split the events into at most n_parts contiguous ranges of about equal byte size.
+
+        Returns:
+            list: (first event, last event + 1) per range.
+        """
+        if len(self) == 0:
+            return []
+        targets = self.offsets[0] + (self.offsets[-1] - self.offsets[0]) * np.arange(1, n_parts) / n_parts
+        cuts = np.searchsorted(self.offsets[:-1], targets)
+        bounds = np.unique(np.concatenate([[0], cuts, [len(self)]]))
+        return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+    def iterate(self, first=0, last=None, chunk_size=10000):
+        """Yield LHEChunks of events first..last-1, reading only their bytes."""
+        last = len(self) if last is None else last
+        for start in range(first, last, chunk_size):
+            stop = min(start + chunk_size, last)
+            text = self._text(self.offsets[start], self.offsets[stop])
+            yield from parse_events(io.StringIO(text), chunk_size, entry_start=start)
@@ -0,0 +1,167 @@
+"""
+Streaming constant-memory reader for Les Houches event files.
+
+iterate_lhe() reads plain or gzip-compressed .lhe files and yields LHEChunk
+objects of at most chunk_size events as jagged columns: one flat NumPy
+array per particle field plus an offsets array (length n_events + 1). Only
+the current chunk is held in memory, whatever the size of the file.
+
+    particle fields    id, status, mother1, mother2, px, py, pz, E, m
+    event fields       weight, process, scale
+
+Mother indices are the LHE ones (1-based within the event, 0 for none), as
+in lhe_reader_non_decayed_tan.c. The Definitions_final kernels run on the
+chunks directly:
+
+    for chunk in iterate_lhe("unweighted_events.lhe.gz"):
+        final = chunk.status == 1
+        sphericity, aplanarity, circularity = event_shape_batch(*chunk.momenta(final))
+"""
+
+import gzip
+
+import numpy as np
+
+PARTICLE_FIELDS = ["id", "status", "mother1", "mother2", "px", "py", "pz", "E", "m"]
+_INT_FIELDS = {"id", "status", "mother1", "mother2"}
+# Columns of a particle line: id status mother1 mother2 color1 color2 px py pz E m lifetime spin
+_COLUMNS = {"id": 0, "status": 1, "mother1": 2, "mother2": 3, "px": 6, "py": 7, "pz": 8, "E": 9, "m": 10}
+_PARTICLE_WIDTH = 13
+
+class LHEChunk:
+    """
+    One chunk of LHE events as jagged columns.
+
+    columns["px"] is the flat px of every particle in the chunk, and offsets
+    (length n_events + 1) says which particles belong to which event. The
+    columns are also attributes (chunk.id, chunk.px, ...).
+    """
+
+    def __init__(self, entry_start, columns, offsets, weight, process=None, scale=None):
+        self.entry_start = entry_start
+        self.columns = columns
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.weight = np.asarray(weight, dtype=np.float64)
+        self.process = process
+        self.scale = scale
+
+    @property
+    def entry_stop(self):
+        return self.entry_start + len(self)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __getattr__(self, name):
+        columns = self.__dict__.get("columns")
+        if columns is not None and name in columns:
+            return columns[name]
+        raise AttributeError(name)
+
+    def counts(self):
+        """Number of particles in every event."""
+        return np.diff(self.offsets)
+
+    def event_index(self):
+        """Event number (within the chunk) of every flat particle."""
+        return np.repeat(np.arange(len(self)), self.counts())
+
+    def subset_offsets(self, mask):
+        """Offsets of the particles passing a flat boolean mask."""
+        offsets = np.zeros(len(self) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.event_index()[mask], minlength=len(self)), out=offsets[1:])
+        return offsets
+
+    def momenta(self, mask=None):
+        """(px, py, pz, offsets) of all particles, or of those passing a flat mask, for the batch kernels."""
+        if mask is None:
+            return self.px, self.py, self.pz, self.offsets
+        mask = np.asarray(mask, dtype=bool)
+        return self.px[mask], self.py[mask], self.pz[mask], self.subset_offsets(mask)
+
+    def pt(self):
+        return np.hypot(self.px, self.py)
+
+def open_lhe(path):
+    """Text stream of a plain or gzip-compressed LHE file (by content, not by suffix)."""
+    with open(path, "rb") as probe:
+        compressed = probe.read(2) == b"\x1f\x8b"
+    return gzip.open(path, "rt") if compressed else open(path)
+
+# Characters read from the stream at a time
+BLOCK_SIZE = 1 << 22
+
+def _make_chunk(entry_start, headers, lines, counts):
+    """Parse the buffered event headers and particle lines of one chunk in bulk."""
+    headers = np.fromstring(" ".join(headers), sep=" ").reshape(-1, 6)
+    values = np.fromstring(" ".join(lines), sep=" ")
+    if len(values) != _PARTICLE_WIDTH * sum(counts):
+        raise ValueError(f"Malformed particle lines in LHE events {entry_start}-{entry_start + len(counts) - 1}")
+    values = values.reshape(-1, _PARTICLE_WIDTH)
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    columns = {field: values[:, column].astype(np.int32 if field in _INT_FIELDS else np.float64)
+               for field, column in _COLUMNS.items()}
+    return LHEChunk(entry_start, columns, offsets, headers[:, 2], headers[:, 1].astype(np.int32), headers[:, 3])
+
+def _event_blocks(stream):
+    """Yield the text of every <event> block (after the tag) of a text stream, reading it in blocks."""
+    tail = ""
+    while True:
+        block = stream.read(BLOCK_SIZE)
+        pieces = (tail + block).split("<event")
+        # pieces[0] precedes the first tag of this block (file header, or the empty start of the tail)
+        if not block:
+            yield from pieces[1:]
+            return
+        tail = "<event" + pieces.pop() if len(pieces) > 1 else pieces[0][-len("<event"):]
+        yield from pieces[1:]
+
+def parse_events(stream, chunk_size=10000, entry_start=0, max_events=None):
+    """
+    Yield LHEChunks from a text stream positioned anywhere before an <event> block.
+
+    Args:
+        stream: Text stream with read().
+        chunk_size (int): Events per chunk.
+        entry_start (int): Event number of the first event in the stream.
+        max_events (int): Stop after this many events.
+    """
+    stop = None if max_events is None else entry_start + max_events
+    headers, lines, counts = [], [], []
+    for piece in _event_blocks(stream):
+        if "</event>" not in piece:
+            raise ValueError(f"Truncated LHE event {entry_start + len(counts)}")
+        # Rest of the tag line, event line (NUP IDPRUP XWGTUP SCALUP AQEDUP AQCDUP), particles;
+        # optional blocks after the particles (<rwgt>, <mgrwt>, # comments) are skipped
+        _, header, body = piece.split("\n", 2)
+        n_particles = int(header.split(None, 1)[0])
+        headers.append(header)
+        lines.extend(body.split("\n", n_particles)[:n_particles])
+        counts.append(n_particles)
+        if len(counts) == chunk_size or entry_start + len(counts) == stop:
+            yield _make_chunk(entry_start, headers, lines, counts)
+            entry_start += len(counts)
+            headers, lines, counts = [], [], []
+            if entry_start == stop:
+                return
+    if counts:
+        yield _make_chunk(entry_start, headers, lines, counts)
+
+def iterate_lhe(path, chunk_size=10000, max_events=None):
+    """
+    Stream the events of an LHE file (plain or .gz) in chunks of constant memory.
+
+    Args:
+        path (str): LHE file.
+        chunk_size (int): Events per chunk.
+        max_events (int): Stop after this many events.
+
+    Yields:
+        LHEChunk
+    """
+    with open_lhe(path) as stream:
+        yield from parse_events(stream, chunk_size, max_events=max_events)
@@ -0,0 +1,238 @@
+"""
+Cross-section normalization of comparison samples.
+
+The scale factor of a sample is
+
+    scale = cross section [pb] * 1000 * luminosity [fb^-1] / sum of weights
+
+so its histograms show expected events for the target luminosity.
+
+Cross section, first match:
+    "xsec"                  explicit value in pb
+    "table" + "point"       row of a MadGraph scan table (Mxd_vs_Weight.py format)
+                            whose columns match "point", e.g. {"Mxd": 10};
+                            "xsec_column" names the value column (default "Weight")
+    "banner"                MadGraph run banner or LHE file; by default the
+                            *banner.txt / unweighted_events.lhe[.gz] next to "path"
+
+Sum of weights, first match:
+    the "all" bin of the "cutflow" histogram in the sample file (written by
+    Example1_updated.py), the Event.Weight column of a Delphes file given as
+    "events" (one column read, cached by path, size and mtime), or the number
+    of events of the banner.
+
+An explicit "scale" in the sample config is used as is ("scale": 1 draws a
+sample unscaled). A sample with no source for either is an error, so an
+unnormalized sample is never overlaid on normalized ones by accident.
+"""
+
+import glob
+import gzip
+import json
+import os
+import re
+
+import numpy as np
+
+from histogram_compare import CACHE_DIR
+
+try:
+    import uproot
+except ImportError:
+    uproot = None
+
+# Sum-of-weights cache of Delphes files, next to the histogram array cache
+SUMW_CACHE = os.path.join(CACHE_DIR, "sum_of_weights.json")
+
+_NUMBER = r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?"
+
+def read_table(path):
+    """
+    Parse a MadGraph scan table, e.g.
+
+        mh2 = mh3 = mhc = 700
+        +-------+-------------+
+        |  Mxd  |   Weight    |
+        +-------+-------------+
+        |  10   | 0.0340101   |
+
+    A "value +- error" cell adds a "<column>_error" column.
+
+    Returns:
+        tuple: (parameters, columns, rows); parameters from "a = b = value"
+        lines, columns from the header (default "Mxd", "Weight") and rows as
+        tuples of floats.
+    """
+    parameters, columns, rows, errors = {}, None, [], {}
+    with open(path) as table:
+        for line in table:
+            line = line.strip()
+            # Skip separators and blank lines
+            if not line or line.startswith("+"):
+                continue
+            if "=" in line:
+                names = [name.strip() for name in line.split("=")]
+                try:
+                    value = float(names[-1])
+                except ValueError:
+                    continue
+                parameters.update(dict.fromkeys(filter(None, names[:-1]), value))
+                continue
+            # Remove table borders like '|'; "value +- error" becomes two columns
+            parts = line.replace("|", " ").replace("\u00b1", " +- ").split()
+            # Values, and {position of the value: error} for "+-" cells
+            values, row_errors = [], {}
+            tokens = iter(parts)
+            try:
+                for part in tokens:
+                    if part == "+-" and values:
+                        row_errors[len(values) - 1] = float(next(tokens))
+                    else:
+                        values.append(float(part))
+            except (ValueError, StopIteration):
+                if columns is None:
+                    # Header; units such as "[pb]" or "(GeV)" are not columns
+                    columns = [part for part in parts if part[0] not in "[("]
+                continue
+            errors.update(row_errors)
+            rows.append((values, row_errors))
+    if columns is None:
+        columns = ["Mxd", "Weight"]
+    # Every column that has "+-" in some row gets an error column (nan where a row has none)
+    error_positions = sorted(position for position in errors if position < len(columns))
+    for position in reversed(error_positions):
+        columns.insert(position + 1, f"{columns[position]}_error")
+    table = []
+    for values, row_errors in rows:
+        row = []
+        for position, value in enumerate(values):
+            row.append(value)
+            if position in error_positions:
+                row.append(row_errors.get(position, float("nan")))
+        table.append(tuple(row))
+    return parameters, columns, [row for row in table if len(row) >= len(columns)]
+
+def table_cross_section(path, point, column="Weight"):
+    """Cross section of the table row whose columns (or table parameters) match `point`."""
+    parameters, columns, rows = read_table(path)
+    if column not in columns:
+        raise KeyError(f"{path}: no column '{column}' (columns: {', '.join(columns)})")
+    for row in rows:
+        values = dict(parameters, **dict(zip(columns, row)))
+        if all(name in values and np.isclose(values[name], value) for name, value in point.items()):
+            return values[column]
+    raise KeyError(f"{path}: no row with {point}")
+
+def find_banner(sample_path):
+    """MadGraph run banner or LHE file in the directory of a sample, None if there is none."""
+    directory = os.path.dirname(os.path.abspath(sample_path))
+    for pattern in ("*banner.txt", "unweighted_events.lhe", "unweighted_events.lhe.gz"):
+        matches = sorted(glob.glob(os.path.join(directory, pattern)))
+        if matches:
+            return matches[0]
+    return None
+
+def read_banner(path):
+    """
+    (cross section in pb, number of events) from the MGGenerationInfo block of
+    a run banner or LHE header, falling back to the <init> block. Only the
+    header is read.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    xsec = events = None
+    init = []
+    with opener(path, "rt") as banner:
+        for line in banner:
+            if "Integrated weight (pb)" in line:
+                xsec = float(re.search(_NUMBER, line.split(":", 1)[1]).group())
+            elif "Number of Events" in line:
+                events = int(float(re.search(_NUMBER, line.split(":", 1)[1]).group()))
+            elif "<init>" in line or init:
+                if "</init>" in line or "<event>" in line:
+                    break
+                init.append(line.split())
+    # <init>: beam line, then XSECUP XERRUP XMAXUP LPRUP per process
+    if xsec is None and len(init) > 2:
+        xsec = sum(float(process[0]) for process in init[2:] if process)
+    if xsec is None:
+        raise ValueError(f"{path}: no cross section found")
+    return xsec, events
+
+def _load_cache(path):
+    try:
+        with open(path) as cache:
+            return json.load(cache)
+    except (OSError, ValueError):
+        return {}
+
+def delphes_sum_of_weights(path, cache_path=SUMW_CACHE):
+    """(sum of Event.Weight, events) of a Delphes file; only that column is read, and only once per file version."""
+    stat = os.stat(path)
+    key = [stat.st_size, stat.st_mtime_ns]
+    cache = _load_cache(cache_path)
+    entry = cache.get(os.path.abspath(path))
+    if entry and entry["key"] == key:
+        return entry["sumw"], entry["events"]
+
+    if uproot is not None:
+        with uproot.open(path) as root_file:
+            weights = root_file["Delphes"]["Event.Weight"].array(library="np")
+        sumw, events = float(sum(event[0] for event in weights if len(event))), len(weights)
+    else:
+        import ROOT
+        frame = ROOT.RDataFrame("Delphes", path)
+        sumw = frame.Define("w_event", "Event.Weight[0]").Sum("w_event")
+        count = frame.Count()
+        sumw, events = float(sumw.GetValue()), int(count.GetValue())
+
+    cache[os.path.abspath(path)] = {"key": key, "sumw": sumw, "events": events}
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    with open(f"{cache_path}.tmp", "w") as cache_file:
+        json.dump(cache, cache_file, indent=1)
+    os.replace(f"{cache_path}.tmp", cache_path)
+    return sumw, events
+
+def cross_section(sample):
+    """Cross section of a sample in pb (see the module docstring for the sources)."""
+    if "xsec" in sample:
+        return float(sample["xsec"])
+    if "table" in sample:
+        return table_cross_section(sample["table"], sample.get("point", {}), sample.get("xsec_column", "Weight"))
+    banner = sample.get("banner") or find_banner(sample["path"])
+    if banner is None:
+        raise ValueError(f"No cross section for '{sample['label']}': set xsec, table or banner")
+    return read_banner(banner)[0]
+
+def sum_of_weights(sample, inventory=None):
+    """Sum of event weights of a sample (see the module docstring for the sources)."""
+    cutflow = (inventory or {}).get("cutflow")
+    if cutflow is not None and cutflow.nbins:
+        return float(cutflow.contents[1])
+    if "events" in sample:
+        return delphes_sum_of_weights(sample["events"])[0]
+    banner = sample.get("banner") or find_banner(sample["path"])
+    events = read_banner(banner)[1] if banner else None
+    if not events:
+        raise ValueError(f"No sum of weights for '{sample['label']}': no cutflow, events file or banner")
+    return float(events)
+
+def normalize(samples, inventories=None, luminosity=1.0):
+    """
+    Samples with "scale" set from cross section and sum of weights for a
+    target luminosity in fb^-1; samples with an explicit "scale" are kept.
+
+    Raises:
+        ValueError: A sample without "scale" has no cross section or no sum of weights.
+    """
+    inventories = inventories or [None] * len(samples)
+    normalized = []
+    for sample, inventory in zip(samples, inventories):
+        if "scale" not in sample:
+            try:
+                xsec, sumw = cross_section(sample), sum_of_weights(sample, inventory)
+            except ValueError as error:
+                raise ValueError(f"{error} (or set an explicit \"scale\"; 1 draws the sample unscaled)") from None
+            sample = dict(sample, scale=xsec * 1000.0 * luminosity / sumw)
+            print(f"{sample['label']}: {xsec:.6g} pb, sum of weights {sumw:.6g}, scale {sample['scale']:.6g}")
+        normalized.append(sample)
+    return normalized
@@ -0,0 +1,204 @@
+"""
+Declarative description of the analysis output: every my_Tree branch and
+histogram, its type, multiplicity and binning. define_tree and
+define_histograms are generated from it, so changing an object multiplicity
+or the Fox-Wolfram max order is a parameter change, not a code edit.
+
+Quantity fields:
+    branch      branch name template (omit for histogram-only quantities)
+    key         buffer name used in the event loop (default: branch)
+    type        NumPy type code of the branch, 'f' or 'i' (default: 'f')
+    objects     parameter name, one entry per object      -> {i}, {n} = i+1
+    pairs       parameter name, one entry per pair i < j   -> {i}, {j}
+    orders      parameter name, one entry per order 0..max -> {l}
+    labels      parameter name, one entry per label        -> {i}, {label}
+    hist        {"name", "title", "key", "bins": [nbins, low, high]}
+    group       name of the histogram list used by the event loop
+    needs       derived quantity the values come from (see define_quantities)
+
+A key without placeholders in a quantity with a multiplicity is always a
+list of buffers, one per entry (so also for one or zero entries).
+
+The "disabled" list names derived quantities to switch off: every branch and
+histogram that needs them (directly or through other quantities) is dropped
+and they are never computed.
+"""
+
+import json
+import os
+import string
+
+SCHEMA = {
+    "parameters": {
+        "n_bjets": 4,
+        "n_leps": 4,
+        "lead_labels": ["leading", "subleading"],
+        "max_order": 4,
+    },
+    "quantities": [
+        # Event shapes
+        {"branch": "sphericity_jets", "needs": "jet_shapes"},
+        {"branch": "aplanarity_jets", "needs": "jet_shapes"},
+        {"branch": "circularity_jets", "needs": "jet_shapes"},
+        {"branch": "sphericity_bjets", "needs": "bjet_shapes"},
+        {"branch": "aplanarity_bjets", "needs": "bjet_shapes"},
+        {"branch": "sphericity_leps", "needs": "lep_shapes"},
+        {"branch": "aplanarity_leps", "needs": "lep_shapes"},
+
+        # Event-level quantities
+        {"branch": "jets_size", "type": "i",
+         "hist": {"key": "histJetsSize", "name": "jet_Size", "title": "Jet Size", "bins": [18, 0.0, 17.0]}},
+        {"branch": "bjets_size", "type": "i", "needs": "bjets",
+         "hist": {"key": "histbJetsSize", "name": "bjets_Size", "title": "B-Jets Size", "bins": [17, 0.0, 17.0]}},
+        {"branch": "MET_",
+         "hist": {"key": "histMET", "name": "MET", "title": "MET", "bins": [100, 0.0, 600.0]}},
+        {"branch": "SHT",
+         "hist": {"key": "histScalarHT", "name": "Scalar_HT", "title": "Scalar HT", "bins": [100, 100.0, 1800.0]}},
+        {"branch": "mT", "needs": "lep_mt"},
+
+        # b-jets
+        {"branch": "bjet{n}_pt", "key": "bjet{n}_pt_br", "objects": "n_bjets", "needs": "leading_jets",
+         "hist": {"name": "bjet{n}_hPt", "bins": [100, 0, 400]}, "group": "bjets_hPt"},
+        {"branch": "mT_bjet{n}_met", "key": "mT_bjet{n}_met_br", "objects": "n_bjets"},
+        {"objects": "n_bjets", "needs": "leading_jets",
+         "hist": {"name": "bjet{n}_hEta", "bins": [100, -4.0, 4.0]}, "group": "bjets_hEta"},
+        {"objects": "n_bjets", "needs": "leading_jets",
+         "hist": {"name": "bjet{n}_hPhi", "bins": [100, 0.0, 3.2]}, "group": "bjets_hPhi"},
+        {"objects": "n_bjets", "needs": "leading_jets",
+         "hist": {"name": "bjet{n}_hMass", "bins": [100, 0.0, 200.0]}, "group": "bjets_hMass"},
+        {"branch": "dPhi_bjet{i}_{j}", "key": "bjet_dphi_br{i}_{j}", "pairs": "n_bjets", "needs": "jet_pair_deltas",
+         "hist": {"name": "bjet{i}_{j}_dPhi", "bins": [100, -3.15, 3.15]}, "group": "bjets_hdPhi"},
+        {"branch": "dR_bjet{i}_{j}", "key": "bjet_dr_br{i}_{j}", "pairs": "n_bjets", "needs": "jet_pair_deltas"},
+
+        # Leptons
+        {"branch": "lep{i}_pt", "key": "lep{i}_pt_br", "objects": "n_leps", "needs": "leptons",
+         "hist": {"name": "lep{n}_hPt", "bins": [100, 0, 400]}, "group": "lep_hPt"},
+        {"objects": "n_leps", "needs": "leptons",
+         "hist": {"name": "lep{n}_hEta", "bins": [100, -4.0, 4.0]}, "group": "lep_hEta"},
+        {"objects": "n_leps", "needs": "leptons",
+         "hist": {"name": "lep{n}_hPhi", "bins": [100, 0.0, 3.2]}, "group": "lep_hPhi"},
+
+        # Leading and sub-leading b-jet / lepton pairs
+        {"branch": "dphi_{label}_bjet_lep", "key": "br_dphi_bjet_lep_leading", "labels": "lead_labels",
+         "needs": "bjet_lep_deltas"},
+        {"branch": "dr_{label}_bjet_lep", "key": "br_dr_bjet_lep_leading", "labels": "lead_labels",
+         "needs": "bjet_lep_deltas"},
+
+        # Fox-Wolfram Moments
+        {"branch": "bjets_fox_wolfram_H{l}", "orders": "max_order", "needs": "bjet_fox_wolfram"},
+        {"branch": "leps_fox_wolfram_H{l}", "orders": "max_order", "needs": "lep_fox_wolfram"},
+    ],
+    "disabled": [],
+}
+
+_MULTIPLICITIES = ("objects", "pairs", "orders", "labels")
+
+class OutputSchema:
+    """Expanded view of an output schema (default: SCHEMA)."""
+
+    def __init__(self, schema=None, **parameters):
+        """
+        Args:
+            schema (dict): Schema with "parameters", "quantities" and optionally
+                "disabled" (default: SCHEMA).
+            **parameters: Overrides of schema parameters, e.g. max_order=10.
+        """
+        schema = schema or SCHEMA
+        self.parameters = dict(SCHEMA["parameters"])
+        self.parameters.update(schema.get("parameters", {}))
+        self.parameters.update(parameters)
+        self.quantities = list(schema["quantities"])
+        self.disabled = set(schema.get("disabled", []))
+
+    @classmethod
+    def load(cls, path, **parameters):
+        """Read a schema from a .json or .yaml file."""
+        with open(path) as schema_file:
+            if os.path.splitext(path)[1] in (".yaml", ".yml"):
+                try:
+                    import yaml
+                except ImportError:
+                    raise ImportError("YAML schemas need PyYAML (pip install pyyaml)")
+                schema = yaml.safe_load(schema_file)
+            else:
+                schema = json.load(schema_file)
+        return cls(schema, **parameters)
+
+    def without(self, needs):
+        """Copy of the schema without the quantities that need any of the given derived quantities."""
+        needs = set(needs)
+        schema = {"parameters": self.parameters, "disabled": sorted(self.disabled | needs),
+                  "quantities": [quantity for quantity in self.quantities if quantity.get("needs") not in needs]}
+        return OutputSchema(schema)
+
+    def requirements(self):
+        """Derived quantities the branches and histograms of the schema need."""
+        return {quantity["needs"] for quantity in self.quantities if "needs" in quantity}
+
+    @staticmethod
+    def _list_valued(quantity, key_template):
+        """A key without placeholders of a quantity with a multiplicity names a list of buffers."""
+        has_multiplicity = any(kind in quantity for kind in _MULTIPLICITIES)
+        return has_multiplicity and not any(field for _, field, _, _ in string.Formatter().parse(key_template))
+
+    def _contexts(self, quantity):
+        """Placeholder values for every entry of a quantity."""
+        kind = next((kind for kind in _MULTIPLICITIES if kind in quantity), None)
+        if kind is None:
+            return [{}]
+        value = self.parameters[quantity[kind]]
+        if kind == "objects":
+            return [{"i": i, "n": i + 1} for i in range(value)]
+        if kind == "pairs":
+            return [{"i": i, "j": j} for i in range(value) for j in range(i + 1, value)]
+        if kind == "orders":
+            return [{"l": l} for l in range(value + 1)]
+        return [{"i": i, "label": label} for i, label in enumerate(value)]
+
+    def columns(self):
+        """
+        Returns:
+            list: (buffer key, branch name, type) per branch, in schema order.
+            List-valued buffers use (key, index) as buffer key.
+        """
+        columns = []
+        for quantity in self.quantities:
+            if "branch" not in quantity:
+                continue
+            contexts = self._contexts(quantity)
+            key_template = quantity.get("key", quantity["branch"])
+            list_valued = self._list_valued(quantity, key_template)
+            for index, context in enumerate(contexts):
+                key = key_template.format(**context)
+                columns.append(((key, index) if list_valued else key,
+                                quantity["branch"].format(**context),
+                                quantity.get("type", "f")))
+        return columns
+
+    def histograms(self):
+        """
+        Returns:
+            list: (histogram key, name, title, bins) per histogram, in schema order.
+        """
+        histograms = []
+        for quantity in self.quantities:
+            hist = quantity.get("hist")
+            if hist is None:
+                continue
+            for context in self._contexts(quantity):
+                name = hist["name"].format(**context)
+                histograms.append((hist.get("key", hist["name"]).format(**context),
+                                   name,
+                                   hist.get("title", hist["name"]).format(**context),
+                                   tuple(hist["bins"])))
+        return histograms
+
+    def groups(self):
+        """Histogram keys of every named group, e.g. {"bjets_hPt": ["bjet1_hPt", ...]}."""
+        groups = {}
+        for quantity in self.quantities:
+            if "group" in quantity:
+                hist = quantity["hist"]
+                groups[quantity["group"]] = [hist.get("key", hist["name"]).format(**context)
+                                             for context in self._contexts(quantity)]
+        return groups
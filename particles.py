@@ -0,0 +1,151 @@
+"""
+Struct-of-arrays particle container.
+
+A ParticleArray holds one collection (jets, b-jets, leptons, ...) for a
+chunk of events as flat float32 columns (pt, eta, phi, mass and the
+cartesian px, py, pz, computed once) plus an offsets array of length
+n_events + 1. Per-event views are slices of the same buffers, and masked
+subsets keep the columnar layout, so no per-object Python objects are
+created. The Definitions_final kernels accept a ParticleArray wherever they
+take momentum vectors or (px, py, pz, offsets).
+
+    jets = ParticleArray.from_chunk(chunk, "Jet", fields=["BTag"])
+    bjets = jets.subset(selection.particle_mask("bjets", jets))
+    sphericity, aplanarity, circularity = event_shape_batch(bjets)
+    first_event = bjets[0]                  # zero-copy view, offsets [0, n]
+"""
+
+import numpy as np
+
+from delphes_reader import cartesian
+
+# Delphes field name -> column name
+_DELPHES_NAMES = {"PT": "pt", "Eta": "eta", "Phi": "phi", "Mass": "mass"}
+
+class ParticleArray:
+    """One collection of a chunk of events as flat columns plus offsets."""
+
+    def __init__(self, pt, eta, phi, offsets, mass=None, **fields):
+        """
+        Args:
+            pt, eta, phi (array): Flat kinematics of all objects in the chunk.
+            offsets (array): Per-event offsets into the flat arrays (length n_events + 1).
+            mass (array): Flat masses (default: zero).
+            **fields: Extra flat columns carried along, e.g. BTag=... or collection=...
+        """
+        pt = np.asarray(pt, dtype=np.float32)
+        columns = {"pt": pt, "eta": np.asarray(eta, dtype=np.float32),
+                   "phi": np.asarray(phi, dtype=np.float32),
+                   "mass": np.zeros_like(pt) if mass is None else np.asarray(mass, dtype=np.float32)}
+        # Cartesian components once per chunk
+        px, py, pz = cartesian(columns["pt"], columns["eta"], columns["phi"])
+        columns.update(px=px.astype(np.float32), py=py.astype(np.float32), pz=pz.astype(np.float32))
+        columns.update({name: np.asarray(values) for name, values in fields.items()})
+        self._set(columns, offsets)
+
+    def _set(self, columns, offsets):
+        offsets = np.asarray(offsets, dtype=np.int64)
+        self.columns = columns
+        self.offsets = offsets - offsets[0]
+
+    @classmethod
+    def _wrap(cls, columns, offsets):
+        """Build from existing columns without copying or recomputing them."""
+        particles = cls.__new__(cls)
+        particles._set(columns, offsets)
+        return particles
+
+    @classmethod
+    def from_chunk(cls, chunk, collection, fields=()):
+        """Read a collection of a DelphesChunk, e.g. ("Jet", fields=["BTag"])."""
+        first, last = int(chunk.offsets[collection][0]), int(chunk.offsets[collection][-1])
+        column = lambda field: np.asarray(chunk[f"{collection}.{field}"])[first:last]
+        mass = column("Mass") if f"{collection}.Mass" in chunk.columns else None
+        return cls(column("PT"), column("Eta"), column("Phi"), chunk.offsets[collection], mass,
+                   **{field: column(field) for field in fields})
+
+    @classmethod
+    def from_objects(cls, objects, fields=()):
+        """One event from a sequence of Delphes objects (e.g. branchJet.At(i)), read in one pass."""
+        rows = [(obj.PT, obj.Eta, obj.Phi, getattr(obj, "Mass", 0.0)) + tuple(getattr(obj, field) for field in fields)
+                for obj in objects]
+        values = np.array(rows, dtype=np.float64).reshape(len(rows), 4 + len(fields))
+        return cls(values[:, 0], values[:, 1], values[:, 2], [0, len(rows)], values[:, 3],
+                   **{field: values[:, 4 + k].astype(np.int64) if field == "BTag" else values[:, 4 + k]
+                      for k, field in enumerate(fields)})
+
+    def __getattr__(self, name):
+        columns = self.__dict__.get("columns")
+        if columns is not None and name in columns:
+            return columns[name]
+        raise AttributeError(name)
+
+    def __len__(self):
+        """Number of events."""
+        return len(self.offsets) - 1
+
+    @property
+    def n_objects(self):
+        return int(self.offsets[-1])
+
+    def counts(self):
+        """Number of objects in every event."""
+        return np.diff(self.offsets)
+
+    def field(self, name):
+        """Flat column by Delphes field name ("PT", "Eta", "BTag", ...) or column name."""
+        return self.columns[_DELPHES_NAMES.get(name, name)]
+
+    def event_index(self):
+        """Event number of every flat object."""
+        return np.repeat(np.arange(len(self)), self.counts())
+
+    def __getitem__(self, event):
+        """Zero-copy view of one event (a one-event ParticleArray)."""
+        first, last = self.offsets[event], self.offsets[event + 1]
+        return self._wrap({name: column[first:last] for name, column in self.columns.items()},
+                          np.array([0, last - first]))
+
+    def momenta(self):
+        """(n_objects, 3) array of [px, py, pz]."""
+        return np.stack([self.px, self.py, self.pz], axis=1)
+
+    def subset(self, mask):
+        """Objects passing a flat boolean mask, keeping the event structure."""
+        mask = np.asarray(mask, dtype=bool)
+        offsets = np.zeros(len(self) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.event_index()[mask], minlength=len(self)), out=offsets[1:])
+        return self._wrap({name: column[mask] for name, column in self.columns.items()}, offsets)
+
+    def leading(self, n):
+        """At most the first n objects of every event."""
+        local = np.arange(self.n_objects) - np.repeat(self.offsets[:-1], self.counts())
+        return self.subset(local < n)
+
+    def sorted_by_pt(self):
+        """Objects of every event in descending pt order."""
+        order = np.lexsort((-self.pt, self.event_index()))
+        return self._wrap({name: column[order] for name, column in self.columns.items()}, self.offsets)
+
+    @classmethod
+    def concatenate(cls, arrays):
+        """
+        Merge collections event by event (e.g. electrons and muons into leptons),
+        keeping a "collection" column with the index of the source array.
+        Use sorted_by_pt() afterwards for a pt-ordered merge.
+        """
+        n_events = len(arrays[0])
+        names = set(arrays[0].columns)
+        for particles in arrays[1:]:
+            names &= set(particles.columns)
+        names.discard("collection")
+        event_idx = np.concatenate([particles.event_index() for particles in arrays])
+        source = np.concatenate([np.full(particles.n_objects, k, dtype=np.int32)
+                                 for k, particles in enumerate(arrays)])
+        order = np.argsort(event_idx, kind="stable")
+        columns = {name: np.concatenate([particles.columns[name] for particles in arrays])[order]
+                   for name in names}
+        columns["collection"] = source[order]
+        offsets = np.zeros(n_events + 1, dtype=np.int64)
+        np.cumsum(np.bincount(event_idx, minlength=n_events), out=offsets[1:])
+        return cls._wrap(columns, offsets)
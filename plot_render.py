@@ -0,0 +1,135 @@
+"""
+Parallel, incremental rendering of comparison plots.
+
+A plot is (name, histograms, style): HistogramData arrays plus a
+JSON-serialisable style dict. A draw function builds the styled canvas
+straight from that data, and render_plots prints the canvases (PDF, PNG, ...)
+in a pool of batch-mode ROOT processes.
+
+Every plot has a content hash over its arrays, its style, the source of the
+module defining the draw function and the output formats. The hashes of the last run are kept in a manifest in
+the plot directory, and plots whose hash and output files are unchanged are
+not rendered again. The manifest also lists the pages of the multipage PDF,
+which is rebuilt when a plot was rendered or the list of plots changed
+(plots added, removed or reordered).
+
+    def draw(name, histograms, style):
+        ...
+        return canvas, keep_alive
+
+    render_plots(draw, plots, plot_dir="plots", formats=("pdf", "png"), multipage="all.pdf")
+"""
+
+import concurrent.futures
+import hashlib
+import inspect
+import json
+import multiprocessing
+import os
+
+# Per-directory record of the content hash of every rendered plot
+MANIFEST = ".plot_hashes.json"
+# Manifest key prefix of the page list of a multipage PDF
+_PAGES_KEY = "pages:"
+
+def _draw_source(draw):
+    """Source of the module defining `draw`, so restyling draw or a helper it calls re-renders."""
+    try:
+        return inspect.getsource(inspect.getmodule(draw))
+    except (OSError, TypeError):
+        return ""
+
+def plot_hash(draw, histograms, style, formats, source=None):
+    """
+    Content hash of one plot: histogram arrays, style, draw function (name and
+    module source, see _draw_source) and output formats.
+    """
+    digest = hashlib.sha1()
+    source = _draw_source(draw) if source is None else source
+    digest.update(json.dumps([f"{draw.__module__}.{draw.__qualname__}", source, style, list(formats)],
+                             sort_keys=True).encode())
+    for hist in histograms:
+        digest.update(hist.name.encode())
+        for array in (hist.edges, hist.contents, hist.errors):
+            digest.update(array.tobytes())
+    return digest.hexdigest()
+
+def output_paths(name, plot_dir, formats):
+    return [os.path.join(plot_dir, f"{name}.{extension}") for extension in formats]
+
+def _render(draw, name, histograms, style, paths):
+    """Worker: draw one plot in batch mode and print it to every path."""
+    import ROOT
+    ROOT.gROOT.SetBatch(True)
+    canvas, _keep = draw(name, histograms, style)
+    for path in paths:
+        canvas.Print(path)
+    return name
+
+def _load_manifest(plot_dir):
+    try:
+        with open(os.path.join(plot_dir, MANIFEST)) as manifest:
+            return json.load(manifest)
+    except (OSError, ValueError):
+        return {}
+
+def _save_manifest(plot_dir, hashes):
+    path = os.path.join(plot_dir, MANIFEST)
+    with open(f"{path}.tmp", "w") as manifest:
+        json.dump(hashes, manifest, indent=1, sort_keys=True)
+    os.replace(f"{path}.tmp", path)
+
+def render_plots(draw, plots, plot_dir=".", formats=("pdf",), workers=None, multipage=None, force=False):
+    """
+    Render every out-of-date plot in parallel.
+
+    Args:
+        draw (callable): Module-level draw(name, histograms, style) -> (canvas, objects to keep alive).
+        plots (list): (name, histograms, style) tuples.
+        plot_dir (str): Output directory of the per-plot files.
+        formats (tuple): File extensions, one output file per plot and extension.
+        workers (int): Rendering processes (default: number of CPUs).
+        multipage (str): Also print all plots, in order, into this multipage PDF.
+        force (bool): Render everything regardless of the manifest.
+
+    Returns:
+        list: names of the plots that were rendered.
+    """
+    os.makedirs(plot_dir, exist_ok=True)
+    previous = _load_manifest(plot_dir)
+    hashes, todo = {}, []
+    source = _draw_source(draw)
+    for name, histograms, style in plots:
+        hashes[name] = plot_hash(draw, histograms, style, formats, source)
+        paths = output_paths(name, plot_dir, formats)
+        if force or previous.get(name) != hashes[name] or not all(os.path.exists(path) for path in paths):
+            todo.append((name, histograms, style, paths))
+
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(todo) <= 1:
+        rendered = [_render(draw, *plot) for plot in todo]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(workers,
+                                                    mp_context=multiprocessing.get_context("spawn")) as pool:
+            arguments = list(zip(*todo))
+            rendered = list(pool.map(_render, [draw] * len(todo), *arguments,
+                                     chunksize=max(1, len(todo) // (4 * workers))))
+
+    # Keep the hashes of plots rendered earlier that are not part of this run
+    manifest = dict(previous, **hashes)
+    _save_manifest(plot_dir, manifest)
+
+    names = [name for name, _histograms, _style in plots]
+    pages_key = _PAGES_KEY + os.path.abspath(multipage) if multipage else None
+    if multipage and plots and (rendered or previous.get(pages_key) != names or not os.path.exists(multipage)):
+        # Pages of one PDF are written in order, so this part stays in one process
+        import ROOT
+        ROOT.gROOT.SetBatch(True)
+        for page, (name, histograms, style) in enumerate(plots):
+            canvas, _keep = draw(name, histograms, style)
+            suffix = "(" if page == 0 else ")" if page == len(plots) - 1 else ""
+            canvas.Print(multipage + suffix if len(plots) > 1 else multipage)
+        # Recorded once the file is complete, so an interrupted write is redone
+        manifest[pages_key] = names
+        _save_manifest(plot_dir, manifest)
+    return rendered
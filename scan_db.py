@@ -0,0 +1,215 @@
+"""
+Indexed cross-section scan database.
+
+MadGraph scan tables (the Mxd_vs_Weight.py format, see normalization.read_table)
+are ingested into one SQLite file. Every table row becomes a point whose model
+parameters are columns: the row's own columns (Mxd, ...) plus the table's
+"mh2 = mh3 = mhc = 700" parameters. The cross section and its uncertainty go
+into xsec and xsec_error, and the table it came from goes into source.
+Parameter columns are added as new tables introduce them.
+
+Ingestion is incremental. A table is re-parsed only when its size or mtime
+changed, and its previous rows are replaced. Tables that no longer exist
+under an ingested directory are dropped.
+
+    python scan_db.py ingest scans/ --db scan.sqlite
+    python scan_db.py query --db scan.sqlite --where Mxd=10 --order mh2
+
+    db = connect("scan.sqlite")
+    ingest(db, ["scans/"])
+    curves = series(db, x="Mxd", by="mh2", where={"mh3": 700})
+"""
+
+import argparse
+import glob
+import os
+import re
+import sqlite3
+import sys
+
+from normalization import read_table
+
+DB_PATH = "scan.sqlite"
+
+# Table columns holding the cross section and its uncertainty, first match
+XSEC_COLUMNS = ("Weight", "xsec", "cross", "Cross")
+ERROR_COLUMNS = ("Weight_error", "xsec_error", "cross_error", "Error", "error", "Uncertainty")
+
+# Columns of the points table that are not model parameters
+_RESERVED = {"id", "source", "xsec", "xsec_error"}
+_NAME = re.compile(r"^[A-Za-z_]\w*$")
+
+def connect(path=DB_PATH):
+    """Open (and create if needed) a scan database."""
+    db = sqlite3.connect(path)
+    db.executescript("""
+        CREATE TABLE IF NOT EXISTS sources (
+            path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, points INTEGER);
+        CREATE TABLE IF NOT EXISTS points (
+            id INTEGER PRIMARY KEY, source TEXT NOT NULL, xsec REAL, xsec_error REAL);
+        CREATE INDEX IF NOT EXISTS points_source ON points (source);
+    """)
+    return db
+
+def parameters(db):
+    """Model parameter columns of the points table."""
+    return [row[1] for row in db.execute("PRAGMA table_info(points)") if row[1] not in _RESERVED]
+
+def _add_parameters(db, names):
+    known = set(parameters(db))
+    for name in names:
+        if name in known:
+            continue
+        if not _NAME.match(name) or name in _RESERVED:
+            raise ValueError(f"Invalid parameter name '{name}'")
+        db.execute(f'ALTER TABLE points ADD COLUMN "{name}" REAL')
+        db.execute(f'CREATE INDEX "points_{name}" ON points ("{name}")')
+        known.add(name)
+
+def table_points(path):
+    """(parameter names, rows of (parameter values..., xsec, xsec_error)) of one scan table."""
+    table_parameters, columns, rows = read_table(path)
+    xsec = next((column for column in XSEC_COLUMNS if column in columns), columns[-1])
+    error = next((column for column in ERROR_COLUMNS if column in columns), None)
+    names = [column for column in columns if column not in (xsec, error)]
+    names += [name for name in table_parameters if name not in names]
+    points = []
+    for row in rows:
+        values = dict(table_parameters, **dict(zip(columns, row)))
+        points.append(tuple(values[name] for name in names) +
+                      (values[xsec], values[error] if error else None))
+    return names, points
+
+def _expand(inputs, pattern):
+    """(tables, directories) of files, globs and directories (searched recursively for `pattern`)."""
+    tables, directories = [], []
+    for item in inputs:
+        if os.path.isdir(item):
+            directories.append(os.path.abspath(item))
+            tables.extend(glob.glob(os.path.join(item, "**", pattern), recursive=True))
+        else:
+            tables.extend(glob.glob(item) or [item])
+    return sorted(set(os.path.abspath(path) for path in tables)), directories
+
+def ingest(db, inputs, pattern="*.txt", verbose=True):
+    """
+    Parse new or changed scan tables into the database.
+
+    Args:
+        db (sqlite3.Connection): Scan database.
+        inputs (list): Table files, globs or directories.
+        pattern (str): File pattern of the tables inside directories.
+
+    Returns:
+        tuple: (ingested, unchanged, removed) numbers of tables.
+    """
+    tables, directories = _expand(inputs, pattern)
+    known = {path: (size, mtime_ns) for path, size, mtime_ns in db.execute("SELECT path, size, mtime_ns FROM sources")}
+    ingested = unchanged = 0
+    with db:
+        for path in tables:
+            stat = os.stat(path)
+            if known.get(path) == (stat.st_size, stat.st_mtime_ns):
+                unchanged += 1
+                continue
+            names, points = table_points(path)
+            _add_parameters(db, names)
+            db.execute("DELETE FROM points WHERE source = ?", (path,))
+            columns = ", ".join(f'"{name}"' for name in names + ["xsec", "xsec_error"])
+            db.executemany(f"INSERT INTO points (source, {columns}) VALUES (?{', ?' * (len(names) + 2)})",
+                           [(path,) + point for point in points])
+            db.execute("INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)",
+                       (path, stat.st_size, stat.st_mtime_ns, len(points)))
+            ingested += 1
+            if verbose:
+                print(f"Ingested {len(points)} points from {path}")
+
+        # Tables that disappeared from an ingested directory
+        removed = [path for path in known if not os.path.exists(path)
+                   and any(path.startswith(directory + os.sep) for directory in directories)]
+        for path in removed:
+            db.execute("DELETE FROM points WHERE source = ?", (path,))
+            db.execute("DELETE FROM sources WHERE path = ?", (path,))
+    return ingested, unchanged, len(removed)
+
+def query(db, columns=None, where=None, order=None, sources=None):
+    """
+    Rows of a slice of the scan.
+
+    Args:
+        columns (list): Columns to return (default: all parameters, xsec, xsec_error).
+        where (dict): Fixed parameter values, e.g. {"Mxd": 10}.
+        order (list): Columns to sort by.
+        sources (list): Restrict to these tables (or to tables under these directories).
+
+    Returns:
+        tuple: (column names, list of row tuples).
+    """
+    known = set(parameters(db)) | _RESERVED
+    columns = columns or parameters(db) + ["xsec", "xsec_error"]
+    for name in list(columns) + list(where or {}) + list(order or []):
+        if name not in known:
+            raise KeyError(f"Unknown column '{name}' (known: {', '.join(sorted(known))})")
+    clauses, arguments = [], []
+    for name, value in (where or {}).items():
+        # Parameters are floats; compare with a relative tolerance
+        clauses.append(f'ABS("{name}" - ?) <= 1e-9 * MAX(1.0, ABS(?))')
+        arguments += [value, value]
+    if sources:
+        paths = [os.path.abspath(source) for source in sources]
+        # Exact prefix comparison: LIKE would treat "_" as a wildcard and ignore case
+        clauses.append("(" + " OR ".join(["source = ? OR substr(source, 1, length(?)) = ?"] * len(paths)) + ")")
+        for path in paths:
+            arguments += [path, path + os.sep, path + os.sep]
+    sql = f"SELECT {', '.join(f'{chr(34)}{name}{chr(34)}' for name in columns)} FROM points"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    if order:
+        sql += " ORDER BY " + ", ".join(f'"{name}"' for name in order)
+    return list(columns), db.execute(sql, arguments).fetchall()
+
+def series(db, x, by=None, where=None, sources=None):
+    """
+    Cross section vs `x`, one curve per value of `by`.
+
+    Returns:
+        dict: {value of by (None without by): (x values, xsec values, xsec errors)}.
+    """
+    columns = [x, "xsec", "xsec_error"] + ([by] if by else [])
+    _, rows = query(db, columns, where, order=([by] if by else []) + [x], sources=sources)
+    curves = {}
+    for row in rows:
+        curve = curves.setdefault(row[3] if by else None, ([], [], []))
+        for values, value in zip(curve, row[:3]):
+            values.append(value)
+    return curves
+
+def _parse_where(items):
+    where = {}
+    for item in items or []:
+        name, _, value = item.partition("=")
+        where[name.strip()] = float(value)
+    return where
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cross-section scan database.")
+    parser.add_argument("command", choices=["ingest", "query"])
+    parser.add_argument("inputs", nargs="*", help="scan tables or directories (ingest)")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--pattern", default="*.txt", help="table file pattern inside directories")
+    parser.add_argument("--where", action="append", help="fixed parameter, e.g. Mxd=10 (repeatable)")
+    parser.add_argument("--columns", help="comma-separated columns to print")
+    parser.add_argument("--order", help="comma-separated columns to sort by")
+    args = parser.parse_args()
+
+    db = connect(args.db)
+    if args.command == "ingest":
+        ingested, unchanged, removed = ingest(db, args.inputs, args.pattern)
+        print(f"{ingested} tables ingested, {unchanged} unchanged, {removed} removed")
+    else:
+        columns, rows = query(db, args.columns.split(",") if args.columns else None, _parse_where(args.where),
+                              args.order.split(",") if args.order else None, args.inputs or None)
+        print("\t".join(columns))
+        for row in rows:
+            print("\t".join("" if value is None else f"{value:g}" if isinstance(value, float) else str(value)
+                            for value in row), file=sys.stdout)
@@ -0,0 +1,281 @@
+"""
+Configurable object selection and weighted cut flow.
+
+Object selections and event-level cuts are declared in SELECTION (or a
+.json/.yaml file with the same layout) instead of being written into the
+event loop. The same configuration drives both the per-event loop
+(object_passes / event_passes on Delphes objects) and the chunked columnar
+path (object_mask / select / merge_collections on DelphesChunk columns).
+
+Object cut fields:
+    field       Delphes field, e.g. "PT"
+    abs         compare |field| (default: false)
+    op          one of > >= < <= == !=
+    value       threshold
+
+Event cuts are applied in order; each one counts the objects of a
+collection ("Jet") or of a selection ("bjets") and compares the count.
+"""
+
+import json
+import operator
+import os
+import sys
+
+import numpy as np
+
+SELECTION = {
+    # b-tag working point bit: 0 - Loose, 1 - Medium, 2 - Tight (null: any bit set)
+    "btag_working_point": 1,
+    "objects": {
+        "bjets": {
+            "collections": ["Jet"],
+            "btag": True,
+            "cuts": [
+                {"field": "PT", "op": ">", "value": 30.0},
+                {"field": "Eta", "abs": True, "op": "<", "value": 5.0},
+            ],
+        },
+        # Electrons and muons merged and sorted by PT
+        "leptons": {"collections": ["Electron", "Muon"], "cuts": []},
+    },
+    "event_cuts": [
+        {"name": "jets", "count": "Jet", "op": ">", "value": 3},
+        {"name": "bjets", "count": "bjets", "op": ">", "value": 3},
+    ],
+}
+
+_OPERATORS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le,
+              "==": operator.eq, "!=": operator.ne}
+
+class Selection:
+    """Object selections and ordered event cuts of a selection config (default: SELECTION)."""
+
+    def __init__(self, config=None, **overrides):
+        """
+        Args:
+            config (dict): Selection config (default: SELECTION).
+            **overrides: Top-level overrides, e.g. btag_working_point=2.
+        """
+        config = dict(config or SELECTION)
+        config.update(overrides)
+        self.btag_working_point = config.get("btag_working_point")
+        self.objects = config.get("objects", {})
+        self.event_cuts = config.get("event_cuts", [])
+        self._event_cuts = {cut["name"]: cut for cut in self.event_cuts}
+
+    @classmethod
+    def load(cls, path, **overrides):
+        """Read a selection config from a .json or .yaml file."""
+        with open(path) as config_file:
+            if os.path.splitext(path)[1] in (".yaml", ".yml"):
+                try:
+                    import yaml
+                except ImportError:
+                    raise ImportError("YAML selections need PyYAML (pip install pyyaml)")
+                config = yaml.safe_load(config_file)
+            else:
+                config = json.load(config_file)
+        return cls(config, **overrides)
+
+    def cut_names(self):
+        return ["all"] + [cut["name"] for cut in self.event_cuts]
+
+    def btag_passes(self, btag):
+        """Working-point bit test, BTag & (1 << wp); works on ints and arrays."""
+        if self.btag_working_point is None:
+            return btag != 0
+        return (btag & (1 << self.btag_working_point)) != 0
+
+    # Per-event interface on Delphes objects
+
+    def object_passes(self, name, candidate):
+        """Whether one Delphes object (e.g. branchJet.At(i)) passes selection `name`."""
+        definition = self.objects[name]
+        if definition.get("btag") and not self.btag_passes(candidate.BTag):
+            return False
+        for cut in definition.get("cuts", []):
+            value = getattr(candidate, cut["field"])
+            if cut.get("abs"):
+                value = abs(value)
+            if not _OPERATORS[cut["op"]](value, cut["value"]):
+                return False
+        return True
+
+    def event_passes(self, name, count):
+        """Whether an object count passes event cut `name`."""
+        cut = self._event_cuts[name]
+        return bool(_OPERATORS[cut["op"]](count, cut["value"]))
+
+    # Chunked columnar interface on DelphesChunk
+
+    def _mask(self, name, column, n_objects):
+        """Boolean mask of selection `name`, column(field) giving the flat values of a Delphes field."""
+        definition = self.objects[name]
+        mask = np.ones(n_objects, dtype=bool)
+        if definition.get("btag"):
+            mask &= self.btag_passes(np.asarray(column("BTag")).astype(np.int64))
+        for cut in definition.get("cuts", []):
+            values = np.asarray(column(cut["field"]))
+            if cut.get("abs"):
+                values = np.abs(values)
+            mask &= _OPERATORS[cut["op"]](values, cut["value"])
+        return mask
+
+    def object_mask(self, chunk, name, collection):
+        """Boolean mask over the flat objects of one collection for selection `name`."""
+        n_objects = int(chunk.offsets[collection][-1] - chunk.offsets[collection][0])
+        return self._mask(name, lambda field: chunk[f"{collection}.{field}"], n_objects)
+
+    def particle_mask(self, name, particles):
+        """Boolean mask over the objects of a ParticleArray for selection `name`."""
+        return self._mask(name, particles.field, particles.n_objects)
+
+    def select(self, chunk, name, fields=("PT", "Eta", "Phi")):
+        """
+        Apply selection `name` to a chunk, merging its collections per event in
+        descending PT order.
+
+        Returns:
+            tuple: (columns, offsets), columns[field] flat selected values plus
+            columns["collection"], the index of the source collection.
+        """
+        collections = self.objects[name]["collections"]
+        masks = [self.object_mask(chunk, name, collection) for collection in collections]
+        return merge_collections(chunk, collections, fields, masks)
+
+    def apply(self, chunk, cutflow=None, weights=None):
+        """
+        Run every object selection and the ordered event cuts on a chunk.
+
+        Returns:
+            tuple: (selected, event_mask), selected[name] = (columns, offsets) for
+            every object selection and event_mask the events passing all cuts.
+        """
+        selected = {name: self.select(chunk, name) for name in self.objects}
+        if weights is None:
+            weights = chunk.first("Event.Weight", 1.0)
+        passed = np.ones(len(chunk), dtype=bool)
+        if cutflow is not None:
+            cutflow.fill("all", passed, weights)
+        for cut in self.event_cuts:
+            offsets = selected[cut["count"]][1] if cut["count"] in selected else chunk.offsets[cut["count"]]
+            passed &= _OPERATORS[cut["op"]](np.diff(offsets), cut["value"])
+            if cutflow is not None:
+                cutflow.fill(cut["name"], passed, weights)
+        return selected, passed
+
+def merge_collections(chunk, collections, fields=("PT", "Eta", "Phi"), masks=None):
+    """
+    Concatenate several collections (e.g. Electron and Muon) event by event
+    and sort the objects of every event by descending PT, in bulk.
+
+    Args:
+        chunk (DelphesChunk): Input columns.
+        collections (list): Collection names.
+        fields (tuple): Fields to carry over, must include "PT".
+        masks (list): Optional boolean mask per collection over its flat objects.
+
+    Returns:
+        tuple: (columns, offsets) as in Selection.select.
+    """
+    n_events = len(chunk)
+    event_idx, source, values = [], [], {field: [] for field in fields}
+    for k, collection in enumerate(collections):
+        offsets = chunk.offsets[collection]
+        counts = np.diff(offsets)
+        index = np.repeat(np.arange(n_events), counts)
+        keep = masks[k] if masks is not None else slice(None)
+        event_idx.append(index[keep])
+        source.append(np.full(len(index), k, dtype=np.int32)[keep])
+        for field in fields:
+            values[field].append(np.asarray(chunk[f"{collection}.{field}"])[keep])
+
+    event_idx = np.concatenate(event_idx)
+    columns = {field: np.concatenate(parts) for field, parts in values.items()}
+    columns["collection"] = np.concatenate(source)
+    # Stable sort by event, then by descending PT inside the event
+    order = np.lexsort((-columns["PT"], event_idx))
+    columns = {field: column[order] for field, column in columns.items()}
+    offsets = np.zeros(n_events + 1, dtype=np.int64)
+    np.cumsum(np.bincount(event_idx, minlength=n_events), out=offsets[1:])
+    return columns, offsets
+
+class CutFlow:
+    """Weighted cut flow: events, sum of weights and sum of squared weights after each cut."""
+
+    def __init__(self, names):
+        self.names = list(names)
+        self.events = dict.fromkeys(self.names, 0)
+        self.sumw = dict.fromkeys(self.names, 0.0)
+        self.sumw2 = dict.fromkeys(self.names, 0.0)
+
+    def count(self, name, w=1.0):
+        """Count one event passing cut `name` (per-event loops)."""
+        self.events[name] += 1
+        self.sumw[name] += w
+        self.sumw2[name] += w * w
+
+    def fill(self, name, mask, weights):
+        """Count every event of a chunk that passes cut `name`."""
+        mask = np.asarray(mask, dtype=bool)
+        weights = np.broadcast_to(np.asarray(weights, dtype=np.float64), mask.shape)[mask]
+        self.events[name] += int(mask.sum())
+        self.sumw[name] += float(weights.sum())
+        self.sumw2[name] += float((weights * weights).sum())
+
+    def __iadd__(self, other):
+        for name in other.names:
+            if name not in self.events:
+                raise ValueError(f"Cannot merge cut flows: unknown cut '{name}'")
+            self.events[name] += other.events[name]
+            self.sumw[name] += other.sumw[name]
+            self.sumw2[name] += other.sumw2[name]
+        return self
+
+    def to_dict(self):
+        """Plain (JSON-serializable) form, e.g. for run statistics."""
+        return {"names": list(self.names), "events": dict(self.events), "sumw": dict(self.sumw),
+                "sumw2": dict(self.sumw2)}
+
+    @classmethod
+    def from_dict(cls, data):
+        cutflow = cls(data["names"])
+        for field in ("events", "sumw", "sumw2"):
+            getattr(cutflow, field).update(data[field])
+        return cutflow
+
+    def table(self):
+        """Rows of (cut, events, sumw, error, efficiency w.r.t. the previous cut, cumulative efficiency)."""
+        rows = []
+        first = self.sumw[self.names[0]] if self.names else 0.0
+        previous = first
+        for name in self.names:
+            sumw = self.sumw[name]
+            rows.append((name, self.events[name], sumw, float(np.sqrt(self.sumw2[name])),
+                         sumw / previous if previous else 0.0, sumw / first if first else 0.0))
+            previous = sumw
+        return rows
+
+    def report(self, stream=sys.stdout):
+        print(f"{'cut':<16}{'events':>10}{'sum w':>14}{'error':>12}{'eff':>9}{'cum eff':>9}", file=stream)
+        for name, events, sumw, error, efficiency, cumulative in self.table():
+            print(f"{name:<16}{events:>10}{sumw:>14.4g}{error:>12.3g}{efficiency:>9.2%}{cumulative:>9.2%}",
+                  file=stream)
+
+    def to_root(self, name="cutflow"):
+        """TH1D with one labelled bin per cut holding the sum of weights."""
+        import ROOT
+        hist = ROOT.TH1D(name, "Weighted cut flow", len(self.names), 0, len(self.names))
+        hist.Sumw2()
+        for k, cut in enumerate(self.names, start=1):
+            hist.GetXaxis().SetBinLabel(k, cut)
+            hist.SetBinContent(k, self.sumw[cut])
+            hist.SetBinError(k, np.sqrt(self.sumw2[cut]))
+        hist.SetEntries(self.events[self.names[0]] if self.names else 0)
+        return hist
+
+    def Write(self, name="cutflow"):
+        hist = self.to_root(name)
+        hist.Write()
+        return hist
@@ -0,0 +1,177 @@
+"""
+Seeded generator of Delphes-like events for benchmarks and tests without
+real Delphes files.
+
+generate_chunk() returns a DelphesChunk with the same columns iterate_delphes
+yields. write_delphes_file() writes the events as a small Delphes tree
+(needs ROOT and libDelphes), readable by ExRootTreeReader and by
+iterate_delphes. write_lhe_file() writes parton-level events of the
+g g > A > h a, h > b b~, a > xd xd~ topology lhe_reader_non_decayed_tan.c
+looks for, as a plain or gzip-compressed LHE file.
+"""
+
+import gzip
+
+import numpy as np
+
+from delphes_reader import DelphesChunk
+
+def _jagged(rng, counts, draw):
+    """Draw sum(counts) values and return them with the matching offsets."""
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    return draw(rng, int(offsets[-1])), offsets
+
+def _sort_by_pt(pt, offsets, *columns):
+    """pT-order objects inside each event, as Delphes stores them."""
+    event_idx = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    order = np.lexsort((-pt, event_idx))
+    return [pt[order]] + [column[order] for column in columns]
+
+def generate_chunk(n_events, seed=1, mean_jets=6.0, btag_fraction=0.4, mean_electrons=0.8,
+                   mean_muons=0.8, weight=1.0, n_weights=0, entry_start=0):
+    """
+    Generate a chunk of Delphes-like events.
+
+    Args:
+        n_events (int): Number of events.
+        seed (int): Random seed, the same seed gives the same events.
+        mean_jets (float): Poisson mean of the jet multiplicity.
+        btag_fraction (float): Fraction of jets passing the loose b-tag; medium and
+            tight are nested subsets, stored as BTag bits 0, 1 and 2.
+        mean_electrons, mean_muons (float): Poisson means of the lepton multiplicities.
+        weight (float): Event weight.
+        n_weights (int): Entries of the Weight collection (scale/PDF-like variations
+            of the event weight).
+        entry_start (int): Entry number of the first event.
+
+    Returns:
+        DelphesChunk
+    """
+    rng = np.random.default_rng(seed)
+    columns, offsets = {}, {}
+
+    # Jets: falling pT spectrum above 20 GeV, central-ish eta, b-tag working-point bits
+    n_jets = rng.poisson(mean_jets, n_events)
+    pt, offsets["Jet"] = _jagged(rng, n_jets, lambda r, n: 20.0 + r.exponential(60.0, n))
+    n = len(pt)
+    eta = np.clip(rng.normal(0.0, 1.8, n), -4.5, 4.5)
+    phi = rng.uniform(-np.pi, np.pi, n)
+    mass = pt * rng.uniform(0.05, 0.2, n)
+    tag_score = rng.uniform(0.0, 1.0, n)
+    btag = ((tag_score < btag_fraction).astype(np.int32)
+            | ((tag_score < 0.7 * btag_fraction).astype(np.int32) << 1)
+            | ((tag_score < 0.4 * btag_fraction).astype(np.int32) << 2))
+    pt, eta, phi, mass, btag = _sort_by_pt(pt, offsets["Jet"], eta, phi, mass, btag)
+    columns.update({"Jet.PT": pt, "Jet.Eta": eta, "Jet.Phi": phi, "Jet.Mass": mass, "Jet.BTag": btag})
+
+    # Electrons and muons
+    for collection, mean in (("Electron", mean_electrons), ("Muon", mean_muons)):
+        counts = rng.poisson(mean, n_events)
+        pt, offsets[collection] = _jagged(rng, counts, lambda r, n: 10.0 + r.exponential(40.0, n))
+        eta = np.clip(rng.normal(0.0, 1.2, len(pt)), -2.5, 2.5)
+        phi = rng.uniform(-np.pi, np.pi, len(pt))
+        pt, eta, phi = _sort_by_pt(pt, offsets[collection], eta, phi)
+        columns.update({f"{collection}.PT": pt, f"{collection}.Eta": eta, f"{collection}.Phi": phi})
+
+    # One MissingET, ScalarHT and Event entry per event
+    single = np.arange(n_events + 1, dtype=np.int64)
+    offsets.update({"MissingET": single, "ScalarHT": single, "Event": single})
+    columns["MissingET.MET"] = rng.exponential(80.0, n_events)
+    columns["MissingET.Phi"] = rng.uniform(-np.pi, np.pi, n_events)
+    columns["ScalarHT.HT"] = np.bincount(np.repeat(np.arange(n_events), n_jets),
+                                         weights=columns["Jet.PT"], minlength=n_events)
+    columns["Event.Weight"] = np.full(n_events, weight)
+    if n_weights:
+        offsets["Weight"] = np.arange(0, n_events * n_weights + 1, n_weights, dtype=np.int64)
+        columns["Weight.Weight"] = weight * rng.normal(1.0, 0.1, n_events * n_weights)
+
+    return DelphesChunk(entry_start, entry_start + n_events, columns, offsets)
+
+def write_delphes_file(path, chunk):
+    """
+    Write a generated chunk as a Delphes tree of TClonesArrays (Jet, Electron,
+    Muon, MissingET, ScalarHT, Event and Weight). Needs libDelphes loaded
+    (setup_delphes()).
+    """
+    import ROOT
+
+    classes = {"Jet": "Jet", "Electron": "Electron", "Muon": "Muon",
+               "MissingET": "MissingET", "ScalarHT": "ScalarHT", "Event": "HepMCEvent", "Weight": "Weight"}
+    classes = {collection: class_name for collection, class_name in classes.items() if collection in chunk.offsets}
+    root_file = ROOT.TFile(path, "RECREATE")
+    tree = ROOT.TTree("Delphes", "Analysis tree")
+    arrays = {}
+    for collection, class_name in classes.items():
+        arrays[collection] = ROOT.TClonesArray(class_name)
+        tree.Branch(collection, arrays[collection], 32000, 99)
+
+    fields = {collection: [name.split(".", 1)[1] for name in chunk.columns if name.split(".")[0] == collection]
+              for collection in classes}
+    for event in range(len(chunk)):
+        for collection, clones in arrays.items():
+            clones.Clear()
+            first, last = chunk.offsets[collection][event], chunk.offsets[collection][event + 1]
+            for k in range(last - first):
+                candidate = clones.ConstructedAt(k)
+                for field in fields[collection]:
+                    setattr(candidate, field, chunk.columns[f"{collection}.{field}"][first + k].item())
+        tree.Fill()
+
+    tree.Write()
+    root_file.Close()
+
+# Particles of a synthetic LHE event: (id, status, mother1, mother2, mass)
+LHE_TOPOLOGY = [
+    (21, -1, 0, 0, 0.0),       # 1 g
+    (21, -1, 0, 0, 0.0),       # 2 g
+    (36, 2, 1, 2, 700.0),      # 3 A
+    (25, 2, 3, 3, 125.0),      # 4 h
+    (55, 2, 3, 3, 500.0),      # 5 a
+    (5, 1, 4, 4, 4.7),         # 6 b
+    (-5, 1, 4, 4, 4.7),        # 7 b~
+    (52, 1, 5, 5, 10.0),       # 8 xd
+    (-52, 1, 5, 5, 10.0),      # 9 xd~
+]
+
+def write_lhe_file(path, n_events, seed=1, extra_jet_fraction=0.3, xsec=0.034, compress=None):
+    """
+    Write seeded synthetic parton-level events as an LHE file.
+
+    Every event follows LHE_TOPOLOGY, and a fraction of them carries an
+    extra gluon (mothers 1 2). Momenta are random with on-shell energies; the
+    kinematics are not meant to be physical, only the file layout, the
+    sizes and the decay tree are.
+
+    Args:
+        path (str): Output file.
+        n_events (int): Number of events.
+        seed (int): Generator seed.
+        extra_jet_fraction (float): Fraction of events with an extra gluon.
+        xsec (float): Cross section in pb written to the header.
+        compress (bool): gzip the file (default: if path ends with .gz).
+    """
+    rng = np.random.default_rng(seed)
+    compress = path.endswith(".gz") if compress is None else compress
+    opener = gzip.open if compress else open
+    with opener(path, "wt") as lhe:
+        lhe.write('<LesHouchesEvents version="3.0">\n<header>\n<MGGenerationInfo>\n')
+        lhe.write(f"#  Number of Events        :       {n_events}\n")
+        lhe.write(f"#  Integrated weight (pb)  :       {xsec}\n</MGGenerationInfo>\n</header>\n")
+        lhe.write(f"<init>\n2212 2212 6.500000e+03 6.500000e+03 0 0 247000 247000 -4 1\n"
+                  f"{xsec:.6e} {xsec * 0.01:.6e} {xsec:.6e} 1\n</init>\n")
+        for _ in range(n_events):
+            particles = list(LHE_TOPOLOGY)
+            if rng.random() < extra_jet_fraction:
+                particles.append((21, 1, 1, 2, 0.0))
+            momenta = rng.normal(0.0, 150.0, (len(particles), 3))
+            # Incoming gluons along the beam
+            momenta[:2, :2] = 0.0
+            momenta[:2, 2] = np.abs(momenta[:2, 2]) * [1, -1] + 300.0 * np.array([1, -1])
+            lhe.write(f"<event>\n {len(particles)} 1 {xsec:+.7e} {rng.uniform(100, 500):.8e} "
+                      f"7.54677100e-03 1.18000000e-01\n")
+            for (pid, status, mother1, mother2, mass), (px, py, pz) in zip(particles, momenta):
+                energy = np.sqrt(px * px + py * py + pz * pz + mass * mass)
+                lhe.write(f" {pid:>8} {status:>2} {mother1:>4} {mother2:>4} {0:>4} {0:>4} {px:+.10e} {py:+.10e} "
+                          f"{pz:+.10e} {energy:.10e} {mass:.10e} 0.0000e+00 9.0000e+00\n")
+            lhe.write("<mgrwt>\n<rscale>  0 0.10000000E+03</rscale>\n</mgrwt>\n</event>\n")
+        lhe.write("</LesHouchesEvents>\n")